@@ -0,0 +1,284 @@
+"""Trace driven benchmarks for the caches in cache.py.
+
+Synthetic access traces are replayed against a cache, reporting throughput,
+per operation latency percentiles, hit ratio and peak memory. Results are
+saved as JSON so two runs can be compared:
+
+    python3 benchmark.py run --output before.json
+    python3 benchmark.py run --output after.json
+    python3 benchmark.py compare before.json after.json
+"""
+import argparse
+import bisect
+import itertools
+import json
+import random
+import threading
+import time
+import tracemalloc
+
+import cache
+
+
+def uniform_trace(length, key_space, write_ratio=0.0, seed=0):
+    """Yield (operation, key) pairs with keys drawn uniformly.
+
+    Parameters:
+    length (int): the number of operations
+    key_space (int): the number of distinct keys
+    write_ratio (float): the fraction of operations that are puts
+    seed (int): the random seed
+    """
+    randomizer = random.Random(seed)
+    for _ in range(length):
+        operation = "put" if randomizer.random() < write_ratio else "get"
+        yield operation, randomizer.randrange(key_space)
+
+
+def zipf_trace(length, key_space, skew=1.0, write_ratio=0.0, seed=0):
+    """Yield (operation, key) pairs with Zipf distributed keys.
+
+    Key k is drawn with probability proportional to 1 / (k + 1) ** skew, so
+    a larger skew concentrates accesses on fewer keys.
+
+    Parameters:
+    length (int): the number of operations
+    key_space (int): the number of distinct keys
+    skew (float): the Zipf exponent
+    write_ratio (float): the fraction of operations that are puts
+    seed (int): the random seed
+    """
+    randomizer = random.Random(seed)
+    cumulative = list(itertools.accumulate(
+        1 / (rank + 1) ** skew for rank in range(key_space)))
+    total = cumulative[-1]
+    for _ in range(length):
+        operation = "put" if randomizer.random() < write_ratio else "get"
+        key = bisect.bisect_left(cumulative, randomizer.random() * total)
+        yield operation, min(key, key_space - 1)
+
+
+def scan_trace(length):
+    """Yield get operations on ever new keys, a sequential scan"""
+    for key in range(length):
+        yield "get", key
+
+
+def loop_trace(length, loop_size):
+    """Yield get operations cycling through loop_size keys in order"""
+    for position in range(length):
+        yield "get", position % loop_size
+
+
+WORKLOADS = {
+    "uniform": lambda length, key_space: uniform_trace(length, key_space),
+    "zipf-0.8": lambda length, key_space: zipf_trace(length, key_space, 0.8),
+    "zipf-1.2": lambda length, key_space: zipf_trace(length, key_space, 1.2),
+    "scan": lambda length, key_space: scan_trace(length),
+    "loop": lambda length, key_space: loop_trace(length, key_space // 2),
+    "mixed": lambda length, key_space: zipf_trace(
+        length, key_space, 1.0, write_ratio=0.3),
+}
+
+
+def replay(lru_cache, trace, timed=True):
+    """Replay a trace against a cache, filling it on get misses.
+
+    Parameters:
+    lru_cache: the cache to replay against
+    trace (list): the (operation, key) pairs
+    timed (bool): record the latency of every operation
+
+    Returns:
+        hits (int): the number of gets that hit
+        gets (int): the number of gets
+        latencies (list): the nanoseconds each operation took, if timed
+    """
+    get = lru_cache.get
+    put = lru_cache.put
+    clock = time.perf_counter_ns
+    hits = gets = 0
+    latencies = []
+    record = latencies.append
+    for operation, key in trace:
+        start = clock() if timed else 0
+        if operation == "get":
+            gets += 1
+            if get(key) is None:
+                put(key, key)
+            else:
+                hits += 1
+        else:
+            put(key, key)
+        if timed:
+            record(clock() - start)
+    return hits, gets, latencies
+
+
+def percentile(sorted_values, fraction):
+    """Return the value below which a fraction of sorted values fall"""
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def run(make_cache, trace, threads=1):
+    """Benchmark a cache on a trace.
+
+    The trace is replayed once for timing and once more on a fresh cache
+    under tracemalloc for peak memory, which would otherwise skew the
+    timings. With several threads the trace is dealt out round robin and
+    replayed concurrently, so the cache must be thread safe.
+
+    Parameters:
+    make_cache (callable): returns a new empty cache
+    trace (list): the (operation, key) pairs
+    threads (int): the number of threads replaying the trace
+
+    Returns:
+        result (dictionary): ops, seconds, ops_per_sec, p50_ns, p99_ns,
+        hit_ratio and peak_memory_bytes
+    """
+    lru_cache = make_cache()
+    parts = [trace[offset::threads] for offset in range(threads)]
+    results = [None] * threads
+
+    def worker(index):
+        results[index] = replay(lru_cache, parts[index])
+
+    workers = [threading.Thread(target=worker, args=(index,))
+               for index in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    hits = sum(result[0] for result in results)
+    gets = sum(result[1] for result in results)
+    latencies = sorted(itertools.chain.from_iterable(result[2] for result in results))
+
+    tracemalloc.start()
+    try:
+        replay(make_cache(), trace, timed=False)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "ops": len(trace),
+        "seconds": seconds,
+        "ops_per_sec": len(trace) / seconds if seconds else 0.0,
+        "p50_ns": percentile(latencies, 0.5),
+        "p99_ns": percentile(latencies, 0.99),
+        "hit_ratio": hits / gets if gets else 0.0,
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def run_suite(workloads, max_size, length, key_space, policy="lru", threads=1):
+    """Benchmark every workload, returning the results by workload name"""
+    if threads > 1:
+        def make_cache():
+            return cache.ConcurrentLRUCache(max_size, policy=policy)
+    else:
+        def make_cache():
+            return cache.LRUCache(max_size, policy=policy)
+    results = {}
+    for name in workloads:
+        trace = list(WORKLOADS[name](length, key_space))
+        results[name] = run(make_cache, trace, threads)
+    return results
+
+
+# metrics where a larger value is an improvement
+HIGHER_IS_BETTER = {"ops_per_sec", "hit_ratio"}
+COMPARED = ("ops_per_sec", "p50_ns", "p99_ns", "hit_ratio", "peak_memory_bytes")
+
+
+def compare(before, after):
+    """Return the relative change of each metric of the common workloads.
+
+    Returns:
+        changes (dictionary): for each workload, each metric's before and
+        after values, the change as a fraction of before, and whether it
+        is an improvement
+    """
+    changes = {}
+    for workload in sorted(set(before["results"]) & set(after["results"])):
+        old = before["results"][workload]
+        new = after["results"][workload]
+        changes[workload] = {}
+        for metric in COMPARED:
+            change = (new[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+            better = change > 0 if metric in HIGHER_IS_BETTER else change < 0
+            changes[workload][metric] = {
+                "before": old[metric],
+                "after": new[metric],
+                "change": change,
+                "better": better and change != 0,
+            }
+    return changes
+
+
+def show(results):
+    """Print one line of metrics per workload"""
+    print("%-10s %12s %9s %9s %9s %12s" % (
+        "workload", "ops/sec", "p50 ns", "p99 ns", "hit %", "peak bytes"))
+    for workload, result in results.items():
+        print("%-10s %12.0f %9d %9d %9.2f %12d" % (
+            workload, result["ops_per_sec"], result["p50_ns"], result["p99_ns"],
+            100 * result["hit_ratio"], result["peak_memory_bytes"]))
+
+
+def show_comparison(changes):
+    """Print the change of each metric per workload"""
+    for workload, metrics in changes.items():
+        print(workload)
+        for metric, change in metrics.items():
+            print("  %-18s %14.6g -> %-14.6g %+7.1f%%%s" % (
+                metric, change["before"], change["after"], 100 * change["change"],
+                "  better" if change["better"] else ""))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the LRU cache")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="replay synthetic traces")
+    run_parser.add_argument("--max-size", type=int, default=10000)
+    run_parser.add_argument("--length", type=int, default=200000)
+    run_parser.add_argument("--key-space", type=int, default=100000)
+    run_parser.add_argument("--policy", default="lru", choices=sorted(cache.POLICIES))
+    run_parser.add_argument("--threads", type=int, default=1)
+    run_parser.add_argument("--workload", action="append", choices=sorted(WORKLOADS),
+                            help="workloads to run, all of them by default")
+    run_parser.add_argument("--output", help="file to save the results to as JSON")
+
+    compare_parser = commands.add_parser("compare", help="compare two saved runs")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+
+    arguments = parser.parse_args(argv)
+    if arguments.command == "run":
+        settings = {
+            "max_size": arguments.max_size,
+            "length": arguments.length,
+            "key_space": arguments.key_space,
+            "policy": arguments.policy,
+            "threads": arguments.threads,
+        }
+        results = run_suite(arguments.workload or list(WORKLOADS), **settings)
+        show(results)
+        if arguments.output:
+            with open(arguments.output, "w") as output:
+                json.dump({"settings": settings, "results": results}, output, indent=2)
+    else:
+        with open(arguments.before) as before, open(arguments.after) as after:
+            show_comparison(compare(json.load(before), json.load(after)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+import unittest
+import benchmark
+import cache
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_uniform_trace_mixes_reads_and_writes(self):
+        trace = list(benchmark.uniform_trace(1000, 50, write_ratio=0.25))
+
+        self.assertEqual(1000, len(trace))
+        writes = sum(1 for operation, key in trace if operation == "put")
+        self.assertTrue(200 < writes < 300)
+        self.assertTrue(all(0 <= key < 50 for operation, key in trace))
+
+    def test_zipf_trace_favours_low_ranked_keys(self):
+        trace = list(benchmark.zipf_trace(5000, 1000, skew=1.2))
+
+        hot = sum(1 for operation, key in trace if key < 10)
+        self.assertTrue(hot > len(trace) / 2)
+        self.assertTrue(all(0 <= key < 1000 for operation, key in trace))
+
+    def test_traces_are_repeatable(self):
+        self.assertEqual(list(benchmark.zipf_trace(100, 50, seed=3)),
+                         list(benchmark.zipf_trace(100, 50, seed=3)))
+
+    def test_scan_and_loop_traces(self):
+        self.assertEqual([("get", 0), ("get", 1), ("get", 2)],
+                         list(benchmark.scan_trace(3)))
+        self.assertEqual([0, 1, 2, 0, 1], [key for operation, key
+                                           in benchmark.loop_trace(5, 3)])
+
+    def test_replay_fills_cache_on_misses(self):
+        lru_cache = cache.LRUCache(10)
+
+        hits, gets, latencies = benchmark.replay(
+            lru_cache, [("get", 1), ("get", 1), ("put", 2), ("get", 2)])
+
+        self.assertEqual(2, hits)
+        self.assertEqual(3, gets)
+        self.assertEqual(4, len(latencies))
+
+    def test_runs_report_every_metric(self):
+        trace = list(benchmark.loop_trace(1000, 20))
+
+        result = benchmark.run(lambda: cache.LRUCache(50), trace)
+
+        self.assertEqual(1000, result["ops"])
+        self.assertEqual(0.98, result["hit_ratio"])
+        self.assertTrue(result["ops_per_sec"] > 0)
+        self.assertTrue(result["p99_ns"] >= result["p50_ns"] > 0)
+        self.assertTrue(result["peak_memory_bytes"] > 0)
+
+    def test_runs_concurrent_cache_on_many_threads(self):
+        trace = list(benchmark.zipf_trace(2000, 100))
+
+        result = benchmark.run(lambda: cache.ConcurrentLRUCache(200), trace, threads=4)
+
+        self.assertEqual(2000, result["ops"])
+        self.assertTrue(result["hit_ratio"] > 0.9)
+
+    def test_compares_metrics_of_common_workloads(self):
+        before = {"results": {
+            "scan": {"ops_per_sec": 100, "p50_ns": 10, "p99_ns": 40,
+                     "hit_ratio": 0.5, "peak_memory_bytes": 1000},
+            "loop": {}}}
+        after = {"results": {
+            "scan": {"ops_per_sec": 150, "p50_ns": 20, "p99_ns": 40,
+                     "hit_ratio": 0.5, "peak_memory_bytes": 500}}}
+
+        changes = benchmark.compare(before, after)
+
+        self.assertEqual(["scan"], list(changes))
+        self.assertEqual(0.5, changes["scan"]["ops_per_sec"]["change"])
+        self.assertTrue(changes["scan"]["ops_per_sec"]["better"])
+        self.assertEqual(1.0, changes["scan"]["p50_ns"]["change"])
+        self.assertFalse(changes["scan"]["p50_ns"]["better"])
+        self.assertFalse(changes["scan"]["p99_ns"]["better"])
+        self.assertTrue(changes["scan"]["peak_memory_bytes"]["better"])
+
+    def test_saves_results_as_json(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.json")
+
+            benchmark.main(["run", "--length", "500", "--key-space", "100",
+                            "--max-size", "20", "--workload", "scan",
+                            "--workload", "zipf-1.2", "--output", path])
+
+            with open(path) as saved:
+                results = json.load(saved)
+        self.assertEqual(20, results["settings"]["max_size"])
+        self.assertEqual({"scan", "zipf-1.2"}, set(results["results"]))
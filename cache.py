@@ -1,4 +1,27 @@
 # document
+import argparse
+import asyncio
+import bisect
+import functools
+import itertools
+import math
+import mmap
+import os
+import pickle
+import struct
+import sys
+import threading
+import time
+import weakref
+import zlib
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# marks a cache miss where None could be a cached value
+_MISSING = object()
+
+
 class Item:
     """A class to represent one item in a doubly linked list.
 
@@ -12,13 +35,19 @@ class Item:
         a link to the previous item
     next_item: Item
         a link to the next item
+    stamp: int
+        the hit count or time of its last promotion, when promotions are
+        throttled
     """
 
+    __slots__ = ("key", "value", "previous_item", "next_item", "stamp")
+
     def __init__(self, key, value):
         self.key = key
         self.value = value
         self.previous_item = None
         self.next_item = None
+        self.stamp = 0
 
 
 class DoublyLinkedList:
@@ -38,10 +67,11 @@ class DoublyLinkedList:
 
     def add(self, item):
         """Add an item to the head"""
+        # the item may carry stale links from a list it was in before
+        item.previous_item = None
+        item.next_item = self.head
         if self.head:
             self.head.previous_item = item
-            item.next_item = self.head
-            item.previous_item = None
         else:
             # very first item added is both tail and head
             self.tail = item
@@ -64,6 +94,10 @@ class DoublyLinkedList:
 
             self.add(item)
 
+    def victim(self):
+        """Return the item evict would remove next, without removing it"""
+        return self.tail
+
     def removeTail(self):
         """Remove the tail item"""
         if self.tail:
@@ -99,116 +133,3133 @@ class DoublyLinkedList:
             previous_item.next_item = next_item
             next_item.previous_item = previous_item
 
+    def evict(self):
+        """Remove and return the tail item"""
+        item = self.tail
+        self.removeTail()
+        return item
+
     def clear(self):
         "Clear all the items in the list"
         self.head = None
         self.tail = None
 
-class LRUCache:
-    """An impelementation of a Least Recently Used Cache.
+    def __iter__(self):
+        item = self.head
+        while item:
+            yield item
+            item = item.next_item
+
+class SieveList:
+    """The SIEVE eviction policy.
+
+    Items are kept in insertion order and a hit only marks the item as
+    visited, so hits never relink anything. To evict, a hand sweeps from the
+    tail towards the head clearing visited marks and removes the first item
+    that was not visited, then stays where it stopped for the next eviction.
 
     Attributes
     ----------
-    max_size : int
-        the maximum capacity of the cache
-    dictionary: dictionary
-        a dictionary containing the key value pairs of items in the cache
-    doubly_linked_list: DoublyLinkedList
-        a doubly linked list containing the items of the cache
+    items : DoublyLinkedList
+        the items, newest at the head
+    visited: set
+        the items hit since the hand last passed them
+    hand: Item
+        the next item the hand looks at, or None to start from the tail
     """
 
-    def __init__(self, max_size):
-        max_size = int(max_size)
-        assert (max_size > 0), "Max capacity must be greater than zero"
-        self.max_size = max_size
-        self.dictionary = {}
-        self.doubly_linked_list = DoublyLinkedList()
+    def __init__(self):
+        self.items = DoublyLinkedList()
+        self.visited = set()
+        self.hand = None
 
-    def put(self, key, value):
-        """Put a key value pair into the cache.
+    def add(self, item):
+        """Add a new item to the head"""
+        self.items.add(item)
 
-        Parameters:
-        key (string): the cache item key
-        value (string): the cach item value
+    def update(self, item):
+        """Mark an existing item as visited"""
+        self.visited.add(item)
+
+    def delete(self, item):
+        "Delete an existing item"
+        if item is self.hand:
+            self.hand = item.previous_item
+        self.visited.discard(item)
+        self.items.delete(item)
+
+    def evict(self):
+        """Remove and return the first unvisited item from the hand on"""
+        item = self.hand or self.items.tail
+        if item is None:
+            return None
+        while item in self.visited:
+            self.visited.discard(item)
+            item = item.previous_item or self.items.tail
+        self.hand = item.previous_item
+        self.items.delete(item)
+        return item
+
+    def victim(self):
+        """Return the item evict would remove next.
+
+        The hand sweeps up to it clearing visited marks as evict does, so
+        asking again after the victim was kept costs nothing.
         """
-        if key in self.dictionary:
-            # key already exists, update it
-            self.dictionary[key].value = value
-            self.doubly_linked_list.update(self.dictionary[key])
+        item = self.hand or self.items.tail
+        if item is None:
+            return None
+        while item in self.visited:
+            self.visited.discard(item)
+            item = item.previous_item or self.items.tail
+        self.hand = item
+        return item
+
+    def clear(self):
+        "Clear all the items"
+        self.items.clear()
+        self.visited.clear()
+        self.hand = None
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class ClockList:
+    """The CLOCK eviction policy.
+
+    Items sit in a circular array of slots with a referenced bit each, and a
+    hit only sets the bit. To evict, the hand goes round the slots clearing
+    set bits and removes the first item whose bit was clear. New items reuse
+    the freed slots.
+
+    Attributes
+    ----------
+    items : list
+        the item in each slot, or None for a free slot
+    referenced: bytearray
+        the referenced bit of each slot
+    slots: dictionary
+        the slot number of each item
+    free: list
+        the free slot numbers
+    hand: int
+        the next slot number the hand looks at
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def add(self, item):
+        """Add a new item to a free slot"""
+        if self.free:
+            slot = self.free.pop()
+            self.items[slot] = item
+            self.referenced[slot] = 0
         else:
-            # this is a new key value pair
-            if len(self.dictionary) == self.max_size:
-                #it will exceed max capacity, remove tail first
-                self.dictionary.pop(self.doubly_linked_list.tail.key)
-                self.doubly_linked_list.removeTail()
-            item = Item(key, value)
-            self.doubly_linked_list.add(item)
-            self.dictionary[key] = item
+            slot = len(self.items)
+            self.items.append(item)
+            self.referenced.append(0)
+        self.slots[item] = slot
 
-    def get(self, key):
-        """Get a value from the cache by its key.
+    def update(self, item):
+        """Set the referenced bit of an existing item"""
+        self.referenced[self.slots[item]] = 1
 
-        Parameter:
-        key (string): the cache item key
+    def delete(self, item):
+        "Delete an existing item"
+        slot = self.slots.pop(item)
+        self.items[slot] = None
+        self.free.append(slot)
+
+    def evict(self):
+        """Remove and return the first unreferenced item from the hand on"""
+        if not self.slots:
+            return None
+        items = self.items
+        referenced = self.referenced
+        hand = self.hand
+        while True:
+            if hand >= len(items):
+                hand = 0
+            item = items[hand]
+            if item is not None:
+                if not referenced[hand]:
+                    break
+                referenced[hand] = 0
+            hand += 1
+        self.hand = hand + 1
+        self.delete(item)
+        return item
+
+    def victim(self):
+        """Return the item evict would remove next.
+
+        The hand goes round up to it clearing referenced bits as evict
+        does, so asking again after the victim was kept costs nothing.
+        """
+        if not self.slots:
+            return None
+        items = self.items
+        referenced = self.referenced
+        hand = self.hand
+        while True:
+            if hand >= len(items):
+                hand = 0
+            item = items[hand]
+            if item is not None:
+                if not referenced[hand]:
+                    break
+                referenced[hand] = 0
+            hand += 1
+        self.hand = hand
+        return item
+
+    def clear(self):
+        "Clear all the items"
+        self.items = []
+        self.referenced = bytearray()
+        self.slots = {}
+        self.free = []
+        self.hand = 0
+
+    def __iter__(self):
+        return (item for item in self.items if item is not None)
+
+
+class ARCPolicy:
+    """The Adaptive Replacement Cache eviction policy.
+
+    Items seen once live in the recent list t1 and items hit again move to
+    the frequent list t2. The keys evicted from each list are remembered in
+    the ghost lists b1 and b2, and putting a ghost key back shifts the
+    target size p of t1 towards the list that lost it. Scans only churn t1
+    while the frequently used items stay in t2.
+
+    Attributes
+    ----------
+    capacity : int
+        the maximum number of items
+    t1: DoublyLinkedList
+        the items seen once, most recent at the head
+    t2: DoublyLinkedList
+        the items seen more than once, most recent at the head
+    frequent: set
+        the items in t2
+    b1: OrderedDict
+        the ghost keys evicted from t1, oldest first
+    b2: OrderedDict
+        the ghost keys evicted from t2, oldest first
+    p: float
+        the target size of t1
+    """
+
+    def __init__(self, capacity):
+        assert (capacity is not None and capacity > 0), "ARC needs a max capacity"
+        self.capacity = capacity
+        self.clear()
+
+    def add(self, item):
+        """Add a new item, to t2 if its key is a ghost and t1 otherwise"""
+        key = item.key
+        if key in self.b1:
+            self.p = min(self.capacity,
+                         self.p + max(len(self.b2) / len(self.b1), 1))
+            del self.b1[key]
+            self._add_frequent(item)
+        elif key in self.b2:
+            self.p = max(0, self.p - max(len(self.b1) / len(self.b2), 1))
+            del self.b2[key]
+            self._add_frequent(item)
+        else:
+            self.t1.add(item)
+            self.t1_size += 1
+        self._trim_ghosts()
+
+    def _add_frequent(self, item):
+        self.t2.add(item)
+        self.t2_size += 1
+        self.frequent.add(item)
+
+    def update(self, item):
+        """Move an existing item to the head of t2"""
+        if item in self.frequent:
+            self.t2.update(item)
+        else:
+            self.t1.delete(item)
+            self.t1_size -= 1
+            self._add_frequent(item)
+
+    def delete(self, item):
+        "Delete an existing item"
+        if item in self.frequent:
+            self.frequent.discard(item)
+            self.t2.delete(item)
+            self.t2_size -= 1
+        else:
+            self.t1.delete(item)
+            self.t1_size -= 1
+
+    def evict(self):
+        """Remove and return the tail of t1 or t2, remembering its key"""
+        if self.t1_size and (self.t1_size > self.p or not self.t2_size):
+            item = self.t1.evict()
+            self.t1_size -= 1
+            self.b1[item.key] = None
+        elif self.t2_size:
+            item = self.t2.evict()
+            self.t2_size -= 1
+            self.frequent.discard(item)
+            self.b2[item.key] = None
+        else:
+            return None
+        self._trim_ghosts()
+        return item
+
+    def victim(self):
+        """Return the item evict would remove next, without removing it"""
+        if self.t1_size and (self.t1_size > self.p or not self.t2_size):
+            return self.t1.tail
+        return self.t2.tail
+
+    def resize(self, capacity):
+        """Change the capacity, forgetting the ghosts that no longer fit"""
+        assert (capacity > 0), "ARC needs a max capacity"
+        self.capacity = capacity
+        self.p = min(self.p, capacity)
+        self._trim_ghosts()
+
+    def _trim_ghosts(self):
+        """Keep t1 and b1 within capacity, and everything within twice it"""
+        while self.b1 and self.t1_size + len(self.b1) > self.capacity:
+            self.b1.popitem(last=False)
+        while self.b2 and (self.t1_size + self.t2_size + len(self.b1)
+                           + len(self.b2) > 2 * self.capacity):
+            self.b2.popitem(last=False)
+
+    def clear(self):
+        "Clear all the items and ghosts"
+        self.t1 = DoublyLinkedList()
+        self.t2 = DoublyLinkedList()
+        self.t1_size = 0
+        self.t2_size = 0
+        self.frequent = set()
+        self.b1 = OrderedDict()
+        self.b2 = OrderedDict()
+        self.p = 0
+
+    def __iter__(self):
+        yield from self.t2
+        yield from self.t1
+
+
+class CountMinSketch:
+    """A count-min sketch of approximate access frequencies.
+
+    Each row is a bytearray of small saturating counters indexed by a
+    different multiplicative hash of the key, and the estimate is the
+    smallest of the key's counters. After sample_size increments every
+    counter is halved, so old popularity fades away.
+
+    Attributes
+    ----------
+    rows : list
+        the bytearray of counters of each row
+    sample_size: int
+        the number of increments between halvings
+    additions: int
+        the number of increments since the last halving
+    """
+
+    MAX_COUNT = 15
+    HALVE_TABLE = bytes(count >> 1 for count in range(256))
+    SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F,
+             0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+
+    def __init__(self, width, depth=4, sample_size=None):
+        assert (0 < depth <= len(self.SEEDS)), "Depth must be between 1 and 4"
+        self.bits = max(1, (int(width) - 1).bit_length())
+        self.rows = [bytearray(1 << self.bits) for _ in range(depth)]
+        self.seeds = self.SEEDS[:depth]
+        self.sample_size = sample_size or 10 * (1 << self.bits)
+        self.additions = 0
+
+    def _indexes(self, key):
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        shift = 64 - self.bits
+        return [((h * seed) & 0xFFFFFFFFFFFFFFFF) >> shift for seed in self.seeds]
+
+    def increment(self, key):
+        """Count one access of a key"""
+        for row, index in zip(self.rows, self._indexes(key)):
+            if row[index] < self.MAX_COUNT:
+                row[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.age()
+
+    def estimate(self, key):
+        """Return the approximate number of recent accesses of a key"""
+        return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+
+    def age(self):
+        """Halve every counter"""
+        self.rows = [row.translate(self.HALVE_TABLE) for row in self.rows]
+        self.additions //= 2
+
+    def clear(self):
+        """Reset every counter to zero"""
+        self.rows = [bytearray(len(row)) for row in self.rows]
+        self.additions = 0
+
+    def memory_usage(self):
+        """Return the bytes used by the counters"""
+        return sum(sys.getsizeof(row) for row in self.rows)
+
+
+class WTinyLFUPolicy:
+    """The Window TinyLFU eviction policy.
+
+    New items enter a small LRU window of about 1% of capacity. The rest is
+    a segmented LRU main space, where items hit in probation are promoted to
+    protected. When the cache is full the window tail competes with the main
+    space victim, and whichever a count-min sketch says was accessed less
+    often is evicted.
+
+    Attributes
+    ----------
+    capacity : int
+        the maximum number of items
+    window: DoublyLinkedList
+        the newest items
+    probation: DoublyLinkedList
+        the main space items not hit since they got there
+    protected: DoublyLinkedList
+        the main space items hit while in probation
+    segments: dictionary
+        the list each item is in
+    sizes: dictionary
+        the number of items in each list
+    sketch: CountMinSketch
+        the access frequencies of recently seen keys
+    """
+
+    def __init__(self, capacity):
+        assert (capacity is not None and capacity > 0), "W-TinyLFU needs a max capacity"
+        self.sketch = CountMinSketch(capacity, sample_size=10 * capacity)
+        self.resize(capacity)
+        self.clear()
+
+    def resize(self, capacity):
+        """Change the capacity, the window and protected lists shrinking as
+        items leave them"""
+        assert (capacity > 0), "W-TinyLFU needs a max capacity"
+        self.capacity = capacity
+        self.window_capacity = max(1, capacity // 100)
+        self.protected_capacity = int((capacity - self.window_capacity) * 0.8)
+
+    def _move(self, item, segment):
+        """Move an item to the head of a list"""
+        self._remove(item)
+        segment.add(item)
+        self.segments[item] = segment
+        self.sizes[segment] += 1
+
+    def _remove(self, item):
+        segment = self.segments.pop(item, None)
+        if segment is not None:
+            segment.delete(item)
+            self.sizes[segment] -= 1
+
+    def add(self, item):
+        """Add a new item to the window"""
+        self.sketch.increment(item.key)
+        self._move(item, self.window)
+        if self.sizes[self.window] > self.window_capacity:
+            # there is room in the main space, no need to compete
+            self._move(self.window.tail, self.probation)
+
+    def update(self, item):
+        """Count a hit, promoting the item if it was on probation"""
+        self.sketch.increment(item.key)
+        segment = self.segments[item]
+        if segment is self.probation:
+            self._move(item, self.protected)
+            if self.sizes[self.protected] > self.protected_capacity:
+                self._move(self.protected.tail, self.probation)
+        else:
+            segment.update(item)
+
+    def delete(self, item):
+        "Delete an existing item"
+        self._remove(item)
+
+    def _main_victim(self):
+        return self.probation.tail or self.protected.tail
+
+    def evict(self):
+        """Remove and return the less frequently used of the window tail
+        and the main space victim"""
+        candidate = self.window.tail
+        victim = self._main_victim()
+        if candidate is not None and (
+                victim is None or self.sizes[self.window] >= self.window_capacity):
+            if victim is not None and (self.sketch.estimate(candidate.key)
+                                       > self.sketch.estimate(victim.key)):
+                # the candidate is admitted to the main space instead
+                self._move(candidate, self.probation)
+            else:
+                victim = candidate
+        if victim is not None:
+            self._remove(victim)
+        return victim
+
+    def victim(self):
+        """Return the main space victim, or the window tail if there is none"""
+        return self._main_victim() or self.window.tail
+
+    def clear(self):
+        "Clear all the items and frequencies"
+        self.window = DoublyLinkedList()
+        self.probation = DoublyLinkedList()
+        self.protected = DoublyLinkedList()
+        self.segments = {}
+        self.sizes = {self.window: 0, self.probation: 0, self.protected: 0}
+        self.sketch.clear()
+
+    def __iter__(self):
+        yield from self.window
+        yield from self.protected
+        yield from self.probation
+
+
+class BloomFilter:
+    """A Bloom filter over a bytearray of bits.
+
+    Double hashing derives the bit of each of the hash functions from the
+    key's hash, so a key costs one hash call however many bits it sets.
+
+    Attributes
+    ----------
+    bits : bytearray
+        the bit array, eight bits a byte
+    size: int
+        the number of bits
+    hash_count: int
+        the number of bits set for each key
+    set_bits: int
+        the number of bits set to one
+    """
+
+    MULTIPLIER = 0x9E3779B97F4A7C15
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(1, int(capacity))
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.set_bits = 0
+
+    def _indexes(self, key):
+        # spread the bits of small int hashes over the whole range
+        h = (hash(key) * self.MULTIPLIER) & 0xFFFFFFFFFFFFFFFF
+        first = h >> 32
+        step = (h & 0xFFFFFFFF) | 1
+        size = self.size
+        return [(first + i * step) % size for i in range(self.hash_count)]
+
+    def add(self, key):
+        """Add a key, returning whether it was already in the filter"""
+        bits = self.bits
+        present = True
+        for index in self._indexes(key):
+            mask = 1 << (index & 7)
+            if not bits[index >> 3] & mask:
+                bits[index >> 3] |= mask
+                self.set_bits += 1
+                present = False
+        return present
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[index >> 3] & (1 << (index & 7)) for index in self._indexes(key))
+
+    def clear(self):
+        """Remove every key"""
+        self.bits = bytearray(len(self.bits))
+        self.set_bits = 0
+
+    def false_positive_rate(self):
+        """Return the chance an absent key is reported present, given the
+        bits set so far"""
+        return (self.set_bits / self.size) ** self.hash_count
+
+    def memory_usage(self):
+        """Return the bytes used by the bits"""
+        return sys.getsizeof(self.bits)
+
+
+class AdmissionFilter:
+    """The TinyLFU admission filter with a doorkeeper.
+
+    The first access of a key only sets its bits in the doorkeeper Bloom
+    filter, and later ones are counted in a count-min sketch, so keys seen
+    once never take up counters. A new key is admitted to a full cache if
+    the doorkeeper saw it before, or if its estimated frequency beats the
+    victim's. Every sample_size accesses the counters are halved and the
+    doorkeeper is cleared, so old popularity fades away.
+
+    Attributes
+    ----------
+    doorkeeper : BloomFilter
+        the keys seen since the last aging
+    sketch: CountMinSketch
+        the access frequencies of keys seen more than once
+    sample_size: int
+        the number of accesses between agings
+    accesses: int
+        the number of accesses since the last aging
+    admitted, rejected: int
+        the number of new keys admitted and rejected
+    """
+
+    def __init__(self, capacity, error_rate=0.01, sample_size=None):
+        capacity = max(1, int(capacity))
+        self.sample_size = sample_size or 10 * capacity
+        self.doorkeeper = BloomFilter(self.sample_size, error_rate)
+        # aged here together with the doorkeeper, never by itself
+        self.sketch = CountMinSketch(capacity, sample_size=sys.maxsize)
+        self.accesses = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def record(self, key):
+        """Count an access, returning whether the key was seen before"""
+        seen = self.doorkeeper.add(key)
+        if seen:
+            self.sketch.increment(key)
+        self.accesses += 1
+        if self.accesses >= self.sample_size:
+            self.age()
+        return seen
+
+    def frequency(self, key):
+        """Return the estimated number of recent accesses of a key"""
+        return self.sketch.estimate(key) + (key in self.doorkeeper)
+
+    def admit(self, key, victim):
+        """Count an access of a new key and decide whether to store it.
+
+        Parameters:
+        key (string): the key put into a full cache
+        victim (Item): the item its admission would evict, or None
 
         Returns:
-            value (string): the corresponding cache item value
+            admitted (bool): whether the key should be stored
         """
-        if key in self.dictionary:
-            item = self.dictionary[key]
-            self.doubly_linked_list.update(item)
-            return item.value
-        return None
-    
-    def delete(self, key):
-        """Delete a value from the cache by its key.
+        admitted = (self.record(key) or victim is None
+                    or self.frequency(key) > self.frequency(victim.key))
+        if admitted:
+            self.admitted += 1
+        else:
+            self.rejected += 1
+        return admitted
 
-        Parameter:
-        key (string): the key of the cache item to delete
+    def age(self):
+        """Halve the counters and clear the doorkeeper"""
+        self.sketch.age()
+        self.doorkeeper.clear()
+        self.accesses = 0
+
+    def clear(self):
+        """Forget every access"""
+        self.sketch.clear()
+        self.doorkeeper.clear()
+        self.accesses = 0
+
+    def memory_usage(self):
+        """Return the bytes used by the doorkeeper and the sketch"""
+        return self.doorkeeper.memory_usage() + self.sketch.memory_usage()
+
+    def report(self):
+        """Return the memory use, doorkeeper false positive rate and
+        admission counts as a dictionary"""
+        return {
+            "memory_bytes": self.memory_usage(),
+            "doorkeeper_bytes": self.doorkeeper.memory_usage(),
+            "sketch_bytes": self.sketch.memory_usage(),
+            "false_positive_rate": self.doorkeeper.false_positive_rate(),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class SortedKeys:
+    """Keys in sorted order, kept in a list of short sorted chunks.
+
+    Adding or removing a key shifts only the keys of one chunk, and the
+    chunk is found by bisecting the largest key of each, so updates take
+    O(log n + chunk_size) rather than the O(n) of one long sorted list.
+    Keys must be comparable with each other, such as all strings.
+
+    Attributes
+    ----------
+    chunks : list
+        the sorted chunks, every key of a chunk below those of the next
+    maxes: list
+        the largest key of each chunk
+    chunk_size: int
+        the length at which a chunk is split in two
+    """
+
+    def __init__(self, chunk_size=1024):
+        self.chunks = []
+        self.maxes = []
+        self.chunk_size = chunk_size
+        self.size = 0
+
+    def add(self, key):
+        """Add a key that is not there yet"""
+        chunks = self.chunks
+        maxes = self.maxes
+        if not chunks:
+            chunks.append([key])
+            maxes.append(key)
+        else:
+            index = bisect.bisect_left(maxes, key)
+            if index == len(maxes):
+                # past every key, grow the last chunk
+                index -= 1
+                chunks[index].append(key)
+                maxes[index] = key
+            else:
+                bisect.insort(chunks[index], key)
+            chunk = chunks[index]
+            if len(chunk) >= self.chunk_size:
+                half = len(chunk) // 2
+                chunks.insert(index + 1, chunk[half:])
+                del chunk[half:]
+                maxes.insert(index, chunk[-1])
+        self.size += 1
+
+    def discard(self, key):
+        """Remove a key if it is there"""
+        maxes = self.maxes
+        index = bisect.bisect_left(maxes, key)
+        if index == len(maxes):
+            return
+        chunk = self.chunks[index]
+        position = bisect.bisect_left(chunk, key)
+        if chunk[position] != key:
+            return
+        del chunk[position]
+        self.size -= 1
+        if not chunk:
+            del self.chunks[index]
+            del maxes[index]
+        elif position == len(chunk):
+            maxes[index] = chunk[-1]
+
+    def irange(self, start, stop=None):
+        """Yield the keys from start up to but not including stop, or to
+        the end without a stop"""
+        maxes = self.maxes
+        chunks = self.chunks
+        index = bisect.bisect_left(maxes, start)
+        if index == len(maxes):
+            return
+        position = bisect.bisect_left(chunks[index], start)
+        for chunk in itertools.islice(chunks, index, None):
+            for key in itertools.islice(chunk, position, None):
+                if stop is not None and not key < stop:
+                    return
+                yield key
+            position = 0
+
+    def clear(self):
+        self.chunks = []
+        self.maxes = []
+        self.size = 0
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.chunks)
+
+    def __len__(self):
+        return self.size
+
+
+class Compressed:
+    """A compressed value held in an Item in place of the value itself.
+
+    Attributes
+    ----------
+    data : bytes
+        the compressed value
+    size: int
+        the length of the value before compression
+    text: bool
+        whether the value was a string, encoded as UTF-8 before compressing
+    """
+
+    __slots__ = ("data", "size", "text")
+
+    def __init__(self, data, size, text):
+        self.data = data
+        self.size = size
+        self.text = text
+
+    def __sizeof__(self):
+        # count the data so that max_weight sees the saving
+        return object.__sizeof__(self) + sys.getsizeof(self.data)
+
+
+class Compressor:
+    """Compresses large string and bytes values of a cache.
+
+    Values at least threshold long are compressed with the codec, and kept
+    compressed only if that shrinks them to max_ratio of their length or
+    less, so values that do not compress well cost one attempt and no
+    decompressions. With decompressed_size set, the decompressed values of
+    the keys read most recently are kept too, so the hottest keys are not
+    decompressed on every get. Give each cache its own Compressor.
+
+    Attributes
+    ----------
+    codec : object
+        has compress and decompress functions of bytes, such as the zlib,
+        bz2 or lzma modules
+    threshold: int
+        the length from which values are compressed
+    max_ratio: float
+        the largest compressed to original length ratio worth keeping
+    decompressed: OrderedDict
+        the Compressed value and its decompressed value of the keys read
+        most recently, least recent first
+    compressed, skipped: int
+        the number of values kept compressed and kept as they were for
+        compressing poorly
+    bytes_in, bytes_out: int
+        the length of the values kept compressed before and after
+    compress_ns, decompress_ns: int
+        the time spent compressing and decompressing
+    decompressions, decompressed_hits: int
+        the number of values decompressed and found already decompressed
+    """
+
+    def __init__(self, codec=zlib, threshold=1024, max_ratio=0.8, decompressed_size=0):
+        assert (0 < max_ratio <= 1), "Max ratio must be in (0, 1]"
+        self.codec = codec
+        self.threshold = threshold
+        self.max_ratio = max_ratio
+        self.decompressed_size = decompressed_size
+        self.decompressed = OrderedDict()
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.compress_ns = 0
+        self.decompress_ns = 0
+        self.decompressions = 0
+        self.decompressed_hits = 0
+
+    def compress(self, value):
+        """Return a Compressed value, or the value itself when it is not a
+        string or bytes, is short or compresses poorly"""
+        text = isinstance(value, str)
+        if not (text or isinstance(value, bytes)) or len(value) < self.threshold:
+            return value
+        start = time.perf_counter_ns()
+        raw = value.encode() if text else value
+        data = self.codec.compress(raw)
+        self.compress_ns += time.perf_counter_ns() - start
+        if len(data) > self.max_ratio * len(raw):
+            self.skipped += 1
+            return value
+        self.compressed += 1
+        self.bytes_in += len(raw)
+        self.bytes_out += len(data)
+        return Compressed(data, len(raw), text)
+
+    def decompress(self, value, key=_MISSING):
+        """Return the original of a value held in the cache.
+
+        Parameters:
+        value: the value held, Compressed or not
+        key (string): the key read, to keep its decompressed value among
+            the hottest, or left out for a one off read such as a snapshot
         """
-        if key in self.dictionary:
-            item = self.dictionary[key]
-            self.doubly_linked_list.delete(item)
-            self.dictionary.pop(key)
+        if type(value) is not Compressed:
+            return value
+        decompressed = self.decompressed
+        if key is not _MISSING and self.decompressed_size:
+            entry = decompressed.get(key)
+            # an entry for an older value of the key is stale
+            if entry is not None and entry[0] is value:
+                decompressed.move_to_end(key)
+                self.decompressed_hits += 1
+                return entry[1]
+        start = time.perf_counter_ns()
+        original = self.codec.decompress(value.data)
+        if value.text:
+            original = original.decode()
+        self.decompress_ns += time.perf_counter_ns() - start
+        self.decompressions += 1
+        if key is not _MISSING and self.decompressed_size:
+            decompressed[key] = (value, original)
+            decompressed.move_to_end(key)
+            if len(decompressed) > self.decompressed_size:
+                decompressed.popitem(last=False)
+        return original
 
-    def reset(self):
-        """Reset the cache to be empty."""
-        self.dictionary = {}
-        self.doubly_linked_list.clear()
+    def forget(self, key):
+        """Drop the decompressed value of a key removed from the cache"""
+        if self.decompressed:
+            self.decompressed.pop(key, None)
 
-    def show(self):
-        """Print the contents of the cache."""
-        print("------------------")
-        print("Current LRU Cache:")
-        item = self.doubly_linked_list.head
-        while item:
-            print(item.key, item.value)
-            item =  item.next_item
-        print("Max capacity = ", self.max_size)
+    def clear(self):
+        """Drop every decompressed value"""
+        self.decompressed.clear()
 
-def main():
-    max_capacity = input("Enter LRU Cache max capacity: ")
-    lru_cache = LRUCache(max_capacity)
-    lru_cache.show()
+    def report(self):
+        """Return the bytes saved and the time spent as a dictionary, the
+        bytes counting every value compressed so far"""
+        return {
+            "compressed": self.compressed,
+            "skipped": self.skipped,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+            "ratio": self.bytes_out / self.bytes_in if self.bytes_in else 1.0,
+            "compress_seconds": self.compress_ns / 1e9,
+            "decompress_seconds": self.decompress_ns / 1e9,
+            "decompressions": self.decompressions,
+            "decompressed_hits": self.decompressed_hits,
+        }
 
-    is_continue = True
-    while is_continue:
-        command = input("Enter command (put/get/delete/reset/exit): ")
-        if command == "put":
-            key = input("Enter key: ")
-            value = input("Enter value: ")
-            lru_cache.put(key, value)
-        elif command == "get":
-            key = input("Enter key: ")
-            print(lru_cache.get(key))
-        elif command == "delete":
-            key = input("Enter key: ")
-            lru_cache.delete(key)
-        elif command == "reset":
-            lru_cache.reset()
-        elif command == "exit":
-            is_continue = False
-        lru_cache.show()
+
+POLICIES = {
+    "lru": lambda capacity: DoublyLinkedList(),
+    "sieve": lambda capacity: SieveList(),
+    "clock": lambda capacity: ClockList(),
+    "arc": ARCPolicy,
+    "w-tinylfu": WTinyLFUPolicy,
+}
+
+
+def default_weigher(key, value):
+    """Return the approximate size in bytes of a key value pair"""
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+
+class LatencyHistogram:
+    """A histogram of latencies in power of two nanosecond buckets.
+
+    Attributes
+    ----------
+    counts : list
+        the number of latencies in each bucket, bucket n holding those
+        under 2 ** n nanoseconds
+    count: int
+        the number of latencies recorded
+    total: int
+        the sum of the latencies recorded in nanoseconds
+    """
+
+    def __init__(self):
+        self.counts = [0] * 64
+        self.count = 0
+        self.total = 0
+
+    def record(self, nanoseconds):
+        """Record one latency"""
+        self.counts[min(nanoseconds.bit_length(), 63)] += 1
+        self.count += 1
+        self.total += nanoseconds
+
+    def percentile(self, fraction):
+        """Return the upper bound in nanoseconds of the bucket holding a
+        fraction of the latencies"""
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return 1 << bucket
+        return 0
+
+    def merge(self, other):
+        """Add the latencies of another histogram to this one"""
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+
+    def snapshot(self):
+        """Return the count, mean and percentiles as a dictionary"""
+        return {
+            "count": self.count,
+            "mean_ns": self.total / self.count if self.count else 0,
+            "p50_ns": self.percentile(0.5),
+            "p90_ns": self.percentile(0.9),
+            "p99_ns": self.percentile(0.99),
+        }
+
+
+class CacheStats:
+    """Counters of cache operations and sampled latency histograms.
+
+    Attributes
+    ----------
+    hits, misses, puts, updates, evictions, expirations, deletes, resets,
+    rejections, promotions, refreshes : int
+        the number of each event, updates counting the puts of a key that
+        was already cached, rejections the puts too heavy to store or
+        refused admission,
+        promotions the hits read back from the spill tier and refreshes the
+        values reloaded ahead of expiry
+    latencies: dictionary
+        the LatencyHistogram of each sampled operation
+    """
+
+    COUNTERS = ("hits", "misses", "puts", "updates", "evictions",
+                "expirations", "deletes", "resets", "rejections", "promotions",
+                "refreshes")
+
+    def __init__(self):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.latencies = {}
+
+    def hit_ratio(self):
+        """Return the fraction of gets that were hits"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def merge(self, other):
+        """Add the counters and latencies of another CacheStats to this one"""
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for name, histogram in other.latencies.items():
+            self.latencies.setdefault(name, LatencyHistogram()).merge(histogram)
+
+    def snapshot(self):
+        """Return the counters, ratios and latencies as a dictionary"""
+        snapshot = {name: getattr(self, name) for name in self.COUNTERS}
+        snapshot["hit_ratio"] = self.hit_ratio()
+        snapshot["eviction_rate"] = self.evictions / self.puts if self.puts else 0.0
+        snapshot["latencies"] = {name: histogram.snapshot()
+                                 for name, histogram in self.latencies.items()}
+        return snapshot
+
+
+class TimerWheel:
+    """A hierarchical timing wheel of key expiry deadlines.
+
+    Deadlines are rounded up to ticks of resolution seconds. Level 0 has one
+    bucket per tick, and each bucket of a higher level spans a whole turn of
+    the level below it. When a lower level wraps around, the next bucket of
+    the level above is cascaded down, so every key is handled a bounded
+    number of times and advancing never scans keys that are not due.
+
+    Attributes
+    ----------
+    resolution : float
+        the length of one tick in seconds
+    deadlines: dictionary
+        the expiry deadline of each scheduled key
+    buckets: list
+        a list of bucket sets for each level
+    locations: dictionary
+        the bucket set each scheduled key is in
+    tick: int
+        the next tick to be processed
+    """
+
+    def __init__(self, resolution=1.0, bits=6, levels=4, now=0.0):
+        assert (resolution > 0), "Resolution must be greater than zero"
+        self.resolution = resolution
+        self.bits = bits
+        self.levels = levels
+        self.mask = (1 << bits) - 1
+        self.buckets = [[set() for _ in range(1 << bits)] for _ in range(levels)]
+        self.deadlines = {}
+        self.locations = {}
+        self.tick = int(now // resolution)
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def _place(self, key, expire_tick):
+        """Put a key in the bucket for its expiry tick"""
+        delta = expire_tick - self.tick
+        if delta < 0:
+            # already due, handle it on the next tick processed
+            expire_tick = self.tick
+            delta = 0
+        level = 0
+        while level < self.levels - 1 and delta >> (self.bits * (level + 1)):
+            level += 1
+        if delta >> (self.bits * self.levels):
+            # too far away for the wheel, park it in the last bucket reached
+            expire_tick = self.tick + (1 << (self.bits * self.levels)) - 1
+        bucket = self.buckets[level][(expire_tick >> (self.bits * level)) & self.mask]
+        bucket.add(key)
+        self.locations[key] = bucket
+
+    def schedule(self, key, deadline):
+        """Schedule a key to expire at a deadline, replacing any earlier one"""
+        self.cancel(key)
+        self.deadlines[key] = deadline
+        self._place(key, -int(-deadline // self.resolution))
+
+    def cancel(self, key):
+        """Forget the deadline of a key"""
+        bucket = self.locations.pop(key, None)
+        if bucket is not None:
+            bucket.discard(key)
+            del self.deadlines[key]
+
+    def _cascade(self, level):
+        """Move the keys of the current bucket of a level to lower levels"""
+        bucket = self.buckets[level][(self.tick >> (self.bits * level)) & self.mask]
+        keys = list(bucket)
+        bucket.clear()
+        for key in keys:
+            self._place(key, -int(-self.deadlines[key] // self.resolution))
+
+    def advance(self, now):
+        """Process every tick up to now.
+
+        Parameter:
+        now (float): the current time
+
+        Returns:
+            keys (list): the keys whose deadline has passed
+        """
+        target = int(now // self.resolution)
+        expired = []
+        while self.tick <= target:
+            if not self.deadlines:
+                # nothing scheduled, skip straight past the idle ticks
+                self.tick = target + 1
+                break
+            level = 1
+            while level < self.levels and not self.tick & ((1 << (self.bits * level)) - 1):
+                self._cascade(level)
+                level += 1
+            bucket = self.buckets[0][self.tick & self.mask]
+            for key in bucket:
+                del self.deadlines[key]
+                del self.locations[key]
+            expired.extend(bucket)
+            bucket.clear()
+            self.tick += 1
+        return expired
+
+    def clear(self):
+        """Forget every deadline"""
+        for level in self.buckets:
+            for bucket in level:
+                bucket.clear()
+        self.deadlines.clear()
+        self.locations.clear()
+
+
+class LRUCache:
+    """An impelementation of a Least Recently Used Cache.
+
+    Attributes
+    ----------
+    max_size : int
+        the maximum capacity of the cache
+    dictionary: dictionary
+        a dictionary containing the key value pairs of items in the cache
+    policy: DoublyLinkedList
+        the eviction policy ordering the items of the cache, by default a
+        doubly linked list kept in LRU order
+    max_concurrent_loads: int
+        the most loaders get_or_load runs at once, or None for no limit
+    loads: dictionary
+        the in flight get_or_load task and its waiter count for each key
+    ttl: float
+        the default number of seconds items live for, or None to keep them
+        until they are evicted
+    clock: callable
+        returns the current time in seconds
+    timer_wheel: TimerWheel
+        the expiry deadlines of the items put with a ttl, created when the
+        first one is put
+    max_weight: int
+        the maximum total weight of the cache, or None to bound it by
+        max_size alone
+    weigher: callable
+        returns the weight of a key value pair, by default its approximate
+        size in bytes
+    weights: dictionary
+        the weight of each item when max_weight is set
+    weight: int
+        the total weight of the items in the cache
+    stats: CacheStats
+        the operation counters and latencies, or None when not collected
+    on_evict: callable
+        called with the key and value of each item evicted, or None
+    on_miss: callable
+        called with each key not found by get, or None
+    spill: SpillTier
+        the disk tier evicted items are written to and read back from on a
+        miss, or None to drop them
+    evictions_per_operation: int
+        the most items over max_size each put and get evicts after resize
+        shrinks the cache, zero once it fits again
+    store: callable
+        in write-back mode, called with a dictionary of the key value pairs
+        put since the last flush, or None to only cache the values put
+    dirty: dictionary
+        the values put and not yet passed to store
+    flush_thread: FlushThread
+        the thread calling store in the background, in write-back mode
+    loader: callable
+        called with a key on a pool thread to reload a value read through
+        get once refresh_ahead of its ttl has passed, or None
+    refresh_at: dictionary
+        the time each key with a ttl is due for reloading, and its ttl
+    refreshing: dictionary
+        a token for each reload in flight, replaced or dropped when the key
+        is put or removed so that a stale reload is not applied
+    refreshed: deque
+        the results of finished reloads, put by the next get or put
+    touch: callable
+        promotes an item hit by a get, the policy update unless promotions
+        are throttled by promotion_interval hits or promotion_delay seconds
+        since an item's last one, or batched in an access_buffer
+    access_buffer: list
+        the items hit and not promoted yet, in access_buffer mode
+    admission: AdmissionFilter
+        decides whether a new key put into the full cache is stored at the
+        cost of the eviction victim, or None to store every key. Hits and
+        puts count as accesses, misses do not, so the put after a miss is
+        a key's first access
+    compression: Compressor
+        compresses large values as they are put and decompresses them as
+        they are read, or None to keep every value as it is
+    tags: dictionary
+        the keys put with each tag
+    key_tags: dictionary
+        the tags of each key put with any
+    sorted_keys: SortedKeys
+        every key in sorted order, for prefix and range lookups, or None
+        when key_index is not set
+    """
+
+    def __init__(self, max_size=None, max_concurrent_loads=None, ttl=None,
+                 clock=time.monotonic, timer_resolution=1.0, max_weight=None,
+                 weigher=None, policy="lru", stats=False,
+                 latency_sample_rate=0.0, on_evict=None, on_miss=None, spill=None,
+                 store=None, flush_threshold=1000, flush_interval=1.0,
+                 loader=None, refresh_ahead=0.8, max_concurrent_refreshes=4,
+                 promotion_interval=None, promotion_delay=None, access_buffer=None,
+                 admission=None, compression=None, key_index=False):
+        assert (max_size is not None or max_weight is not None), \
+            "Max capacity or max weight is required"
+        if max_size is not None:
+            max_size = int(max_size)
+            assert (max_size > 0), "Max capacity must be greater than zero"
+        assert (max_weight is None or max_weight > 0), \
+            "Max weight must be greater than zero"
+        assert (ttl is None or ttl > 0), "TTL must be greater than zero"
+        self.max_size = max_size
+        self.evictions_per_operation = 0
+        self.max_weight = max_weight
+        self.weigher = weigher or default_weigher
+        self.weights = {}
+        self.weight = 0
+        self.dictionary = {}
+        if isinstance(policy, str):
+            assert (policy in POLICIES), "Unknown eviction policy " + policy
+            policy = POLICIES[policy](max_size)
+        self.policy = policy
+        self.max_concurrent_loads = max_concurrent_loads
+        self.loads = {}
+        # a semaphore is bound to one event loop, so keep one per loop
+        self.load_semaphores = weakref.WeakKeyDictionary()
+        self.ttl = ttl
+        self.clock = clock
+        self.timer_resolution = timer_resolution
+        self.timer_wheel = None
+        self.on_evict = on_evict
+        self.on_miss = on_miss
+        self.spill = spill
+        self.store = store
+        self.dirty = {}
+        self.dirty_lock = threading.Lock()
+        # held by flush from taking the batch until it is written
+        self.flush_lock = threading.RLock()
+        self.flush_threshold = flush_threshold
+        self.flush_errors = 0
+        self.last_flush_error = None
+        self.flush_thread = None
+        if store is not None:
+            self.flush_thread = FlushThread(flush_interval, self.flush)
+            self.flush_thread.start()
+        self.loader = loader
+        self.refresh_ahead = refresh_ahead
+        self.max_concurrent_refreshes = max_concurrent_refreshes
+        self.refresh_at = {}
+        self.refreshing = {}
+        self.refreshed = deque()
+        self.refresh_pool = None
+        self.refresh_errors = 0
+        self.last_refresh_error = None
+        assert ((promotion_interval, promotion_delay, access_buffer).count(None) >= 2), \
+            "Choose one way of throttling promotions"
+        self.access_buffer = None
+        if promotion_interval is not None:
+            self.touch = self._touch_every(promotion_interval)
+        elif promotion_delay is not None:
+            self.touch = self._touch_after(promotion_delay)
+        elif access_buffer is not None:
+            self.access_buffer = []
+            self.touch = self._touch_buffered(access_buffer)
+        else:
+            self.touch = self.policy.update
+        if admission is True:
+            assert (max_size is not None), "Admission needs a max capacity"
+            admission = AdmissionFilter(max_size)
+        self.admission = admission or None
+        if self.admission is not None:
+            self.touch = self._touch_recorded(self.touch)
+        if compression is True:
+            compression = Compressor()
+        self.compression = compression or None
+        self.tags = {}
+        self.key_tags = {}
+        # keys must be comparable with each other, such as all strings
+        self.sorted_keys = SortedKeys() if key_index else None
+        self.stats = CacheStats() if stats or latency_sample_rate else None
+        if latency_sample_rate:
+            # only sampled instances pay for the timing wrappers
+            interval = max(1, round(1 / latency_sample_rate))
+            for name in ("get", "put", "delete", "get_many", "put_many", "delete_many"):
+                setattr(self, name, self._timed(name, getattr(self, name), interval))
+
+    def _timed(self, name, method, interval):
+        """Wrap a method to record the latency of one in interval calls"""
+        histogram = self.stats.latencies[name] = LatencyHistogram()
+        calls = 0
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            nonlocal calls
+            calls += 1
+            if calls < interval:
+                return method(*args, **kwargs)
+            calls = 0
+            start = time.perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                histogram.record(time.perf_counter_ns() - start)
+
+        return timed
+
+    def _touch_recorded(self, touch):
+        """Return a touch counting each hit in the admission filter too"""
+        record = self.admission.record
+
+        def recorded_touch(item):
+            record(item.key)
+            touch(item)
+
+        return recorded_touch
+
+    def _touch_every(self, interval):
+        """Return a touch promoting an item only if interval hits have gone
+        by since its last promotion, so hot items near the head stay put"""
+        update = self.policy.update
+        # new items have a zero stamp, so their first hit promotes them
+        hits = interval
+
+        def touch(item):
+            nonlocal hits
+            hits += 1
+            if hits - item.stamp >= interval:
+                item.stamp = hits
+                update(item)
+
+        return touch
+
+    def _touch_after(self, delay):
+        """Return a touch promoting an item only if delay seconds have gone
+        by since its last promotion"""
+        update = self.policy.update
+        clock = self.clock
+
+        def touch(item):
+            now = clock()
+            if now - item.stamp >= delay:
+                item.stamp = now
+                update(item)
+
+        return touch
+
+    def _touch_buffered(self, size):
+        """Return a touch recording hits in the access buffer, to be
+        replayed in one batch when it fills up or before an eviction"""
+        buffer = self.access_buffer
+        append = buffer.append
+
+        def touch(item):
+            append(item)
+            if len(buffer) >= size:
+                self.drain_access_buffer()
+
+        return touch
+
+    def drain_access_buffer(self):
+        """Promote the items hit since the last drain, in hit order"""
+        buffer = self.access_buffer
+        if not buffer:
+            return
+        dictionary = self.dictionary
+        update = self.policy.update
+        for item in buffer:
+            # skip the items removed since they were hit
+            if dictionary.get(item.key) is item:
+                update(item)
+        buffer.clear()
+
+    def put(self, key, value, ttl=None, tags=None):
+        """Put a key value pair into the cache.
+
+        Parameters:
+        key (string): the cache item key
+        value (string): the cach item value
+        ttl (float): the seconds the item lives for, defaulting to the
+            cache ttl
+        tags (iterable): the tags to invalidate the item by, replacing any
+            it had. A put without tags leaves the item's tags as they were
+
+        With max_weight set, tails are evicted until the item fits, and an
+        item heavier than max_weight is not stored at all.
+
+        In write-back mode the value is marked dirty and passed to store by a
+        later flush, a value too heavy to cache being written at once.
+
+        With compression, a large value is held compressed, and max_weight
+        counts its compressed size.
+        """
+        self._put(key, value, ttl, self.store is not None)
+        if tags is not None and key in self.dictionary:
+            self._tag(key, tags)
+
+    def _tag(self, key, tags):
+        """Replace the tags of a cached key"""
+        if isinstance(tags, str):
+            tags = (tags,)
+        tags = frozenset(tags)
+        if self.key_tags:
+            self._untag(key)
+        if tags:
+            self.key_tags[key] = tags
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+
+    def _untag(self, key):
+        """Drop a key from the tag index"""
+        for tag in self.key_tags.pop(key, ()):
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    def _put(self, key, value, ttl, dirty):
+        """Put a key value pair, marking it dirty if asked to"""
+        if self.evictions_per_operation:
+            self.shrink(self.evictions_per_operation)
+        if self.loader is not None:
+            if self.refreshed:
+                self._apply_refreshes()
+            # a reload in flight is older than this value
+            self.refreshing.pop(key, None)
+        if self.admission is not None:
+            if (self.max_size is None or key in self.dictionary
+                    or len(self.dictionary) < self.max_size):
+                # there is no victim to compete with
+                self.admission.record(key)
+            elif not self.admission.admit(key, self.policy.victim()):
+                if self.stats is not None:
+                    self.stats.rejections += 1
+                if self.spill is not None:
+                    self.spill.delete(key)
+                if dirty:
+                    self._write({key: value})
+                return
+        stored = value if self.compression is None else self.compression.compress(value)
+        if self.max_weight is not None:
+            if not self._fit(key, stored):
+                if dirty:
+                    # it can't wait in the cache, write it through
+                    self._write({key: value})
+                return
+        if self.stats is not None:
+            self.stats.puts += 1
+            if key in self.dictionary:
+                self.stats.updates += 1
+        self._insert(key, stored, ttl)
+        if dirty:
+            with self.dirty_lock:
+                self.dirty[key] = value
+                full = len(self.dirty) >= self.flush_threshold
+            if full:
+                self.flush_thread.wake.set()
+
+    def _insert(self, key, value, ttl):
+        """Store a key value pair that fits, without counting it as a put"""
+        if key in self.dictionary:
+            # key already exists, update it
+            self.dictionary[key].value = value
+            self.policy.update(self.dictionary[key])
+        else:
+            # this is a new key value pair
+            if self.max_size is not None and len(self.dictionary) >= self.max_size:
+                #it will exceed max capacity, remove tail first
+                self._evict()
+            item = Item(key, value)
+            self.policy.add(item)
+            self.dictionary[key] = item
+            if self.sorted_keys is not None:
+                self.sorted_keys.add(key)
+            if self.spill is not None:
+                # a spilled copy is stale now
+                self.spill.delete(key)
+        if ttl is not None or self.ttl is not None or self.timer_wheel is not None:
+            self._set_ttl(key, ttl)
+
+    def _fit(self, key, value):
+        """Make room for the weight of a key value pair.
+
+        Returns:
+            fits (bool): whether the pair can be stored, if not any old
+            value of the key has been deleted
+        """
+        weight = self.weigher(key, value)
+        if weight > self.max_weight:
+            # rejected, don't leave a stale value behind either
+            self._remove(key)
+            if self.stats is not None:
+                self.stats.rejections += 1
+            return False
+        item = self.dictionary.get(key)
+        if item is not None:
+            if self.access_buffer:
+                # replay buffered hits while the item is still linked
+                self.drain_access_buffer()
+            # take it out of the policy so it can't be evicted below
+            self.policy.delete(item)
+        self.weight += weight - self.weights.get(key, 0)
+        self.weights[key] = weight
+        while self.weight > self.max_weight:
+            self._evict()
+        if item is not None:
+            self.policy.add(item)
+        return True
+
+    def _set_ttl(self, key, ttl):
+        """Schedule a key to expire after ttl seconds, or the cache ttl"""
+        if ttl is None:
+            ttl = self.ttl
+        if ttl is None:
+            if self.timer_wheel is not None:
+                self.timer_wheel.cancel(key)
+            self.refresh_at.pop(key, None)
+            return
+        now = self.clock()
+        if self.timer_wheel is None:
+            self.timer_wheel = TimerWheel(self.timer_resolution, now=now)
+        self.timer_wheel.schedule(key, now + ttl)
+        if self.loader is not None:
+            self.refresh_at[key] = (now + ttl * self.refresh_ahead, ttl)
+
+    def put_many(self, pairs, ttl=None):
+        """Put many key value pairs into the cache in one pass.
+
+        With the default LRU policy every pair is inserted or updated first
+        and only the tails over max capacity are evicted afterwards, leaving
+        the same contents as putting each pair in turn. Other policies pick
+        their victims by what they have seen so far, so they evict before
+        each new pair as put does.
+
+        Parameters:
+        pairs (dictionary or iterable): the key value pairs to put
+        ttl (float): the seconds the items live for, defaulting to the
+            cache ttl
+        """
+        if hasattr(pairs, "items"):
+            pairs = pairs.items()
+        if self.evictions_per_operation:
+            self.shrink(self.evictions_per_operation)
+        if (self.max_weight is not None or self.store is not None or self.loader is not None
+                or self.admission is not None or self.compression is not None):
+            for key, value in pairs:
+                self.put(key, value, ttl)
+            return
+        dictionary = self.dictionary
+        add = self.policy.add
+        update = self.policy.update
+        expiring = ttl is not None or self.ttl is not None or self.timer_wheel is not None
+        sorted_keys = self.sorted_keys
+        max_size = self.max_size
+        # buffered hits replayed by an eviction would land above the new items
+        evict_each = max_size is not None and (
+            type(self.policy) is not DoublyLinkedList or self.access_buffer is not None)
+        size = len(dictionary)
+        puts = 0
+        inserts = 0
+        for key, value in pairs:
+            puts += 1
+            item = dictionary.get(key)
+            if item is None:
+                if evict_each and len(dictionary) >= max_size:
+                    self._evict()
+                inserts += 1
+                item = Item(key, value)
+                add(item)
+                dictionary[key] = item
+                if sorted_keys is not None:
+                    sorted_keys.add(key)
+                if self.spill is not None:
+                    self.spill.delete(key)
+            else:
+                item.value = value
+                update(item)
+            if expiring:
+                self._set_ttl(key, ttl)
+        if self.stats is not None:
+            self.stats.puts += puts
+            self.stats.updates += puts - inserts
+        if max_size is not None and not evict_each:
+            # only evict for the new items, resize evicts any older excess
+            for _ in range(len(dictionary) - max(max_size, size)):
+                self._evict()
+
+    @property
+    def doubly_linked_list(self):
+        """The eviction policy, a DoublyLinkedList unless another was chosen"""
+        return self.policy
+
+    def _evict(self):
+        """Remove the item chosen by the eviction policy from the cache"""
+        if self.access_buffer:
+            self.drain_access_buffer()
+        item = self.policy.evict()
+        del self.dictionary[item.key]
+        # a tagged copy on disk could outlive an invalidation of its tag
+        if self.spill is not None and item.key not in self.key_tags:
+            deadline = None
+            if self.timer_wheel is not None:
+                deadline = self.timer_wheel.deadlines.get(item.key)
+            self.spill.put(item.key, (item.value, deadline))
+        self._forget(item.key)
+        if self.stats is not None:
+            self.stats.evictions += 1
+        if self.on_evict is not None:
+            value = item.value
+            if self.compression is not None:
+                value = self.compression.decompress(value)
+            self.on_evict(item.key, value)
+
+    def _remove(self, key):
+        """Remove a key from the cache, returning whether it was there"""
+        item = self.dictionary.pop(key, None)
+        if item is None:
+            return False
+        self.policy.delete(item)
+        self._forget(key)
+        return True
+
+    def _forget(self, key):
+        """Drop the bookkeeping of a key removed from the cache"""
+        if self.timer_wheel is not None:
+            self.timer_wheel.cancel(key)
+        if self.max_weight is not None:
+            self.weight -= self.weights.pop(key, 0)
+        if self.compression is not None:
+            self.compression.forget(key)
+        if self.key_tags:
+            self._untag(key)
+        if self.sorted_keys is not None:
+            self.sorted_keys.discard(key)
+        if self.refresh_at:
+            self.refresh_at.pop(key, None)
+        if self.refreshing:
+            # a reload in flight must not bring the key back
+            self.refreshing.pop(key, None)
+        if self.dirty and key in self.dirty:
+            # its value must reach the store before it leaves the cache
+            with self.dirty_lock:
+                batch = {key: self.dirty.pop(key)} if key in self.dirty else None
+            if batch:
+                self._write(batch)
+
+    def flush(self):
+        """Pass every dirty value to the store in one batch.
+
+        Called by the flush thread every flush_interval seconds, or sooner
+        once flush_threshold values are dirty. A batch the store fails on
+        stays dirty, without overwriting values put since, to be retried.
+
+        Returns:
+            count (int): the number of values written
+        """
+        if self.store is None:
+            return 0
+        # a value written by an eviction in between must not land first
+        with self.flush_lock:
+            with self.dirty_lock:
+                batch, self.dirty = self.dirty, {}
+            if not batch:
+                return 0
+            return len(batch) if self._write(batch) else 0
+
+    def _write(self, batch):
+        """Pass a batch to the store, one batch at a time so later values
+        always land last, returning whether it succeeded"""
+        with self.flush_lock:
+            try:
+                self.store(batch)
+                return True
+            except Exception as error:
+                self.flush_errors += 1
+                self.last_flush_error = error
+                with self.dirty_lock:
+                    for key, value in batch.items():
+                        self.dirty.setdefault(key, value)
+                return False
+
+    def close(self):
+        """Flush the dirty values and stop the flush and refresh threads"""
+        if self.flush_thread is not None:
+            self.flush_thread.stop()
+            self.flush_thread = None
+        self.flush()
+        if self.refresh_pool is not None:
+            self.refresh_pool.shutdown(cancel_futures=True)
+            self.refresh_pool = None
+
+    def _expired(self, key):
+        """Return whether a key in the cache has passed its deadline"""
+        deadline = self.timer_wheel.deadlines.get(key)
+        return deadline is not None and deadline <= self.clock()
+
+    def get(self, key, default=None):
+        """Get a value from the cache by its key.
+
+        Expired items are deleted as they are found. With a loader, an item
+        past refresh_ahead of its ttl is reloaded in the background, and its
+        current value is returned, even once expired, until the reload is
+        put.
+
+        Parameter:
+        key (string): the cache item key
+        default: the value to return when the key is not in the cache
+
+        Returns:
+            value (string): the corresponding cache item value
+        """
+        if self.evictions_per_operation:
+            self.shrink(self.evictions_per_operation)
+        if self.refreshed:
+            self._apply_refreshes()
+        item = self.dictionary.get(key)
+        if item is None or (self.timer_wheel is not None and self._expired(key)):
+            if item is not None and key in self.refreshing:
+                # stale while revalidating
+                if self.stats is not None:
+                    self.stats.hits += 1
+                self.touch(item)
+                if self.compression is not None:
+                    return self.compression.decompress(item.value, key)
+                return item.value
+            if item is None and self.spill is not None:
+                value = self._promote(key)
+                if value is not _MISSING:
+                    return value
+            if self.stats is not None or self.on_miss is not None:
+                self._missed(key, item is not None)
+            if item is not None:
+                self._remove(key)
+            return default
+        if self.stats is not None:
+            self.stats.hits += 1
+        self.touch(item)
+        if self.refresh_at and key in self.refresh_at:
+            self._refresh(key)
+        if self.compression is not None:
+            return self.compression.decompress(item.value, key)
+        return item.value
+
+    def _refresh(self, key):
+        """Start reloading a key on the refresh pool once it is due"""
+        refresh_at, ttl = self.refresh_at[key]
+        if refresh_at > self.clock() or len(self.refreshing) >= self.max_concurrent_refreshes:
+            return
+        del self.refresh_at[key]
+        token = self.refreshing[key] = object()
+        if self.refresh_pool is None:
+            self.refresh_pool = ThreadPoolExecutor(self.max_concurrent_refreshes)
+        self.refresh_pool.submit(self._reload, key, ttl, token)
+
+    def _reload(self, key, ttl, token):
+        """Run the loader on a pool thread, queueing its result"""
+        try:
+            self.refreshed.append((key, ttl, token, self.loader(key), None))
+        except Exception as error:
+            self.refreshed.append((key, ttl, token, None, error))
+
+    def _apply_refreshes(self):
+        """Put the reloaded values, on the thread using the cache"""
+        while self.refreshed:
+            key, ttl, token, value, error = self.refreshed.popleft()
+            if self.refreshing.get(key) is not token:
+                # the key was put or removed since, the reload is stale
+                continue
+            del self.refreshing[key]
+            if error is not None:
+                self.refresh_errors += 1
+                self.last_refresh_error = error
+                if key in self.dictionary and not self._expired(key):
+                    # try again on the next get
+                    self.refresh_at[key] = (self.clock(), ttl)
+                continue
+            self._put(key, value, ttl, False)
+            if self.stats is not None:
+                self.stats.refreshes += 1
+
+    def _promote(self, key):
+        """Move a key back from the spill tier, returning its value or
+        _MISSING when it is not there or has expired"""
+        entry = self.spill.pop(key)
+        if entry is None:
+            return _MISSING
+        value, deadline = entry
+        ttl = None
+        if deadline is not None:
+            ttl = deadline - self.clock()
+            if ttl <= 0:
+                return _MISSING
+        if self.max_weight is not None and not self._fit(key, value):
+            return _MISSING
+        self._insert(key, value, ttl)
+        if self.stats is not None:
+            self.stats.hits += 1
+            self.stats.promotions += 1
+        if self.compression is not None:
+            return self.compression.decompress(value, key)
+        return value
+
+    def peek(self, key, default=None):
+        """Get a value from the cache without changing its recency.
+
+        Nothing is counted, promoted, reloaded or deleted.
+
+        Parameter:
+        key (string): the cache item key
+        default: the value to return when the key is not in the cache
+
+        Returns:
+            value (string): the corresponding cache item value
+        """
+        item = self.dictionary.get(key)
+        if item is None or (self.timer_wheel is not None and self._expired(key)):
+            return default
+        if self.compression is not None:
+            return self.compression.decompress(item.value)
+        return item.value
+
+    def _missed(self, key, expired):
+        """Count a miss and call the on_miss hook"""
+        if self.stats is not None:
+            self.stats.misses += 1
+            if expired:
+                self.stats.expirations += 1
+        if self.on_miss is not None:
+            self.on_miss(key)
+
+    def get_many(self, keys, as_list=False, default=None):
+        """Get the values of many keys from the cache in one pass.
+
+        Parameters:
+        keys (iterable): the cache item keys
+        as_list (bool): return a list in the order of keys instead of a
+            dictionary of the keys found
+        default: the value listed for missing keys when as_list is set
+
+        Returns:
+            values (dictionary or list): the corresponding cache item values
+        """
+        if self.evictions_per_operation:
+            self.shrink(self.evictions_per_operation)
+        instrumented = self.stats is not None or self.on_miss is not None
+        if (instrumented or self.timer_wheel is not None or self.spill is not None
+                or self.compression is not None):
+            keys = list(keys)
+        if self.timer_wheel is not None and self.timer_wheel.deadlines:
+            # drop the expired keys up front so the loops below stay simple
+            for key in keys:
+                # keys being reloaded are served stale, as get does
+                if (key in self.dictionary and key not in self.refreshing
+                        and self._expired(key)):
+                    self._remove(key)
+                    if self.stats is not None:
+                        self.stats.expirations += 1
+        dictionary = self.dictionary
+        spill = self.spill
+        if instrumented:
+            # the loops below only ever find keys that are still cached
+            for key in keys:
+                if key in dictionary:
+                    if self.stats is not None:
+                        self.stats.hits += 1
+                elif spill is None:
+                    # with a spill tier misses are counted once promotion fails
+                    self._missed(key, False)
+        update = self.touch
+        if as_list:
+            values = []
+            append = values.append
+            missed = []
+            for key in keys:
+                item = dictionary.get(key)
+                if item is None:
+                    if spill is not None:
+                        missed.append(len(values))
+                    append(default)
+                else:
+                    update(item)
+                    append(item.value)
+            if self.compression is not None:
+                decompress = self.compression.decompress
+                values = [decompress(value, key) for key, value in zip(keys, values)]
+            if spill is not None:
+                # promote after reading the hits, which promotions may evict
+                found = {}
+                for index in missed:
+                    key = keys[index]
+                    if key not in found:
+                        found[key] = self._promote_missed(key, instrumented)
+                    if found[key] is not _MISSING:
+                        values[index] = found[key]
+            return values
+        values = {}
+        for key in keys:
+            item = dictionary.get(key)
+            if item is not None:
+                update(item)
+                values[key] = item.value
+        if self.compression is not None:
+            decompress = self.compression.decompress
+            values = {key: decompress(value, key) for key, value in values.items()}
+        if spill is not None:
+            # promote after reading the hits, which promotions may evict
+            for key in keys:
+                if key not in values:
+                    value = self._promote_missed(key, instrumented)
+                    if value is not _MISSING:
+                        values[key] = value
+        return values
+
+    def _promote_missed(self, key, instrumented):
+        """Promote a key missing from memory, counting a miss if it is not
+        in the spill tier either"""
+        value = self._promote(key)
+        if value is _MISSING and instrumented:
+            self._missed(key, False)
+        return value
+
+    async def get_or_load(self, key, loader):
+        """Get a value from the cache, loading it on a miss.
+
+        Concurrent misses on the same key share a single load, so the
+        loader runs once and every waiter receives its result. A failed
+        load is not cached and its exception is raised to every waiter. If
+        every waiter is cancelled the load is cancelled too.
+
+        Parameters:
+        key (string): the cache item key
+        loader (callable): called with the key, returning an awaitable
+            that resolves to the value
+
+        Returns:
+            value (string): the cached or freshly loaded value
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        load = self.loads.get(key)
+        if load is None:
+            task = asyncio.ensure_future(self._load(key, loader))
+            load = self.loads[key] = [task, 0]
+
+            def forget(finished_task):
+                if self.loads.get(key) is load:
+                    del self.loads[key]
+
+            task.add_done_callback(forget)
+        task = load[0]
+        load[1] += 1
+        try:
+            # shield the shared task so one cancelled waiter leaves the
+            # load running for the others
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and load[1] == 1:
+                task.cancel()
+            raise
+        finally:
+            load[1] -= 1
+
+    async def _load(self, key, loader):
+        """Run a loader, bounded by max_concurrent_loads, and cache its value"""
+        if self.max_concurrent_loads is None:
+            value = await loader(key)
+        else:
+            loop = asyncio.get_running_loop()
+            semaphore = self.load_semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self.load_semaphores[loop] = asyncio.Semaphore(
+                    self.max_concurrent_loads)
+            async with semaphore:
+                value = await loader(key)
+        # a loaded value is already in the backing store, it isn't dirty
+        self._put(key, value, None, False)
+        return value
+
+    def delete(self, key):
+        """Delete a value from the cache by its key.
+
+        Parameter:
+        key (string): the key of the cache item to delete
+        """
+        if self._remove(key) and self.stats is not None:
+            self.stats.deletes += 1
+        if self.spill is not None:
+            self.spill.delete(key)
+
+    def delete_many(self, keys):
+        """Delete the values of many keys from the cache in one pass.
+
+        Parameter:
+        keys (iterable): the keys of the cache items to delete
+        """
+        pop = self.dictionary.pop
+        delete = self.policy.delete
+        for key in keys:
+            item = pop(key, None)
+            if item is not None:
+                delete(item)
+                self._forget(key)
+                if self.stats is not None:
+                    self.stats.deletes += 1
+            elif self.spill is not None:
+                self.spill.delete(key)
+
+    def invalidate_tag(self, tag):
+        """Delete every item put with a tag.
+
+        Parameter:
+        tag: the tag of the items to delete
+
+        Returns:
+            count (int): the number of items deleted
+        """
+        keys = self.tags.pop(tag, None)
+        if not keys:
+            return 0
+        self.delete_many(list(keys))
+        return len(keys)
+
+    def keys_with_prefix(self, prefix):
+        """Return the cached keys starting with a prefix, in sorted order.
+
+        With key_index set this takes time in proportion to the keys found,
+        otherwise every key is scanned.
+        """
+        if self.sorted_keys is None:
+            return sorted(key for key in self.dictionary
+                          if isinstance(key, type(prefix)) and key.startswith(prefix))
+        keys = []
+        for key in self.sorted_keys.irange(prefix):
+            if not key.startswith(prefix):
+                break
+            keys.append(key)
+        return keys
+
+    def keys_in_range(self, start, stop):
+        """Return the cached keys from start up to but not including stop,
+        in sorted order. Needs key_index."""
+        assert (self.sorted_keys is not None), "Range lookups need key_index"
+        return list(self.sorted_keys.irange(start, stop))
+
+    def invalidate_prefix(self, prefix):
+        """Delete every item whose key starts with a prefix, along with any
+        copies in the spill tier.
+
+        With key_index set the items in memory are found in time in
+        proportion to the matches, but the spill tier's keys are not
+        indexed, so with a spill tier every key on disk is scanned too.
+
+        Parameter:
+        prefix (string): the start of the keys of the items to delete
+
+        Returns:
+            count (int): the number of items deleted from memory
+        """
+        keys = self.keys_with_prefix(prefix)
+        self.delete_many(keys)
+        if self.spill is not None:
+            for key in self.spill.keys():
+                if isinstance(key, type(prefix)) and key.startswith(prefix):
+                    self.spill.delete(key)
+        return len(keys)
+
+    def resize(self, max_size, evictions_per_operation=8):
+        """Change the maximum capacity of the cache.
+
+        Growing takes effect at once. When shrinking, the cache never grows
+        again, but the items over the new max_size are evicted a few at a
+        time by each following put and get, so no single call stalls on
+        evicting them all. Call shrink from a periodic task to evict them
+        during quiet periods instead.
+
+        Parameters:
+        max_size (int): the new maximum capacity
+        evictions_per_operation (int): the most items over max_size each
+            put and get evicts
+        """
+        max_size = int(max_size)
+        assert (max_size > 0), "Max capacity must be greater than zero"
+        self.max_size = max_size
+        if hasattr(self.policy, "resize"):
+            self.policy.resize(max_size)
+        self.evictions_per_operation = evictions_per_operation
+        self.shrink(evictions_per_operation)
+
+    def shrink(self, limit=None):
+        """Evict up to limit items over max_size, all of them by default.
+
+        Returns:
+            count (int): the number of items evicted
+        """
+        if self.max_size is None:
+            return 0
+        excess = len(self.dictionary) - self.max_size
+        if limit is not None:
+            excess = min(excess, limit)
+        for _ in range(excess):
+            self._evict()
+        if len(self.dictionary) <= self.max_size:
+            self.evictions_per_operation = 0
+        return max(excess, 0)
+
+    def expire(self):
+        """Delete the items whose ttl has passed.
+
+        Only the timer wheel buckets that have come due are visited, so this
+        is cheap enough to call from a periodic task during quiet periods.
+        Items being reloaded are kept, still expired, for get to serve until
+        their reload is put.
+
+        Returns:
+            count (int): the number of items deleted
+        """
+        if self.timer_wheel is None:
+            return 0
+        now = self.clock()
+        count = 0
+        for key in self.timer_wheel.advance(now):
+            if key in self.refreshing:
+                # stale while revalidating, look at it again next time
+                self.timer_wheel.schedule(key, now)
+                continue
+            self.policy.delete(self.dictionary.pop(key))
+            self._forget(key)
+            count += 1
+        if self.stats is not None:
+            self.stats.expirations += count
+        return count
+
+    def reset(self):
+        """Reset the cache to be empty, flushing any dirty values first."""
+        self.flush()
+        self.dictionary = {}
+        self.policy.clear()
+        self.refresh_at = {}
+        self.refreshing = {}
+        if self.admission is not None:
+            self.admission.clear()
+        if self.compression is not None:
+            self.compression.clear()
+        self.tags = {}
+        self.key_tags = {}
+        if self.sorted_keys is not None:
+            self.sorted_keys.clear()
+        if self.access_buffer is not None:
+            self.access_buffer.clear()
+        if self.timer_wheel is not None:
+            self.timer_wheel.clear()
+        self.weights = {}
+        self.weight = 0
+        if self.spill is not None:
+            self.spill.clear()
+        if self.stats is not None:
+            self.stats.resets += 1
+
+    def show(self):
+        """Print the contents of the cache."""
+        print("------------------")
+        print("Current LRU Cache:")
+        if self.access_buffer:
+            self.drain_access_buffer()
+        for item in self.policy:
+            value = item.value
+            if self.compression is not None:
+                value = self.compression.decompress(value)
+            print(item.key, value)
+        print("Max capacity = ", self.max_size)
+        if self.max_weight is not None:
+            print("Weight = ", self.weight, "of", self.max_weight)
+
+    def items(self):
+        """Return the unexpired key value pairs, least recently used first"""
+        if self.access_buffer:
+            self.drain_access_buffer()
+        expiring = self.timer_wheel is not None
+        pairs = []
+        for item in reversed(list(self.policy)):
+            if expiring and self._expired(item.key):
+                continue
+            pairs.append((item.key, item.value))
+        if self.compression is not None:
+            decompress = self.compression.decompress
+            pairs = [(key, decompress(value)) for key, value in pairs]
+        return pairs
+
+    def save(self, path):
+        """Save the contents of the cache to a snapshot file.
+
+        Parameter:
+        path (string): the file to write, replaced atomically
+        """
+        write_snapshot(path, self.items())
+
+    def load(self, path):
+        """Put the contents of a snapshot file into the cache.
+
+        Items are put least recently used first, so recency order is
+        restored, and they get the cache ttl rather than what remained of
+        their own.
+
+        Parameter:
+        path (string): the snapshot file to read
+
+        Returns:
+            count (int): the number of items put
+        """
+        count = 0
+        for key, value in read_snapshot(path, self.max_size):
+            # restored values came from the store, they aren't dirty
+            self._put(key, value, None, False)
+            count += 1
+        return count
+
+    def save_periodically(self, path, interval, lock=None):
+        """Start a thread saving a snapshot every interval seconds.
+
+        The cache is only read while holding lock, if given, which must be
+        the lock every other thread using the cache holds.
+
+        Returns:
+            thread (PeriodicThread): the started thread, stop it when done
+        """
+        def save():
+            if lock is None:
+                pairs = self.items()
+            else:
+                with lock:
+                    pairs = self.items()
+            write_snapshot(path, pairs)
+
+        thread = PeriodicThread(interval, save)
+        thread.start()
+        return thread
+
+    def __len__(self):
+        return len(self.dictionary)
+
+    def memory_usage(self):
+        """Return the approximate bytes used by the cache bookkeeping.
+
+        Keys and values are not counted, only the dictionary and the items
+        linking them together.
+        """
+        return (sys.getsizeof(self.dictionary)
+                + len(self.dictionary) * sys.getsizeof(Item(None, None)))
+
+    def bytes_per_entry(self):
+        """Return the approximate bookkeeping bytes used per cache entry."""
+        if not self.dictionary:
+            return 0
+        return self.memory_usage() / len(self.dictionary)
+
+
+class CompactLRUCache:
+    """An array backed implementation of a Least Recently Used Cache.
+
+    Instead of allocating an Item per entry, keys and values are stored in
+    slots and the recency links live in preallocated integer arrays indexed
+    by slot number. Freed slots are chained on a free list through the
+    next_slots array.
+
+    Attributes
+    ----------
+    max_size : int
+        the maximum capacity of the cache
+    dictionary: dictionary
+        a dictionary mapping the keys in the cache to their slot numbers
+    keys: list
+        the key stored in each slot
+    values: list
+        the value stored in each slot
+    previous_slots: array
+        the slot number of the previous item, or -1
+    next_slots: array
+        the slot number of the next item (or next free slot), or -1
+    head: int
+        the slot number of the most recently used item, or -1
+    tail: int
+        the slot number of the least recently used item, or -1
+    free: int
+        the slot number at the top of the free list, or -1
+    """
+
+    def __init__(self, max_size):
+        max_size = int(max_size)
+        assert (max_size > 0), "Max capacity must be greater than zero"
+        self.max_size = max_size
+        self.keys = [None] * max_size
+        self.values = [None] * max_size
+        self.previous_slots = array("q", [-1]) * max_size
+        self.reset()
+
+    def _unlink(self, slot):
+        """Detach a slot from the recency list"""
+        previous_slot = self.previous_slots[slot]
+        next_slot = self.next_slots[slot]
+        if previous_slot == -1:
+            self.head = next_slot
+        else:
+            self.next_slots[previous_slot] = next_slot
+        if next_slot == -1:
+            self.tail = previous_slot
+        else:
+            self.previous_slots[next_slot] = previous_slot
+
+    def _add(self, slot):
+        """Link a slot in at the head of the recency list"""
+        self.previous_slots[slot] = -1
+        self.next_slots[slot] = self.head
+        if self.head == -1:
+            # very first item added is both tail and head
+            self.tail = slot
+        else:
+            self.previous_slots[self.head] = slot
+        self.head = slot
+
+    def _release(self, slot):
+        """Clear a slot and push it on the free list"""
+        self.keys[slot] = None
+        self.values[slot] = None
+        self.next_slots[slot] = self.free
+        self.free = slot
+
+    def put(self, key, value):
+        """Put a key value pair into the cache.
+
+        Parameters:
+        key (string): the cache item key
+        value (string): the cache item value
+        """
+        slot = self.dictionary.get(key)
+        if slot is not None:
+            # key already exists, update it
+            self.values[slot] = value
+            if slot != self.head:
+                self._unlink(slot)
+                self._add(slot)
+            return
+        if self.free == -1:
+            # it will exceed max capacity, free the tail slot first
+            slot = self.tail
+            self._unlink(slot)
+            del self.dictionary[self.keys[slot]]
+        else:
+            slot = self.free
+            self.free = self.next_slots[slot]
+        self.keys[slot] = key
+        self.values[slot] = value
+        self._add(slot)
+        self.dictionary[key] = slot
+
+    def get(self, key, default=None):
+        """Get a value from the cache by its key.
+
+        Parameter:
+        key (string): the cache item key
+        default: the value to return when the key is not in the cache
+
+        Returns:
+            value (string): the corresponding cache item value
+        """
+        slot = self.dictionary.get(key)
+        if slot is None:
+            return default
+        if slot != self.head:
+            self._unlink(slot)
+            self._add(slot)
+        return self.values[slot]
+
+    def peek(self, key, default=None):
+        """Get a value from the cache without changing its recency."""
+        slot = self.dictionary.get(key)
+        return default if slot is None else self.values[slot]
+
+    def delete(self, key):
+        """Delete a value from the cache by its key.
+
+        Parameter:
+        key (string): the key of the cache item to delete
+        """
+        slot = self.dictionary.pop(key, None)
+        if slot is not None:
+            self._unlink(slot)
+            self._release(slot)
+
+    def reset(self):
+        """Reset the cache to be empty."""
+        self.dictionary = {}
+        for slot in range(self.max_size):
+            self.keys[slot] = None
+            self.values[slot] = None
+        # every slot is free, each one linking to the next
+        self.next_slots = array("q", range(1, self.max_size + 1))
+        self.next_slots[-1] = -1
+        self.free = 0
+        self.head = -1
+        self.tail = -1
+
+    def show(self):
+        """Print the contents of the cache."""
+        print("------------------")
+        print("Current LRU Cache:")
+        slot = self.head
+        while slot != -1:
+            print(self.keys[slot], self.values[slot])
+            slot = self.next_slots[slot]
+        print("Max capacity = ", self.max_size)
+
+    def __len__(self):
+        return len(self.dictionary)
+
+    def memory_usage(self):
+        """Return the approximate bytes used by the cache bookkeeping.
+
+        Keys and values are not counted, only the dictionary, the slot
+        numbers it maps to and the preallocated slot arrays.
+        """
+        return (sys.getsizeof(self.dictionary)
+                + len(self.dictionary) * sys.getsizeof(self.max_size)
+                + sys.getsizeof(self.keys)
+                + sys.getsizeof(self.values)
+                + sys.getsizeof(self.previous_slots)
+                + sys.getsizeof(self.next_slots))
+
+    def bytes_per_entry(self):
+        """Return the approximate bookkeeping bytes used per cache entry."""
+        if not self.dictionary:
+            return 0
+        return self.memory_usage() / len(self.dictionary)
+
+def _split_evenly(total, count):
+    """Return count shares adding up to total, the first total % count
+    of them one larger than the rest"""
+    share, extra = divmod(total, count)
+    return [share + 1 if index < extra else share for index in range(count)]
+
+class ConcurrentLRUCache:
+    """A thread safe Least Recently Used Cache split into locked shards.
+
+    Keys are spread over the shards by hash, and each shard is an LRUCache
+    with its own lock, dictionary and recency list. Threads working on keys
+    in different shards never contend, and eviction is exact LRU within each
+    shard.
+
+    Attributes
+    ----------
+    max_size : int
+        the maximum capacity of the cache, divided evenly over the shards,
+        the first max_size % shards of them holding one item more
+    shards: list
+        the LRUCache of each shard
+    locks: list
+        the lock guarding each shard
+
+    Other options, such as ttl, are passed on to every shard, and
+    max_weight is divided evenly over the shards like max_size. A
+    Compressor passed as compression is not shared, each shard gets a copy
+    of its settings with decompressed_size divided evenly too.
+    """
+
+    def __init__(self, max_size=None, shards=16, **options):
+        shard_count = int(shards)
+        if max_size is not None:
+            max_size = int(max_size)
+            assert (max_size > 0), "Max capacity must be greater than zero"
+            shard_count = min(shard_count, max_size)
+        max_weight = options.pop("max_weight", None)
+        if max_weight is not None:
+            shard_count = min(shard_count, max(1, int(max_weight)))
+        assert (shard_count > 0), "Shard count must be greater than zero"
+        self.max_size = max_size
+        # the shares add up exactly, so the cache never holds more than asked
+        shard_sizes = ([None] * shard_count if max_size is None
+                       else _split_evenly(max_size, shard_count))
+        shard_weights = ([None] * shard_count if max_weight is None
+                         else _split_evenly(max_weight, shard_count))
+        compression = options.pop("compression", None)
+        if isinstance(compression, Compressor):
+            decompressed_sizes = _split_evenly(compression.decompressed_size, shard_count)
+        self.shards = []
+        for index in range(shard_count):
+            if isinstance(compression, Compressor):
+                # its counters and decompressed values are not thread safe
+                shard_compression = Compressor(
+                    compression.codec, compression.threshold, compression.max_ratio,
+                    decompressed_sizes[index])
+            else:
+                shard_compression = compression
+            self.shards.append(LRUCache(shard_sizes[index], max_weight=shard_weights[index],
+                                        compression=shard_compression, **options))
+        self.locks = [threading.Lock() for _ in range(shard_count)]
+
+    def _shard(self, key):
+        """Return the index of the shard holding a key"""
+        return hash(key) % len(self.shards)
+
+    def put(self, key, value, ttl=None, tags=None):
+        """Put a key value pair into the cache.
+
+        Parameters:
+        key (string): the cache item key
+        value (string): the cache item value
+        ttl (float): the seconds the item lives for, defaulting to the
+            cache ttl
+        tags (iterable): the tags to invalidate the item by
+        """
+        index = self._shard(key)
+        with self.locks[index]:
+            self.shards[index].put(key, value, ttl, tags)
+
+    def get(self, key, default=None):
+        """Get a value from the cache by its key.
+
+        Parameter:
+        key (string): the cache item key
+        default: the value to return when the key is not in the cache
+
+        Returns:
+            value (string): the corresponding cache item value
+        """
+        index = self._shard(key)
+        with self.locks[index]:
+            return self.shards[index].get(key, default)
+
+    def peek(self, key, default=None):
+        """Get a value from the cache without changing its recency."""
+        index = self._shard(key)
+        with self.locks[index]:
+            return self.shards[index].peek(key, default)
+
+    def delete(self, key):
+        """Delete a value from the cache by its key.
+
+        Parameter:
+        key (string): the key of the cache item to delete
+        """
+        index = self._shard(key)
+        with self.locks[index]:
+            self.shards[index].delete(key)
+
+    def _group(self, entries, pairs=False):
+        """Group keys, or key value pairs, by the index of their shard"""
+        groups = {}
+        shard_count = len(self.shards)
+        for entry in entries:
+            key = entry[0] if pairs else entry
+            groups.setdefault(hash(key) % shard_count, []).append(entry)
+        return groups
+
+    def put_many(self, pairs, ttl=None):
+        """Put many key value pairs into the cache, locking each shard once.
+
+        Parameters:
+        pairs (dictionary or iterable): the key value pairs to put
+        ttl (float): the seconds the items live for, defaulting to the
+            cache ttl
+        """
+        if hasattr(pairs, "items"):
+            pairs = pairs.items()
+        for index, group in self._group(pairs, pairs=True).items():
+            with self.locks[index]:
+                self.shards[index].put_many(group, ttl)
+
+    def get_many(self, keys, as_list=False, default=None):
+        """Get the values of many keys, locking each shard once.
+
+        Parameters:
+        keys (iterable): the cache item keys
+        as_list (bool): return a list in the order of keys instead of a
+            dictionary of the keys found
+        default: the value listed for missing keys when as_list is set
+
+        Returns:
+            values (dictionary or list): the corresponding cache item values
+        """
+        keys = list(keys)
+        values = {}
+        for index, group in self._group(keys).items():
+            with self.locks[index]:
+                values.update(self.shards[index].get_many(group))
+        if as_list:
+            return [values.get(key, default) for key in keys]
+        return values
+
+    def delete_many(self, keys):
+        """Delete the values of many keys, locking each shard once.
+
+        Parameter:
+        keys (iterable): the keys of the cache items to delete
+        """
+        for index, group in self._group(keys).items():
+            with self.locks[index]:
+                self.shards[index].delete_many(group)
+
+    def resize(self, max_size, evictions_per_operation=8):
+        """Change the maximum capacity, dividing it evenly over the shards.
+
+        Each shard evicts the items over its new max_size as LRUCache.resize
+        does, a few per operation.
+        """
+        max_size = int(max_size)
+        assert (max_size >= len(self.shards)), "Need room for an item per shard"
+        self.max_size = max_size
+        shard_sizes = _split_evenly(max_size, len(self.shards))
+        for lock, shard, shard_size in zip(self.locks, self.shards, shard_sizes):
+            with lock:
+                shard.resize(shard_size, evictions_per_operation)
+
+    def shrink(self, limit=None):
+        """Evict up to limit items over max_size from each shard, locking
+        one at a time.
+
+        Returns:
+            count (int): the number of items evicted
+        """
+        count = 0
+        for lock, shard in zip(self.locks, self.shards):
+            with lock:
+                count += shard.shrink(limit)
+        return count
+
+    def flush(self):
+        """Pass the dirty values of every shard to the store, in write-back
+        mode.
+
+        Returns:
+            count (int): the number of values written
+        """
+        return sum(shard.flush() for shard in self.shards)
+
+    def close(self):
+        """Flush the dirty values and stop the flush thread of every shard"""
+        for shard in self.shards:
+            shard.close()
+
+    def expire(self):
+        """Delete the expired items of every shard, locking one at a time.
+
+        Returns:
+            count (int): the number of items deleted
+        """
+        count = 0
+        for lock, shard in zip(self.locks, self.shards):
+            with lock:
+                count += shard.expire()
+        return count
+
+    def invalidate_tag(self, tag):
+        """Delete every item put with a tag, locking one shard at a time.
+
+        Returns:
+            count (int): the number of items deleted
+        """
+        count = 0
+        for lock, shard in zip(self.locks, self.shards):
+            with lock:
+                count += shard.invalidate_tag(tag)
+        return count
+
+    def invalidate_prefix(self, prefix):
+        """Delete every item whose key starts with a prefix, locking one
+        shard at a time.
+
+        Returns:
+            count (int): the number of items deleted
+        """
+        count = 0
+        for lock, shard in zip(self.locks, self.shards):
+            with lock:
+                count += shard.invalidate_prefix(prefix)
+        return count
+
+    def reset(self):
+        """Reset every shard of the cache to be empty."""
+        for lock, shard in zip(self.locks, self.shards):
+            with lock:
+                shard.reset()
+
+    def show(self):
+        """Print the contents of each shard of the cache."""
+        for index, (lock, shard) in enumerate(zip(self.locks, self.shards)):
+            with lock:
+                print("Shard", index)
+                shard.show()
+
+    def items(self):
+        """Return the unexpired key value pairs, shard by shard with the
+        least recently used first"""
+        pairs = []
+        for lock, shard in zip(self.locks, self.shards):
+            with lock:
+                pairs.extend(shard.items())
+        return pairs
+
+    def save(self, path):
+        """Save the contents of the cache to a snapshot file.
+
+        Each shard is only locked while its items are listed, not while
+        they are written.
+
+        Parameter:
+        path (string): the file to write, replaced atomically
+        """
+        write_snapshot(path, self.items())
+
+    def load(self, path):
+        """Put the contents of a snapshot file into the cache.
+
+        Parameter:
+        path (string): the snapshot file to read
+
+        Returns:
+            count (int): the number of items put
+        """
+        count = 0
+        for key, value in read_snapshot(path):
+            index = self._shard(key)
+            with self.locks[index]:
+                # restored values came from the store, they aren't dirty
+                self.shards[index]._put(key, value, None, False)
+            count += 1
+        return count
+
+    def save_periodically(self, path, interval):
+        """Start a thread saving a snapshot every interval seconds.
+
+        Returns:
+            thread (PeriodicThread): the started thread, stop it when done
+        """
+        thread = PeriodicThread(interval, lambda: self.save(path))
+        thread.start()
+        return thread
+
+    def __len__(self):
+        return sum(len(shard.dictionary) for shard in self.shards)
+
+    @property
+    def weight(self):
+        """The total weight of the items in every shard"""
+        return sum(shard.weight for shard in self.shards)
+
+    @property
+    def stats(self):
+        """The CacheStats of every shard added together, or None"""
+        if self.shards[0].stats is None:
+            return None
+        stats = CacheStats()
+        for lock, shard in zip(self.locks, self.shards):
+            with lock:
+                stats.merge(shard.stats)
+        return stats
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "max_size", "current_size"])
+
+# argument types whose values are used as keys directly
+_FAST_TYPES = {int, str}
+# separates positional from keyword arguments in a key
+_KEYWORD_MARK = object()
+
+
+class _HashedKey(list):
+    """An argument list used as a key, with its hash computed only once."""
+
+    __slots__ = ("hash_value",)
+
+    def __init__(self, arguments):
+        self[:] = arguments
+        self.hash_value = hash(arguments)
+
+    def __hash__(self):
+        return self.hash_value
+
+
+def _make_key(args, kwargs, typed, prefix=()):
+    """Return the cache key of a call's arguments"""
+    key = prefix + args
+    if kwargs:
+        key += (_KEYWORD_MARK,)
+        for item in kwargs.items():
+            key += item
+    if typed:
+        key += tuple(type(value) for value in args)
+        if kwargs:
+            key += tuple(type(value) for value in kwargs.values())
+    elif len(key) == 1 and type(key[0]) in _FAST_TYPES:
+        return key[0]
+    return _HashedKey(key)
+
+
+def memoize(max_size=128, typed=False, cache=None, **options):
+    """Decorate a function to cache its results in an LRUCache.
+
+    Like functools.lru_cache, but the storage is an ordinary cache that can
+    be inspected, resized, given any cache option or shared. The decorated
+    function has cache_info() and cache_clear() functions and a cache
+    attribute.
+
+    Parameters:
+    max_size (int): the maximum capacity of the cache created
+    typed (bool): cache arguments of different types separately, so 1 and
+        1.0 get their own results
+    cache (LRUCache): an existing cache to use instead of creating one.
+        Keys are then prefixed with the function's name so functions can
+        share it, and cache_clear() resets the whole cache.
+    options: passed on to the LRUCache created
+    """
+    shared = cache is not None
+    if not shared:
+        cache = LRUCache(max_size, **options)
+
+    def decorator(function):
+        get = cache.get
+        put = cache.put
+        prefix = (function.__module__ + "." + function.__qualname__,) if shared else ()
+        hits = misses = 0
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            nonlocal hits, misses
+            if kwargs or typed or shared:
+                key = _make_key(args, kwargs, typed, prefix)
+            elif len(args) == 1 and type(args[0]) in _FAST_TYPES:
+                # the common single argument call needs no tuple at all
+                key = args[0]
+            else:
+                key = _HashedKey(args)
+            value = get(key, _MISSING)
+            if value is not _MISSING:
+                hits += 1
+                return value
+            misses += 1
+            value = function(*args, **kwargs)
+            put(key, value)
+            return value
+
+        def cache_info():
+            """Return the hit and miss counts and the size of the cache"""
+            return CacheInfo(hits, misses, cache.max_size, len(cache))
+
+        def cache_clear():
+            """Empty the cache and its statistics"""
+            nonlocal hits, misses
+            cache.reset()
+            hits = misses = 0
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
+
+
+# snapshot files start with a magic number, a version and an item count,
+# followed by each key and value pickled and prefixed by their lengths
+SNAPSHOT_HEADER = struct.Struct("<4sHQ")
+SNAPSHOT_RECORD = struct.Struct("<II")
+SNAPSHOT_MAGIC = b"LRUC"
+SNAPSHOT_VERSION = 1
+
+
+def write_snapshot(path, pairs):
+    """Write key value pairs to a snapshot file.
+
+    The file is written next to path and renamed over it once complete, so
+    a crash never leaves a truncated snapshot behind.
+
+    Parameters:
+    path (string): the file to write
+    pairs (list): the key value pairs, least recently used first
+    """
+    temporary_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(temporary_path, "wb") as snapshot:
+        snapshot.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(pairs)))
+        for key, value in pairs:
+            key_bytes = pickle.dumps(key, pickle.HIGHEST_PROTOCOL)
+            value_bytes = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            snapshot.write(SNAPSHOT_RECORD.pack(len(key_bytes), len(value_bytes)))
+            snapshot.write(key_bytes)
+            snapshot.write(value_bytes)
+    os.replace(temporary_path, path)
+
+
+def read_snapshot(path, last=None):
+    """Yield the key value pairs of a snapshot file.
+
+    The file is memory mapped and each record is only unpickled as it is
+    yielded, so restoring a large snapshot never holds the whole file in
+    memory next to the cache.
+
+    Parameters:
+    path (string): the snapshot file to read
+    last (int): only yield this many of the most recently used pairs, the
+        rest would be evicted straight away anyway
+    """
+    with open(path, "rb") as snapshot:
+        if os.fstat(snapshot.fileno()).st_size < SNAPSHOT_HEADER.size:
+            raise ValueError("Not an LRU cache snapshot: " + path)
+        with mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            magic, version, count = SNAPSHOT_HEADER.unpack_from(mapped, 0)
+            if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                raise ValueError("Not an LRU cache snapshot: " + path)
+            skip = count - last if last is not None and count > last else 0
+            offset = SNAPSHOT_HEADER.size
+            for index in range(count):
+                key_length, value_length = SNAPSHOT_RECORD.unpack_from(mapped, offset)
+                offset += SNAPSHOT_RECORD.size
+                if index >= skip:
+                    key = pickle.loads(mapped[offset:offset + key_length])
+                    offset += key_length
+                    yield key, pickle.loads(mapped[offset:offset + value_length])
+                    offset += value_length
+                else:
+                    offset += key_length + value_length
+
+
+class PeriodicThread(threading.Thread):
+    """A daemon thread calling a function every interval seconds.
+
+    Used to drive housekeeping such as LRUCache.expire during quiet periods.
+    An LRUCache is not thread safe, so the function must take whatever lock
+    guards the cache; ConcurrentLRUCache methods already do.
+
+    Attributes
+    ----------
+    interval : float
+        the seconds to wait between calls
+    function: callable
+        the function to call
+    """
+
+    def __init__(self, interval, function):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.function = function
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.function()
+
+    def stop(self):
+        """Stop calling the function and wait for the thread to finish"""
+        self.stopped.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join()
+
+
+class FlushThread(PeriodicThread):
+    """A PeriodicThread that can be woken early to flush dirty values"""
+
+    def __init__(self, interval, function):
+        super().__init__(interval, function)
+        self.wake = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            if not self.stopped.is_set():
+                self.function()
+
+    def stop(self):
+        """Stop flushing and wait for the thread to finish"""
+        self.stopped.set()
+        self.wake.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join()
+
+
+async def run_periodically(interval, function):
+    """Call a function every interval seconds until cancelled.
+
+    Run it as an asyncio task to drive housekeeping such as LRUCache.expire
+    from the event loop thread, where no locking is needed.
+
+    Parameters:
+    interval (float): the seconds to wait between calls
+    function (callable): the function to call
+    """
+    while True:
+        await asyncio.sleep(interval)
+        function()
+
+
+def interactive():
+    """Prompt for commands one at a time, showing the cache after each"""
+    max_capacity = input("Enter LRU Cache max capacity: ")
+    lru_cache = LRUCache(max_capacity)
+    lru_cache.show()
+
+    is_continue = True
+    while is_continue:
+        command = input("Enter command (put/get/delete/reset/exit): ")
+        if command == "put":
+            key = input("Enter key: ")
+            value = input("Enter value: ")
+            lru_cache.put(key, value)
+        elif command == "get":
+            key = input("Enter key: ")
+            print(lru_cache.get(key))
+        elif command == "delete":
+            key = input("Enter key: ")
+            lru_cache.delete(key)
+        elif command == "reset":
+            lru_cache.reset()
+        elif command == "exit":
+            is_continue = False
+        lru_cache.show()
+
+def run_batch(lru_cache, lines, output, errors=sys.stderr):
+    """Run put/get/delete/reset commands, one per line, against a cache.
+
+    The value of each get is written to output, which should be buffered,
+    and bad lines are reported to errors without stopping the run.
+
+    Parameters:
+    lru_cache (LRUCache): the cache to run the commands against
+    lines (iterable): the commands, such as "put key some value"
+    output (file): where get results are written, one per line
+    errors (file): where bad lines are reported
+
+    Returns:
+        count (int): the number of commands run
+    """
+    put = lru_cache.put
+    get = lru_cache.get
+    delete = lru_cache.delete
+    write = output.write
+    count = 0
+    for number, line in enumerate(lines, 1):
+        words = line.split(None, 2)
+        if not words:
+            continue
+        command = words[0]
+        if command == "get" and len(words) == 2:
+            write("%s\n" % (get(words[1]),))
+        elif command == "put" and len(words) == 3:
+            put(words[1], words[2].rstrip("\r\n"))
+        elif command == "delete" and len(words) == 2:
+            delete(words[1])
+        elif command == "reset" and len(words) == 1:
+            lru_cache.reset()
+        else:
+            errors.write("line %d: cannot run %r\n" % (number, line.rstrip("\r\n")))
+            continue
+        count += 1
+    return count
+
+def batch(path=None, max_size=10000, policy="lru", show=False):
+    """Run the commands of a file, or of stdin, printing a throughput summary"""
+    lru_cache = LRUCache(max_size, policy=policy)
+    lines = sys.stdin if path is None else open(path)
+    # a large buffer turns many small writes into a few big ones
+    output = open(sys.stdout.fileno(), "w", buffering=1 << 16, closefd=False)
+    try:
+        start = time.perf_counter()
+        count = run_batch(lru_cache, lines, output)
+        seconds = time.perf_counter() - start
+        if show:
+            output.flush()
+            lru_cache.show()
+    finally:
+        output.flush()
+        if path is not None:
+            lines.close()
+    print("%d commands in %.3f s, %.0f commands/sec" % (
+        count, seconds, count / seconds if seconds else 0.0), file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Try out the LRU cache, interactively when no command is given")
+    commands = parser.add_subparsers(dest="command")
+
+    serve_parser = commands.add_parser("serve", help="serve a cache over TCP")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=11211)
+    serve_parser.add_argument("--max-size", type=int, default=10000)
+    serve_parser.add_argument("--policy", default="lru", choices=sorted(POLICIES))
+    serve_parser.add_argument("--stats", action="store_true",
+                              help="count hits, misses and evictions for the stats command")
+
+    batch_parser = commands.add_parser(
+        "batch", help="run put/get/delete/reset commands from a file or stdin")
+    batch_parser.add_argument("file", nargs="?", help="the commands, one per line")
+    batch_parser.add_argument("--max-size", type=int, default=10000)
+    batch_parser.add_argument("--policy", default="lru", choices=sorted(POLICIES))
+    batch_parser.add_argument("--show", action="store_true",
+                              help="print the cache contents at the end")
+
+    arguments = parser.parse_args(argv)
+    if arguments.command == "serve":
+        import server
+        server.serve(arguments.host, arguments.port, arguments.max_size,
+                     policy=arguments.policy, stats=arguments.stats)
+    elif arguments.command == "batch":
+        batch(arguments.file, arguments.max_size, arguments.policy, arguments.show)
+    else:
+        interactive()
 
 if __name__ == '__main__':
     main()
@@ -1,7 +1,26 @@
+import asyncio
+import io
+import os
+import random
+import tempfile
+import threading
+import time
 import unittest
 import cache
+import spill
 
-class LRUCacheTest(unittest.TestCase):
+class RecencyOrderMixin:
+
+    def keysInOrder(self, lru_cache):
+        keys = []
+        item = lru_cache.doubly_linked_list.head
+        while item:
+            keys.append(item.key)
+            item = item.next_item
+        return keys
+
+
+class LRUCacheTest(RecencyOrderMixin, unittest.TestCase):
 
     def test_initializes_cache_item(self):
         key = 123
@@ -336,6 +355,14 @@ class LRUCacheTest(unittest.TestCase):
         lru_cache.put(3, "value3")
         self.assertEqual(None, lru_cache.get(4))
 
+    def test_gets_default_value_from_lru_cache_when_key_does_not_exist(self):
+        lru_cache = cache.LRUCache(3)
+        lru_cache.put(1, None)
+        missing = object()
+
+        self.assertEqual(None, lru_cache.get(1, missing))
+        self.assertTrue(lru_cache.get(2, missing) is missing)
+
     def test_deletes_by_key_from_lru_cache_when_cache_has_one_item(self):
         lru_cache = cache.LRUCache(3)
         lru_cache.put(1, "value1")
@@ -396,6 +423,76 @@ class LRUCacheTest(unittest.TestCase):
         self.assertTrue(lru_cache.doubly_linked_list.head is None)
         self.assertTrue(lru_cache.doubly_linked_list.tail is None)
 
+    def test_puts_many_key_value_pairs_in_lru_cache_in_one_call(self):
+        lru_cache = cache.LRUCache(5)
+
+        lru_cache.put_many([(1, "value1"), (2, "value2")])
+        lru_cache.put_many({3: "value3", 1: "different value"})
+
+        self.assertEqual(3, len(lru_cache.dictionary))
+        self.assertEqual(1, lru_cache.doubly_linked_list.head.key)
+        self.assertEqual(2, lru_cache.doubly_linked_list.tail.key)
+        self.assertEqual("different value", lru_cache.dictionary[1].value)
+
+    def test_putting_many_pairs_evicts_only_items_over_max_size(self):
+        lru_cache = cache.LRUCache(3)
+        lru_cache.put(1, "value1")
+        lru_cache.put(2, "value2")
+
+        lru_cache.put_many([(3, "value3"), (1, "different value"), (4, "value4")])
+
+        self.assertEqual(3, len(lru_cache.dictionary))
+        self.assertFalse(2 in lru_cache.dictionary)
+        self.assertEqual(4, lru_cache.doubly_linked_list.head.key)
+        self.assertEqual(3, lru_cache.doubly_linked_list.tail.key)
+
+    def test_putting_more_pairs_than_max_size_keeps_the_last_ones(self):
+        lru_cache = cache.LRUCache(2)
+
+        lru_cache.put_many((key, key) for key in range(10))
+
+        self.assertEqual([9, 8], self.keysInOrder(lru_cache))
+
+    def test_gets_many_values_from_lru_cache_as_dictionary(self):
+        lru_cache = cache.LRUCache(5)
+        lru_cache.put_many([(1, "value1"), (2, "value2"), (3, "value3")])
+
+        values = lru_cache.get_many([1, 4, 2])
+
+        self.assertEqual({1: "value1", 2: "value2"}, values)
+        self.assertEqual([2, 1, 3], self.keysInOrder(lru_cache))
+
+    def test_gets_many_values_from_lru_cache_in_input_order(self):
+        lru_cache = cache.LRUCache(5)
+        lru_cache.put_many([(1, "value1"), (2, "value2")])
+
+        values = lru_cache.get_many([2, 4, 1, 2], as_list=True, default="none")
+
+        self.assertEqual(["value2", "none", "value1", "value2"], values)
+
+    def test_deletes_many_keys_from_lru_cache(self):
+        lru_cache = cache.LRUCache(5)
+        lru_cache.put_many([(1, "value1"), (2, "value2"), (3, "value3")])
+
+        lru_cache.delete_many([1, 3, 333])
+
+        self.assertEqual([2], self.keysInOrder(lru_cache))
+        self.assertEqual(lru_cache.doubly_linked_list.head,
+                         lru_cache.doubly_linked_list.tail)
+
+    def test_cache_item_has_no_instance_dictionary(self):
+        item = self.createItem(1, "value")
+        self.assertFalse(hasattr(item, "__dict__"))
+
+    def test_reports_bytes_per_entry_of_lru_cache(self):
+        lru_cache = cache.LRUCache(5)
+        self.assertEqual(0, lru_cache.bytes_per_entry())
+
+        lru_cache.put(1, "value1")
+        lru_cache.put(2, "value2")
+
+        self.assertTrue(lru_cache.bytes_per_entry() > 0)
+
     def createTestItems(self):
         item1 = self.createItem(11, "value11")
         item2 = self.createItem(22, "value22")
@@ -405,3 +502,2105 @@ class LRUCacheTest(unittest.TestCase):
     def createItem(self, key, value):
         return cache.Item(key, value)
 
+
+
+
+class CompactLRUCacheTest(unittest.TestCase):
+
+    def test_requires_max_size_greater_than_zero(self):
+        self.assertRaises(AssertionError, cache.CompactLRUCache, 0)
+        self.assertRaises(AssertionError, cache.CompactLRUCache, "0")
+
+    def test_gets_values_put_in_compact_cache(self):
+        compact_cache = cache.CompactLRUCache(5)
+        compact_cache.put(1, "value1")
+        compact_cache.put(2, "value2")
+
+        self.assertEqual("value1", compact_cache.get(1))
+        self.assertEqual("value2", compact_cache.get(2))
+        self.assertEqual(None, compact_cache.get(3))
+
+    def test_compact_cache_get_default_and_len(self):
+        compact_cache = cache.CompactLRUCache(2)
+        compact_cache.put(1, "value1")
+        compact_cache.put(2, None)
+        compact_cache.put(3, "value3")
+
+        self.assertEqual(2, len(compact_cache))
+        self.assertEqual("missing", compact_cache.get(1, "missing"))
+        self.assertIsNone(compact_cache.get(2, "missing"))
+        compact_cache.delete(2)
+        self.assertEqual(1, len(compact_cache))
+
+    def test_putting_new_key_into_compact_cache_at_max_size_bumps_lru_item(self):
+        compact_cache = cache.CompactLRUCache(2)
+        compact_cache.put(1, "value1")
+        compact_cache.put(2, "value2")
+        compact_cache.get(1)
+
+        compact_cache.put(3, "value3")
+
+        self.assertEqual(2, len(compact_cache.dictionary))
+        self.assertEqual(None, compact_cache.get(2))
+        self.assertEqual("value1", compact_cache.get(1))
+        self.assertEqual("value3", compact_cache.get(3))
+
+    def test_putting_existing_key_into_compact_cache_moves_it_to_head(self):
+        compact_cache = cache.CompactLRUCache(3)
+        compact_cache.put(1, "value1")
+        compact_cache.put(2, "value2")
+        compact_cache.put(3, "value3")
+
+        compact_cache.put(1, "different value")
+
+        self.assertEqual(1, compact_cache.keys[compact_cache.head])
+        self.assertEqual(2, compact_cache.keys[compact_cache.tail])
+        self.assertEqual("different value", compact_cache.get(1))
+
+    def test_deleted_slots_are_reused(self):
+        compact_cache = cache.CompactLRUCache(2)
+        compact_cache.put(1, "value1")
+        compact_cache.put(2, "value2")
+
+        compact_cache.delete(1)
+        compact_cache.put(3, "value3")
+
+        self.assertEqual("value2", compact_cache.get(2))
+        self.assertEqual("value3", compact_cache.get(3))
+        self.assertEqual(3, compact_cache.keys[compact_cache.head])
+        self.assertEqual(2, compact_cache.keys[compact_cache.tail])
+
+    def test_deletes_only_item_from_compact_cache(self):
+        compact_cache = cache.CompactLRUCache(2)
+        compact_cache.put(1, "value1")
+
+        compact_cache.delete(1)
+        compact_cache.delete(333)
+
+        self.assertEqual(0, len(compact_cache.dictionary))
+        self.assertEqual(-1, compact_cache.head)
+        self.assertEqual(-1, compact_cache.tail)
+
+    def test_resets_compact_cache(self):
+        compact_cache = cache.CompactLRUCache(3)
+        compact_cache.put(1, "value1")
+        compact_cache.put(2, "value2")
+
+        compact_cache.reset()
+
+        self.assertEqual(0, len(compact_cache.dictionary))
+        self.assertEqual(None, compact_cache.get(1))
+        for key in range(3):
+            compact_cache.put(key, key)
+        self.assertEqual(3, len(compact_cache.dictionary))
+
+    def test_reports_bytes_per_entry_of_compact_cache(self):
+        compact_cache = cache.CompactLRUCache(5)
+        self.assertEqual(0, compact_cache.bytes_per_entry())
+
+        compact_cache.put(1, "value1")
+
+        self.assertTrue(compact_cache.bytes_per_entry() > 0)
+
+
+class ConcurrentLRUCacheTest(unittest.TestCase):
+
+    def test_splits_max_size_over_shards(self):
+        concurrent_cache = cache.ConcurrentLRUCache(10, shards=4)
+        self.assertEqual(4, len(concurrent_cache.shards))
+        self.assertEqual(10, concurrent_cache.max_size)
+        self.assertEqual([3, 3, 2, 2], [shard.max_size for shard in concurrent_cache.shards])
+
+    def test_holds_no_more_than_max_size(self):
+        concurrent_cache = cache.ConcurrentLRUCache(10, shards=3)
+        for key in range(100):
+            concurrent_cache.put(key, key)
+
+        self.assertEqual(10, sum(shard.max_size for shard in concurrent_cache.shards))
+        self.assertEqual(10, len(concurrent_cache))
+
+    def test_uses_no_more_shards_than_max_size(self):
+        concurrent_cache = cache.ConcurrentLRUCache(2, shards=8)
+        self.assertEqual(2, len(concurrent_cache.shards))
+
+    def test_requires_max_size_and_shards_greater_than_zero(self):
+        self.assertRaises(AssertionError, cache.ConcurrentLRUCache, 0)
+        self.assertRaises(AssertionError, cache.ConcurrentLRUCache, 5, 0)
+
+    def test_puts_gets_and_deletes_across_shards(self):
+        concurrent_cache = cache.ConcurrentLRUCache(100, shards=4)
+        for key in range(20):
+            concurrent_cache.put(key, "value%d" % key)
+
+        self.assertEqual(20, len(concurrent_cache))
+        self.assertEqual("value7", concurrent_cache.get(7))
+
+        concurrent_cache.delete(7)
+
+        self.assertEqual(None, concurrent_cache.get(7))
+        self.assertEqual(19, len(concurrent_cache))
+
+    def test_evicts_lru_item_within_a_shard(self):
+        concurrent_cache = cache.ConcurrentLRUCache(2, shards=1)
+        concurrent_cache.put(1, "value1")
+        concurrent_cache.put(2, "value2")
+        concurrent_cache.get(1)
+
+        concurrent_cache.put(3, "value3")
+
+        self.assertEqual(None, concurrent_cache.get(2))
+        self.assertEqual("value1", concurrent_cache.get(1))
+
+    def test_bulk_operations_span_shards(self):
+        concurrent_cache = cache.ConcurrentLRUCache(100, shards=4)
+
+        concurrent_cache.put_many({key: "value%d" % key for key in range(20)})
+        concurrent_cache.put_many([((1, 2), "tuple key")])
+
+        self.assertEqual(21, len(concurrent_cache))
+        self.assertEqual({3: "value3", (1, 2): "tuple key"},
+                         concurrent_cache.get_many([3, (1, 2), 99]))
+        self.assertEqual(["value5", None, "value0"],
+                         concurrent_cache.get_many([5, 99, 0], as_list=True))
+
+        concurrent_cache.delete_many(range(10))
+
+        self.assertEqual(11, len(concurrent_cache))
+
+    def test_resets_every_shard(self):
+        concurrent_cache = cache.ConcurrentLRUCache(100, shards=4)
+        for key in range(20):
+            concurrent_cache.put(key, key)
+
+        concurrent_cache.reset()
+
+        self.assertEqual(0, len(concurrent_cache))
+
+    def test_keeps_recency_lists_consistent_under_many_threads(self):
+        concurrent_cache = cache.ConcurrentLRUCache(64, shards=4)
+
+        def worker(offset):
+            for i in range(2000):
+                key = (offset * 7 + i) % 100
+                concurrent_cache.put(key, i)
+                concurrent_cache.get((key * 3) % 100)
+                if i % 5 == 0:
+                    concurrent_cache.delete(key)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for shard in concurrent_cache.shards:
+            keys = []
+            item = shard.doubly_linked_list.head
+            while item:
+                keys.append(item.key)
+                item = item.next_item
+            self.assertEqual(sorted(shard.dictionary), sorted(keys))
+            self.assertTrue(len(keys) <= shard.max_size)
+
+
+class GetOrLoadTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_gets_cached_value_without_calling_loader(self):
+        lru_cache = cache.LRUCache(5)
+        lru_cache.put(1, "value1")
+        calls = []
+
+        async def loader(key):
+            calls.append(key)
+
+        self.assertEqual("value1", await lru_cache.get_or_load(1, loader))
+        self.assertEqual([], calls)
+
+    async def test_concurrent_misses_share_a_single_load(self):
+        lru_cache = cache.LRUCache(5)
+        calls = []
+
+        async def loader(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return "loaded%d" % key
+
+        values = await asyncio.gather(
+            *(lru_cache.get_or_load(1, loader) for _ in range(10)))
+
+        self.assertEqual(["loaded1"] * 10, values)
+        self.assertEqual([1], calls)
+        self.assertEqual("loaded1", lru_cache.get(1))
+        self.assertEqual({}, lru_cache.loads)
+
+    async def test_failed_load_is_raised_to_every_waiter_and_not_cached(self):
+        lru_cache = cache.LRUCache(5)
+
+        async def loader(key):
+            await asyncio.sleep(0.01)
+            raise KeyError(key)
+
+        results = await asyncio.gather(
+            lru_cache.get_or_load(1, loader),
+            lru_cache.get_or_load(1, loader),
+            return_exceptions=True)
+
+        for result in results:
+            self.assertIsInstance(result, KeyError)
+        self.assertEqual(0, len(lru_cache.dictionary))
+        self.assertEqual({}, lru_cache.loads)
+
+    async def test_cancelling_one_waiter_leaves_load_running_for_others(self):
+        lru_cache = cache.LRUCache(5)
+
+        async def loader(key):
+            await asyncio.sleep(0.01)
+            return "loaded"
+
+        first = asyncio.ensure_future(lru_cache.get_or_load(1, loader))
+        second = asyncio.ensure_future(lru_cache.get_or_load(1, loader))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        self.assertEqual("loaded", await second)
+        self.assertTrue(first.cancelled())
+        self.assertEqual("loaded", lru_cache.get(1))
+
+    async def test_cancelling_every_waiter_cancels_load(self):
+        lru_cache = cache.LRUCache(5)
+        finished = []
+
+        async def loader(key):
+            await asyncio.sleep(1)
+            finished.append(key)
+            return "loaded"
+
+        waiter = asyncio.ensure_future(lru_cache.get_or_load(1, loader))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0.01)
+
+        self.assertEqual({}, lru_cache.loads)
+        self.assertEqual([], finished)
+        self.assertEqual(0, len(lru_cache.dictionary))
+
+    def test_bounded_loads_work_across_event_loops(self):
+        lru_cache = cache.LRUCache(20, max_concurrent_loads=2)
+
+        async def loader(key):
+            await asyncio.sleep(0)
+            return key
+
+        async def load(keys):
+            return await asyncio.gather(*(lru_cache.get_or_load(key, loader)
+                                          for key in keys))
+
+        self.assertEqual([0, 1, 2], asyncio.run(load(range(3))))
+        self.assertEqual([3, 4, 5], asyncio.run(load(range(3, 6))))
+
+    async def test_bounds_number_of_concurrent_loads(self):
+        lru_cache = cache.LRUCache(20, max_concurrent_loads=2)
+        running = []
+        most_running = []
+
+        async def loader(key):
+            running.append(key)
+            most_running.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(key)
+            return key
+
+        values = await asyncio.gather(
+            *(lru_cache.get_or_load(key, loader) for key in range(6)))
+
+        self.assertEqual(list(range(6)), values)
+        self.assertEqual(2, max(most_running))
+
+
+class FakeClock:
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TimerWheelTest(unittest.TestCase):
+
+    def test_advancing_returns_only_keys_past_their_deadline(self):
+        timer_wheel = cache.TimerWheel(resolution=1.0)
+        timer_wheel.schedule("a", 1.5)
+        timer_wheel.schedule("b", 3.0)
+
+        self.assertEqual([], timer_wheel.advance(1.0))
+        self.assertEqual(["a"], timer_wheel.advance(2.0))
+        self.assertEqual(["b"], timer_wheel.advance(10.0))
+        self.assertEqual(0, len(timer_wheel))
+
+    def test_cancelled_keys_never_expire(self):
+        timer_wheel = cache.TimerWheel(resolution=1.0)
+        timer_wheel.schedule("a", 1.0)
+
+        timer_wheel.cancel("a")
+
+        self.assertEqual([], timer_wheel.advance(5.0))
+        self.assertEqual(0, len(timer_wheel))
+
+    def test_rescheduling_replaces_the_earlier_deadline(self):
+        timer_wheel = cache.TimerWheel(resolution=1.0)
+        timer_wheel.schedule("a", 1.0)
+
+        timer_wheel.schedule("a", 5.0)
+
+        self.assertEqual([], timer_wheel.advance(4.0))
+        self.assertEqual(["a"], timer_wheel.advance(5.0))
+
+    def test_cascades_far_deadlines_through_every_level(self):
+        timer_wheel = cache.TimerWheel(resolution=1.0, bits=2, levels=2)
+        deadlines = {key: key * 7.5 for key in range(40)}
+        for key, deadline in deadlines.items():
+            timer_wheel.schedule(key, deadline)
+
+        expired = {}
+        now = 0.0
+        while now < 310:
+            now += 1.0
+            for key in timer_wheel.advance(now):
+                expired[key] = now
+
+        self.assertEqual(sorted(deadlines), sorted(expired))
+        for key, when in expired.items():
+            self.assertTrue(deadlines[key] <= when < deadlines[key] + 2)
+
+
+class ExpiryTest(RecencyOrderMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_requires_ttl_greater_than_zero(self):
+        self.assertRaises(AssertionError, cache.LRUCache, 5, ttl=0)
+
+    def test_keeps_items_without_ttl_until_evicted(self):
+        lru_cache = cache.LRUCache(5, clock=self.clock)
+        lru_cache.put(1, "value1")
+
+        self.clock.now = 1000
+
+        self.assertEqual("value1", lru_cache.get(1))
+        self.assertTrue(lru_cache.timer_wheel is None)
+
+    def test_expired_item_is_deleted_when_got(self):
+        lru_cache = cache.LRUCache(5, clock=self.clock)
+        lru_cache.put(1, "value1", ttl=10)
+        lru_cache.put(2, "value2")
+
+        self.clock.now = 9.9
+        self.assertEqual("value1", lru_cache.get(1))
+        self.clock.now = 10
+
+        self.assertEqual(None, lru_cache.get(1))
+        self.assertFalse(1 in lru_cache.dictionary)
+        self.assertEqual("value2", lru_cache.get(2))
+        self.assertEqual(0, len(lru_cache.timer_wheel))
+
+    def test_default_ttl_applies_to_every_put(self):
+        lru_cache = cache.LRUCache(5, ttl=5, clock=self.clock)
+        lru_cache.put(1, "value1")
+        lru_cache.put_many([(2, "value2")])
+        lru_cache.put(3, "value3", ttl=50)
+
+        self.clock.now = 6
+
+        self.assertEqual({3: "value3"}, lru_cache.get_many([1, 2, 3]))
+        self.assertEqual(1, len(lru_cache.dictionary))
+
+    def test_putting_again_without_ttl_clears_the_deadline(self):
+        lru_cache = cache.LRUCache(5, clock=self.clock)
+        lru_cache.put(1, "value1", ttl=5)
+
+        lru_cache.put(1, "value2")
+        self.clock.now = 100
+
+        self.assertEqual("value2", lru_cache.get(1))
+
+    def test_expire_reclaims_expired_items_without_gets(self):
+        lru_cache = cache.LRUCache(10, clock=self.clock)
+        for key in range(6):
+            lru_cache.put(key, key, ttl=key + 1)
+
+        self.clock.now = 3.5
+
+        self.assertEqual(3, lru_cache.expire())
+        self.assertEqual([5, 4, 3], self.keysInOrder(lru_cache))
+
+    def test_evicted_and_deleted_items_are_unscheduled(self):
+        lru_cache = cache.LRUCache(2, ttl=5, clock=self.clock)
+        lru_cache.put(1, "value1")
+        lru_cache.put(2, "value2")
+        lru_cache.put(3, "value3")
+        lru_cache.delete(2)
+
+        self.assertEqual([3], list(lru_cache.timer_wheel.deadlines))
+
+        lru_cache.reset()
+
+        self.assertEqual(0, len(lru_cache.timer_wheel))
+
+    def test_concurrent_cache_expires_every_shard(self):
+        concurrent_cache = cache.ConcurrentLRUCache(
+            100, shards=4, ttl=5, clock=self.clock)
+        concurrent_cache.put_many((key, key) for key in range(10))
+        concurrent_cache.put(10, 10, ttl=60)
+
+        self.clock.now = 5
+
+        self.assertEqual(10, concurrent_cache.expire())
+        self.assertEqual(1, len(concurrent_cache))
+
+    def test_periodic_thread_drives_expiry(self):
+        concurrent_cache = cache.ConcurrentLRUCache(100, shards=2, ttl=0.01)
+        concurrent_cache.put(1, "value1")
+        expired = threading.Event()
+
+        def expire():
+            if concurrent_cache.expire():
+                expired.set()
+
+        thread = cache.PeriodicThread(0.01, expire)
+        thread.start()
+        try:
+            self.assertTrue(expired.wait(5))
+        finally:
+            thread.stop()
+        self.assertEqual(0, len(concurrent_cache))
+
+    def test_asyncio_task_drives_expiry(self):
+        lru_cache = cache.LRUCache(5, ttl=0.01, timer_resolution=0.01)
+        lru_cache.put(1, "value1")
+
+        async def run():
+            task = asyncio.ensure_future(
+                cache.run_periodically(0.01, lru_cache.expire))
+            for _ in range(500):
+                await asyncio.sleep(0.01)
+                if not lru_cache.dictionary:
+                    break
+            task.cancel()
+
+        asyncio.run(run())
+        self.assertEqual(0, len(lru_cache.dictionary))
+
+
+class WeightTest(RecencyOrderMixin, unittest.TestCase):
+
+    def weigher(self, key, value):
+        return len(value)
+
+    def test_requires_max_size_or_max_weight(self):
+        self.assertRaises(AssertionError, cache.LRUCache)
+        self.assertRaises(AssertionError, cache.LRUCache, max_weight=0)
+
+    def test_default_weigher_uses_approximate_byte_size(self):
+        small = cache.default_weigher("key", "x")
+        large = cache.default_weigher("key", "x" * 1000)
+        self.assertEqual(999, large - small)
+
+    def test_counts_total_weight_of_items(self):
+        lru_cache = cache.LRUCache(max_weight=100, weigher=self.weigher)
+        lru_cache.put(1, "aaaa")
+        lru_cache.put(2, "bb")
+        self.assertEqual(6, lru_cache.weight)
+
+        lru_cache.put(1, "a")
+        self.assertEqual(3, lru_cache.weight)
+
+        lru_cache.delete(2)
+        self.assertEqual(1, lru_cache.weight)
+
+        lru_cache.reset()
+        self.assertEqual(0, lru_cache.weight)
+
+    def test_evicts_as_many_tails_as_needed_to_fit_new_item(self):
+        lru_cache = cache.LRUCache(max_weight=10, weigher=self.weigher)
+        lru_cache.put(1, "aaa")
+        lru_cache.put(2, "bbb")
+        lru_cache.put(3, "ccc")
+
+        lru_cache.put(4, "dddddd")
+
+        self.assertEqual([4, 3], self.keysInOrder(lru_cache))
+        self.assertEqual(9, lru_cache.weight)
+
+    def test_growing_an_item_never_evicts_the_item_itself(self):
+        lru_cache = cache.LRUCache(max_weight=10, weigher=self.weigher)
+        lru_cache.put(1, "aaa")
+        lru_cache.put(2, "bbb")
+        lru_cache.put(3, "ccc")
+
+        lru_cache.put(1, "aaaaaaa")
+
+        self.assertEqual([1, 3], self.keysInOrder(lru_cache))
+        self.assertEqual(10, lru_cache.weight)
+
+    def test_rejects_items_heavier_than_max_weight(self):
+        lru_cache = cache.LRUCache(max_weight=5, weigher=self.weigher)
+        lru_cache.put(1, "aaa")
+        lru_cache.put(2, "bb")
+
+        lru_cache.put(3, "cccccc")
+        lru_cache.put(2, "bbbbbb")
+
+        self.assertEqual([1], self.keysInOrder(lru_cache))
+        self.assertEqual(3, lru_cache.weight)
+
+    def test_bounds_by_max_size_and_max_weight_together(self):
+        lru_cache = cache.LRUCache(2, max_weight=100, weigher=self.weigher)
+
+        lru_cache.put_many([(1, "a"), (2, "b"), (3, "c")])
+
+        self.assertEqual([3, 2], self.keysInOrder(lru_cache))
+        self.assertEqual(2, lru_cache.weight)
+
+    def test_expired_items_release_their_weight(self):
+        clock = FakeClock()
+        lru_cache = cache.LRUCache(
+            max_weight=100, weigher=self.weigher, ttl=1, clock=clock)
+        lru_cache.put(1, "aaa")
+
+        clock.now = 2
+        lru_cache.expire()
+
+        self.assertEqual(0, lru_cache.weight)
+
+    def test_concurrent_cache_divides_max_weight_over_shards(self):
+        concurrent_cache = cache.ConcurrentLRUCache(
+            shards=4, max_weight=40, weigher=self.weigher)
+        for shard in concurrent_cache.shards:
+            self.assertEqual(10, shard.max_weight)
+            self.assertTrue(shard.max_size is None)
+
+        concurrent_cache.put_many((key, "x" * key) for key in range(5))
+
+        self.assertEqual(10, concurrent_cache.weight)
+
+    def test_concurrent_cache_max_weight_shares_add_up(self):
+        concurrent_cache = cache.ConcurrentLRUCache(
+            shards=3, max_weight=10, weigher=self.weigher)
+
+        self.assertEqual([4, 3, 3], [shard.max_weight for shard in concurrent_cache.shards])
+        self.assertEqual(2, len(cache.ConcurrentLRUCache(
+            shards=4, max_weight=2, weigher=self.weigher).shards))
+
+
+class EvictionPolicyTest(unittest.TestCase):
+
+    def test_uses_lru_doubly_linked_list_by_default(self):
+        lru_cache = cache.LRUCache(5)
+        self.assertIsInstance(lru_cache.policy, cache.DoublyLinkedList)
+        self.assertTrue(lru_cache.doubly_linked_list is lru_cache.policy)
+
+    def test_requires_a_known_policy_name(self):
+        self.assertRaises(AssertionError, cache.LRUCache, 5, policy="fifo")
+
+    def test_requires_max_size_for_arc_and_w_tinylfu(self):
+        self.assertRaises(AssertionError, cache.LRUCache,
+                          max_weight=100, policy="arc")
+        self.assertRaises(AssertionError, cache.LRUCache,
+                          max_weight=100, policy="w-tinylfu")
+
+    def test_put_many_matches_sequential_puts(self):
+        for policy in ("lru", "sieve", "clock", "arc", "w-tinylfu"):
+            for seed in range(50):
+                randomizer = random.Random(seed)
+                bulk = cache.LRUCache(8, policy=policy)
+                sequential = cache.LRUCache(8, policy=policy)
+                for _ in range(5):
+                    for key in [randomizer.randrange(20) for _ in range(5)]:
+                        bulk.get(key)
+                        sequential.get(key)
+                    pairs = [(randomizer.randrange(20), seed) for _ in range(6)]
+                    bulk.put_many(pairs)
+                    for key, value in pairs:
+                        sequential.put(key, value)
+
+                    self.assertEqual(sequential.items(), bulk.items(), (policy, seed))
+
+    def test_put_many_with_access_buffer_matches_sequential_puts(self):
+        bulk = cache.LRUCache(3, access_buffer=100)
+        sequential = cache.LRUCache(3, access_buffer=100)
+        for lru_cache in (bulk, sequential):
+            lru_cache.put_many([(1, 1), (2, 2), (3, 3)])
+            lru_cache.get(1)
+        bulk.put_many([(4, 4), (5, 5)])
+        sequential.put(4, 4)
+        sequential.put(5, 5)
+
+        self.assertEqual(sequential.items(), bulk.items())
+
+    def test_doubly_linked_list_evicts_tail(self):
+        item1, item2 = cache.Item(1, "value1"), cache.Item(2, "value2")
+        linked_list = cache.DoublyLinkedList()
+        linked_list.add(item1)
+        linked_list.add(item2)
+
+        self.assertEqual(item1, linked_list.evict())
+        self.assertEqual([item2], list(linked_list))
+        self.assertEqual(item2, linked_list.evict())
+        self.assertEqual(None, linked_list.evict())
+
+    def test_sieve_evicts_first_unvisited_item_from_the_hand(self):
+        lru_cache = cache.LRUCache(3, policy="sieve")
+        lru_cache.put_many([(1, "a"), (2, "b"), (3, "c")])
+        lru_cache.get(1)
+
+        lru_cache.put(4, "d")
+
+        self.assertEqual({1, 3, 4}, set(lru_cache.dictionary))
+
+        lru_cache.get(3)
+        lru_cache.put(5, "e")
+
+        # the hand carries on from where it stopped rather than the tail
+        self.assertEqual({1, 3, 5}, set(lru_cache.dictionary))
+
+    def test_sieve_hits_do_not_relink_items(self):
+        lru_cache = cache.LRUCache(3, policy="sieve")
+        lru_cache.put_many([(1, "a"), (2, "b"), (3, "c")])
+
+        lru_cache.get(1)
+
+        self.assertEqual([3, 2, 1], [item.key for item in lru_cache.policy])
+
+    def test_clock_gives_referenced_items_a_second_chance(self):
+        lru_cache = cache.LRUCache(3, policy="clock")
+        lru_cache.put_many([(1, "a"), (2, "b"), (3, "c")])
+        lru_cache.get(1)
+        lru_cache.get(2)
+
+        lru_cache.put(4, "d")
+
+        self.assertEqual({1, 2, 4}, set(lru_cache.dictionary))
+        self.assertEqual(0, lru_cache.policy.referenced[0])
+
+    def test_arc_keeps_frequent_items_through_a_scan(self):
+        lru_cache = cache.LRUCache(4, policy="arc")
+        lru_cache.put_many([(1, "a"), (2, "b")])
+        lru_cache.get(1)
+        lru_cache.get(2)
+
+        for key in range(100, 120):
+            lru_cache.put(key, key)
+
+        self.assertTrue(1 in lru_cache.dictionary)
+        self.assertTrue(2 in lru_cache.dictionary)
+
+    def test_arc_moves_ghost_hits_to_frequent_list(self):
+        lru_cache = cache.LRUCache(2, policy="arc")
+        lru_cache.put(1, "a")
+        lru_cache.get(1)
+        lru_cache.put(2, "b")
+        lru_cache.put(3, "c")
+        self.assertTrue(2 in lru_cache.policy.b1)
+
+        lru_cache.put(2, "b")
+
+        self.assertFalse(2 in lru_cache.policy.b1)
+        self.assertTrue(lru_cache.dictionary[2] in lru_cache.policy.frequent)
+        self.assertTrue(lru_cache.policy.p > 0)
+
+    def test_w_tinylfu_keeps_popular_items_over_one_hit_wonders(self):
+        lru_cache = cache.LRUCache(10, policy="w-tinylfu")
+        for _ in range(5):
+            for key in range(5):
+                lru_cache.put(key, key)
+                lru_cache.get(key)
+
+        for key in range(100, 200):
+            lru_cache.put(key, key)
+
+        for key in range(5):
+            self.assertTrue(key in lru_cache.dictionary)
+
+    def test_count_min_sketch_estimates_and_ages_counts(self):
+        sketch = cache.CountMinSketch(64, sample_size=1000)
+        for _ in range(8):
+            sketch.increment("hot")
+        sketch.increment("cold")
+
+        self.assertEqual(8, sketch.estimate("hot"))
+        self.assertTrue(sketch.estimate("missing") <= 1)
+
+        sketch.age()
+
+        self.assertEqual(4, sketch.estimate("hot"))
+        self.assertEqual(0, sketch.estimate("cold"))
+
+    def test_count_min_sketch_counters_saturate(self):
+        sketch = cache.CountMinSketch(16)
+        for _ in range(100):
+            sketch.increment("hot")
+
+        self.assertEqual(cache.CountMinSketch.MAX_COUNT, sketch.estimate("hot"))
+
+    def test_count_min_sketch_ages_every_counter_of_a_wide_sketch(self):
+        sketch = cache.CountMinSketch(1 << 20)
+        for row in sketch.rows:
+            row[:16] = bytes(range(16))
+            row[-1] = 7
+
+        start = time.perf_counter()
+        sketch.age()
+        elapsed = time.perf_counter() - start
+
+        for row in sketch.rows:
+            self.assertIsInstance(row, bytearray)
+            self.assertEqual(bytes(count >> 1 for count in range(16)), row[:16])
+            self.assertEqual(3, row[-1])
+            self.assertEqual(0, row[1000])
+        self.assertLess(elapsed, 0.1)
+
+    def test_every_policy_keeps_cache_and_policy_consistent(self):
+        for name in cache.POLICIES:
+            randomizer = random.Random(name)
+            lru_cache = cache.LRUCache(20, policy=name)
+            for _ in range(3000):
+                key = int(randomizer.paretovariate(1)) % 60
+                operation = randomizer.random()
+                if operation < 0.5:
+                    lru_cache.get(key)
+                elif operation < 0.9:
+                    lru_cache.put(key, key)
+                else:
+                    lru_cache.delete(key)
+                self.assertTrue(len(lru_cache.dictionary) <= 20, name)
+
+            keys = [item.key for item in lru_cache.policy]
+            self.assertEqual(sorted(lru_cache.dictionary), sorted(keys), name)
+            for key in keys:
+                self.assertEqual(key, lru_cache.get(key), name)
+
+            lru_cache.reset()
+            self.assertEqual([], list(lru_cache.policy), name)
+
+    def test_every_policy_works_with_max_weight(self):
+        for name in cache.POLICIES:
+            lru_cache = cache.LRUCache(
+                50, max_weight=10, weigher=lambda key, value: value, policy=name)
+            for key in range(30):
+                lru_cache.put(key % 7, key % 4 + 1)
+                lru_cache.get(key % 5)
+
+            self.assertTrue(lru_cache.weight <= 10, name)
+            self.assertEqual(
+                lru_cache.weight,
+                sum(item.value for item in lru_cache.dictionary.values()), name)
+
+    def test_concurrent_cache_shards_each_get_their_own_policy(self):
+        concurrent_cache = cache.ConcurrentLRUCache(8, shards=2, policy="sieve")
+        first, second = concurrent_cache.shards
+        self.assertIsInstance(first.policy, cache.SieveList)
+        self.assertFalse(first.policy is second.policy)
+
+
+class MemoizeTest(unittest.TestCase):
+
+    def test_caches_results_of_calls(self):
+        calls = []
+
+        @cache.memoize(max_size=10)
+        def square(number):
+            calls.append(number)
+            return number * number
+
+        self.assertEqual(4, square(2))
+        self.assertEqual(4, square(2))
+        self.assertEqual(9, square(3))
+
+        self.assertEqual([2, 3], calls)
+        self.assertEqual(cache.CacheInfo(1, 2, 10, 2), square.cache_info())
+
+    def test_caches_none_results(self):
+        calls = []
+
+        @cache.memoize()
+        def nothing(key):
+            calls.append(key)
+
+        nothing("a")
+        nothing("a")
+
+        self.assertEqual(["a"], calls)
+
+    def test_keys_on_positional_and_keyword_arguments(self):
+        calls = []
+
+        @cache.memoize()
+        def join(*args, **kwargs):
+            calls.append((args, kwargs))
+            return len(calls)
+
+        self.assertEqual(1, join(1, 2))
+        self.assertEqual(2, join(1, b=2))
+        self.assertEqual(3, join((1, 2)))
+        self.assertEqual(1, join(1, 2))
+        self.assertEqual(2, join(1, b=2))
+        self.assertEqual(3, join((1, 2)))
+        self.assertEqual(3, len(calls))
+
+    def test_typed_caches_argument_types_separately(self):
+        @cache.memoize(typed=True)
+        def kind(value):
+            return type(value)
+
+        self.assertEqual(int, kind(1))
+        self.assertEqual(float, kind(1.0))
+        self.assertEqual(2, kind.cache_info().current_size)
+
+    def test_evicts_least_recently_used_results(self):
+        @cache.memoize(max_size=2)
+        def identity(value):
+            return value
+
+        identity(1)
+        identity(2)
+        identity(1)
+        identity(3)
+
+        self.assertEqual({1, 3}, set(identity.cache.dictionary))
+
+    def test_clears_cache_and_statistics(self):
+        @cache.memoize()
+        def identity(value):
+            return value
+
+        identity(1)
+        identity(1)
+
+        identity.cache_clear()
+
+        self.assertEqual(cache.CacheInfo(0, 0, 128, 0), identity.cache_info())
+
+    def test_functions_can_share_a_cache(self):
+        shared = cache.ConcurrentLRUCache(10, shards=2)
+
+        @cache.memoize(cache=shared)
+        def double(value):
+            return value * 2
+
+        @cache.memoize(cache=shared)
+        def triple(value):
+            return value * 3
+
+        self.assertEqual(2, double(1))
+        self.assertEqual(3, triple(1))
+        self.assertEqual(2, double(1))
+        self.assertEqual(2, len(shared))
+        self.assertTrue(double.cache is triple.cache)
+
+    def test_passes_options_to_cache(self):
+        @cache.memoize(max_size=5, policy="sieve")
+        def identity(value):
+            return value
+
+        self.assertIsInstance(identity.cache.policy, cache.SieveList)
+
+    def test_keeps_function_metadata(self):
+        @cache.memoize()
+        def documented():
+            """Some documentation"""
+
+        self.assertEqual("documented", documented.__name__)
+        self.assertEqual("Some documentation", documented.__doc__)
+
+
+class StatsTest(unittest.TestCase):
+
+    def test_collects_no_stats_by_default(self):
+        lru_cache = cache.LRUCache(5)
+        self.assertTrue(lru_cache.stats is None)
+        self.assertEqual("get", lru_cache.get.__name__)
+        self.assertFalse("get" in vars(lru_cache))
+
+    def test_counts_operations(self):
+        lru_cache = cache.LRUCache(2, stats=True)
+        lru_cache.put(1, "value1")
+        lru_cache.put(1, "value1")
+        lru_cache.put_many([(2, "value2"), (3, "value3"), (3, "value3")])
+        lru_cache.get(3)
+        lru_cache.get(1)
+        lru_cache.get_many([2, 3, 4], as_list=True)
+        lru_cache.delete(2)
+        lru_cache.delete(2)
+        lru_cache.delete_many([3])
+        lru_cache.reset()
+
+        snapshot = lru_cache.stats.snapshot()
+        self.assertEqual(3, snapshot["hits"])
+        self.assertEqual(2, snapshot["misses"])
+        self.assertEqual(5, snapshot["puts"])
+        self.assertEqual(2, snapshot["updates"])
+        self.assertEqual(1, snapshot["evictions"])
+        self.assertEqual(2, snapshot["deletes"])
+        self.assertEqual(1, snapshot["resets"])
+        self.assertEqual(0.6, snapshot["hit_ratio"])
+        self.assertEqual(0.2, snapshot["eviction_rate"])
+
+    def test_counts_expirations_and_rejections(self):
+        clock = FakeClock()
+        lru_cache = cache.LRUCache(
+            max_weight=5, weigher=lambda key, value: len(value),
+            ttl=1, clock=clock, stats=True)
+        lru_cache.put(1, "a")
+        lru_cache.put(2, "b")
+        lru_cache.put(3, "cccccc")
+
+        clock.now = 2
+        lru_cache.get(1)
+        lru_cache.expire()
+
+        self.assertEqual(1, lru_cache.stats.rejections)
+        self.assertEqual(2, lru_cache.stats.expirations)
+        self.assertEqual(1, lru_cache.stats.misses)
+        self.assertEqual(0, lru_cache.stats.deletes)
+
+    def test_calls_hooks_on_evictions_and_misses(self):
+        evicted = []
+        missed = []
+        lru_cache = cache.LRUCache(
+            1, on_evict=lambda key, value: evicted.append((key, value)),
+            on_miss=missed.append)
+        lru_cache.put(1, "value1")
+        lru_cache.put(2, "value2")
+        lru_cache.get(1)
+        lru_cache.get_many([2, 3])
+
+        self.assertEqual([(1, "value1")], evicted)
+        self.assertEqual([1, 3], missed)
+        self.assertTrue(lru_cache.stats is None)
+
+    def test_samples_operation_latencies(self):
+        lru_cache = cache.LRUCache(5, latency_sample_rate=0.5)
+        for key in range(10):
+            lru_cache.put(key, key)
+            lru_cache.get(key)
+
+        latencies = lru_cache.stats.snapshot()["latencies"]
+        self.assertEqual(5, latencies["get"]["count"])
+        self.assertEqual(5, latencies["put"]["count"])
+        self.assertEqual(0, latencies["delete"]["count"])
+        self.assertTrue(latencies["get"]["p99_ns"] >= latencies["get"]["p50_ns"] > 0)
+        self.assertEqual(10, lru_cache.stats.hits)
+
+    def test_latency_histogram_percentiles(self):
+        histogram = cache.LatencyHistogram()
+        for nanoseconds in [100] * 98 + [5000, 70000]:
+            histogram.record(nanoseconds)
+
+        self.assertEqual(128, histogram.percentile(0.5))
+        self.assertEqual(8192, histogram.percentile(0.99))
+        self.assertEqual(131072, histogram.percentile(1.0))
+        self.assertEqual(848, histogram.snapshot()["mean_ns"])
+
+    def test_concurrent_cache_adds_up_shard_stats(self):
+        concurrent_cache = cache.ConcurrentLRUCache(
+            100, shards=4, stats=True, latency_sample_rate=1)
+        concurrent_cache.put_many((key, key) for key in range(10))
+        for key in range(20):
+            concurrent_cache.get(key)
+
+        snapshot = concurrent_cache.stats.snapshot()
+        self.assertEqual(10, snapshot["hits"])
+        self.assertEqual(10, snapshot["misses"])
+        self.assertEqual(20, snapshot["latencies"]["get"]["count"])
+        self.assertTrue(cache.ConcurrentLRUCache(10).stats is None)
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.snapshot")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_lists_items_least_recently_used_first(self):
+        lru_cache = cache.LRUCache(5)
+        lru_cache.put_many([(1, "value1"), (2, "value2"), (3, "value3")])
+        lru_cache.get(1)
+
+        self.assertEqual([(2, "value2"), (3, "value3"), (1, "value1")],
+                         lru_cache.items())
+
+    def test_restores_contents_and_recency_order(self):
+        lru_cache = cache.LRUCache(5)
+        lru_cache.put_many([(1, "value1"), ("two", [2, 2]), ((3,), None)])
+        lru_cache.get(1)
+        lru_cache.save(self.path)
+
+        restored = cache.LRUCache(5)
+
+        self.assertEqual(3, restored.load(self.path))
+        self.assertEqual(lru_cache.items(), restored.items())
+        self.assertEqual(1, restored.doubly_linked_list.head.key)
+
+    def test_loads_only_most_recent_items_that_fit(self):
+        lru_cache = cache.LRUCache(10)
+        lru_cache.put_many((key, key) for key in range(10))
+        lru_cache.save(self.path)
+
+        restored = cache.LRUCache(3)
+
+        self.assertEqual(3, restored.load(self.path))
+        self.assertEqual([(7, 7), (8, 8), (9, 9)], restored.items())
+
+    def test_skips_expired_items(self):
+        clock = FakeClock()
+        lru_cache = cache.LRUCache(5, clock=clock)
+        lru_cache.put(1, "value1", ttl=1)
+        lru_cache.put(2, "value2")
+        clock.now = 5
+
+        lru_cache.save(self.path)
+
+        self.assertEqual([(2, "value2")], list(cache.read_snapshot(self.path)))
+
+    def test_saves_empty_cache(self):
+        cache.LRUCache(5).save(self.path)
+
+        self.assertEqual(0, cache.LRUCache(5).load(self.path))
+
+    def test_rejects_files_that_are_not_snapshots(self):
+        with open(self.path, "wb") as other:
+            other.write(b"not a snapshot file at all")
+
+        self.assertRaises(ValueError, cache.LRUCache(5).load, self.path)
+
+    def test_replaces_previous_snapshot(self):
+        lru_cache = cache.LRUCache(5)
+        lru_cache.put(1, "value1")
+        lru_cache.save(self.path)
+        lru_cache.put(2, "value2")
+        lru_cache.save(self.path)
+
+        self.assertEqual(2, len(list(cache.read_snapshot(self.path))))
+        self.assertEqual(["cache.snapshot"], os.listdir(self.directory.name))
+
+    def test_concurrent_cache_restores_every_shard(self):
+        concurrent_cache = cache.ConcurrentLRUCache(100, shards=4)
+        concurrent_cache.put_many((key, str(key)) for key in range(30))
+        concurrent_cache.save(self.path)
+
+        restored = cache.ConcurrentLRUCache(100, shards=4)
+        restored.load(self.path)
+
+        for shard, restored_shard in zip(concurrent_cache.shards, restored.shards):
+            self.assertEqual(shard.items(), restored_shard.items())
+
+    def test_saves_periodically_in_the_background(self):
+        concurrent_cache = cache.ConcurrentLRUCache(100, shards=2)
+        concurrent_cache.put(1, "value1")
+
+        thread = concurrent_cache.save_periodically(self.path, 0.01)
+        try:
+            for _ in range(500):
+                if os.path.exists(self.path):
+                    break
+                thread.stopped.wait(0.01)
+        finally:
+            thread.stop()
+
+        self.assertEqual([(1, "value1")], list(cache.read_snapshot(self.path)))
+
+    def test_saves_lru_cache_periodically_under_its_lock(self):
+        lru_cache = cache.LRUCache(5)
+        lock = threading.Lock()
+        lru_cache.put(1, "value1")
+
+        thread = lru_cache.save_periodically(self.path, 0.01, lock)
+        try:
+            for _ in range(500):
+                if os.path.exists(self.path):
+                    break
+                thread.stopped.wait(0.01)
+        finally:
+            thread.stop()
+
+        self.assertEqual([(1, "value1")], list(cache.read_snapshot(self.path)))
+
+class SpillTest(RecencyOrderMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.tier = spill.SpillTier(self.directory.name)
+
+    def tearDown(self):
+        self.tier.close()
+        self.directory.cleanup()
+
+    def test_get_many_reads_hits_before_promoting(self):
+        for as_list in (False, True):
+            lru_cache = cache.LRUCache(2, spill=self.tier, stats=True)
+            lru_cache.put_many([("c", 3), ("a", 1), ("b", 2)])
+
+            values = lru_cache.get_many(["a", "c", "b", "d"], as_list=as_list)
+
+            if as_list:
+                self.assertEqual([1, 3, 2, None], values)
+            else:
+                self.assertEqual({"a": 1, "c": 3, "b": 2}, values)
+            self.assertEqual(3, lru_cache.stats.hits)
+            self.assertEqual(1, lru_cache.stats.misses)
+            self.assertEqual(1, lru_cache.stats.promotions)
+            lru_cache.reset()
+
+    def test_evicted_items_are_promoted_back_on_a_miss(self):
+        lru_cache = cache.LRUCache(2, spill=self.tier, stats=True)
+        lru_cache.put_many([(1, "value1"), (2, "value2"), (3, "value3")])
+
+        self.assertEqual([1], list(self.tier.index))
+        self.assertEqual("value1", lru_cache.get(1))
+        self.assertEqual([1, 3], self.keysInOrder(lru_cache))
+        self.assertEqual([2], list(self.tier.index))
+        self.assertEqual(1, lru_cache.stats.promotions)
+        self.assertEqual(1, lru_cache.stats.hits)
+        self.assertEqual(3, lru_cache.stats.puts)
+
+    def test_get_many_promotes_spilled_items(self):
+        lru_cache = cache.LRUCache(2, spill=self.tier, stats=True)
+        lru_cache.put_many([(1, "value1"), (2, "value2"), (3, "value3")])
+
+        self.assertEqual({1: "value1", 3: "value3"}, lru_cache.get_many([1, 3, 4]))
+        self.assertEqual(2, lru_cache.stats.hits)
+        self.assertEqual(1, lru_cache.stats.misses)
+
+    def test_delete_and_put_drop_spilled_copies(self):
+        lru_cache = cache.LRUCache(1, spill=self.tier)
+        lru_cache.put(1, "value1")
+        lru_cache.put(2, "value2")
+        lru_cache.delete(1)
+
+        self.assertIsNone(lru_cache.get(1))
+
+        lru_cache.put(3, "value3")
+        lru_cache.put(2, "new value2")
+        self.assertEqual([3], list(self.tier.index))
+        self.assertEqual("new value2", lru_cache.get(2))
+
+    def test_reset_clears_the_spill_tier(self):
+        lru_cache = cache.LRUCache(1, spill=self.tier)
+        lru_cache.put_many([(1, "value1"), (2, "value2")])
+        lru_cache.reset()
+
+        self.assertEqual(0, len(self.tier))
+        self.assertIsNone(lru_cache.get(1))
+
+    def test_spilled_items_keep_their_deadline(self):
+        clock = FakeClock()
+        lru_cache = cache.LRUCache(1, clock=clock, spill=self.tier)
+        lru_cache.put(1, "value1", ttl=10)
+        lru_cache.put(2, "value2", ttl=10)
+        clock.now = 5
+
+        self.assertEqual("value1", lru_cache.get(1))
+        self.assertEqual(10, lru_cache.timer_wheel.deadlines[1])
+        clock.now = 11
+        self.assertIsNone(lru_cache.get(2))
+
+class ResizeTest(RecencyOrderMixin, unittest.TestCase):
+
+    def test_growing_takes_effect_at_once(self):
+        lru_cache = cache.LRUCache(2)
+        lru_cache.put_many([(1, "value1"), (2, "value2")])
+        lru_cache.resize(4)
+        lru_cache.put_many([(3, "value3"), (4, "value4")])
+
+        self.assertEqual([4, 3, 2, 1], self.keysInOrder(lru_cache))
+        lru_cache.put(5, "value5")
+        self.assertEqual([5, 4, 3, 2], self.keysInOrder(lru_cache))
+
+    def test_shrinking_evicts_a_few_tails_per_operation(self):
+        lru_cache = cache.LRUCache(100)
+        lru_cache.put_many((key, key) for key in range(100))
+        lru_cache.resize(10, evictions_per_operation=20)
+
+        self.assertEqual(80, len(lru_cache))
+        self.assertEqual(99, lru_cache.get(99))
+        self.assertEqual(60, len(lru_cache))
+        lru_cache.put(100, 100)
+        self.assertEqual(40, len(lru_cache))
+        lru_cache.get_many([99, 100])
+        lru_cache.put_many([(101, 101)])
+        self.assertEqual(10, len(lru_cache))
+        self.assertEqual(0, lru_cache.evictions_per_operation)
+        self.assertEqual([101, 100, 99], self.keysInOrder(lru_cache)[:3])
+
+    def test_cache_does_not_grow_while_shrinking(self):
+        lru_cache = cache.LRUCache(10)
+        lru_cache.put_many((key, key) for key in range(10))
+        lru_cache.resize(2, evictions_per_operation=1)
+
+        lru_cache.put_many([(10, 10), (11, 11)])
+        self.assertEqual(8, len(lru_cache))
+        lru_cache.put(12, 12)
+        self.assertEqual(7, len(lru_cache))
+
+    def test_shrink_evicts_the_excess_at_once(self):
+        lru_cache = cache.LRUCache(10, stats=True)
+        lru_cache.put_many((key, key) for key in range(10))
+        lru_cache.resize(3, evictions_per_operation=1)
+
+        self.assertEqual(6, lru_cache.shrink())
+        self.assertEqual([9, 8, 7], self.keysInOrder(lru_cache))
+        self.assertEqual(7, lru_cache.stats.evictions)
+        self.assertEqual(0, lru_cache.shrink())
+
+    def test_resizes_policies(self):
+        for policy in cache.POLICIES:
+            lru_cache = cache.LRUCache(200, policy=policy)
+            lru_cache.put_many((key, key) for key in range(200))
+            lru_cache.resize(50)
+            lru_cache.shrink()
+
+            self.assertEqual(50, len(lru_cache))
+            for key in range(200, 300):
+                lru_cache.put(key, key)
+                lru_cache.get(key)
+            self.assertEqual(50, len(lru_cache))
+            self.assertEqual(50, len(list(lru_cache.policy)))
+        self.assertEqual(50, lru_cache.policy.capacity)
+
+    def test_concurrent_cache_resize(self):
+        lru_cache = cache.ConcurrentLRUCache(100, shards=4)
+        lru_cache.put_many((key, key) for key in range(100))
+        lru_cache.resize(20, evictions_per_operation=2)
+
+        self.assertEqual(92, len(lru_cache))
+        self.assertEqual(72, lru_cache.shrink())
+        self.assertEqual(20, len(lru_cache))
+
+        lru_cache.resize(10)
+        lru_cache.shrink()
+
+        self.assertEqual([3, 3, 2, 2], [shard.max_size for shard in lru_cache.shards])
+        self.assertEqual(10, len(lru_cache))
+
+class RecordingStore:
+
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+        self.written = threading.Event()
+
+    def __call__(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise IOError("store unavailable")
+        self.batches.append(dict(batch))
+        self.written.set()
+
+    def contents(self):
+        contents = {}
+        for batch in self.batches:
+            contents.update(batch)
+        return contents
+
+
+class WriteBackTest(unittest.TestCase):
+
+    def makeCache(self, max_size=10, store=None, **options):
+        self.store = store or RecordingStore()
+        lru_cache = cache.LRUCache(max_size, store=self.store,
+                                   flush_interval=options.pop("flush_interval", 60),
+                                   **options)
+        self.addCleanup(lru_cache.close)
+        return lru_cache
+
+    def test_puts_are_coalesced_into_one_batch(self):
+        lru_cache = self.makeCache()
+        lru_cache.put(1, "value1")
+        lru_cache.put(1, "new value1")
+        lru_cache.put_many([(2, "value2")])
+
+        self.assertEqual([], self.store.batches)
+        self.assertEqual(2, lru_cache.flush())
+        self.assertEqual([{1: "new value1", 2: "value2"}], self.store.batches)
+        self.assertEqual(0, lru_cache.flush())
+
+    def test_evicting_a_dirty_item_writes_it_first(self):
+        lru_cache = self.makeCache(max_size=2)
+        lru_cache.put(1, "value1")
+        lru_cache.put(2, "value2")
+        lru_cache.put(3, "value3")
+
+        self.assertEqual([{1: "value1"}], self.store.batches)
+        self.assertEqual({2: "value2", 3: "value3"}, lru_cache.dirty)
+
+    def test_delete_expiry_and_reset_write_dirty_items(self):
+        clock = FakeClock()
+        lru_cache = self.makeCache(clock=clock)
+        lru_cache.put(1, "value1")
+        lru_cache.put(2, "value2", ttl=5)
+        lru_cache.put(3, "value3")
+        lru_cache.delete(1)
+        clock.now = 10
+        lru_cache.expire()
+        lru_cache.reset()
+
+        self.assertEqual([{1: "value1"}, {2: "value2"}, {3: "value3"}],
+                         self.store.batches)
+
+    def test_clean_items_are_not_written(self):
+        lru_cache = self.makeCache(max_size=1)
+        lru_cache.put(1, "value1")
+        lru_cache.flush()
+        lru_cache.put(2, "value2")
+        lru_cache.delete(2)
+
+        self.assertEqual([{1: "value1"}, {2: "value2"}], self.store.batches)
+
+    def test_loaded_values_are_not_dirty(self):
+        lru_cache = self.makeCache()
+
+        async def loader(key):
+            return "loaded"
+
+        self.assertEqual("loaded", asyncio.run(lru_cache.get_or_load(1, loader)))
+        self.assertEqual({}, lru_cache.dirty)
+
+    def test_restored_snapshot_is_not_dirty(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.snapshot")
+            saved = cache.LRUCache(10)
+            saved.put_many([("a", 1), ("b", 2)])
+            saved.save(path)
+            lru_cache = self.makeCache()
+
+            self.assertEqual(2, lru_cache.load(path))
+            self.assertEqual({}, lru_cache.dirty)
+            lru_cache.close()
+            self.assertEqual([], self.store.batches)
+            self.assertEqual([("a", 1), ("b", 2)], lru_cache.items())
+
+    def test_concurrent_cache_restores_snapshot_clean(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.snapshot")
+            saved = cache.LRUCache(10)
+            saved.put_many([("a", 1), ("b", 2)])
+            saved.save(path)
+            store = RecordingStore()
+            concurrent_cache = cache.ConcurrentLRUCache(10, shards=2, store=store,
+                                                        flush_interval=60)
+            self.addCleanup(concurrent_cache.close)
+
+            self.assertEqual(2, concurrent_cache.load(path))
+            self.assertEqual(0, concurrent_cache.flush())
+            self.assertEqual([], store.batches)
+            self.assertEqual({"a": 1, "b": 2}, dict(concurrent_cache.items()))
+
+    def test_value_written_during_a_flush_lands_after_it(self):
+        lru_cache = self.makeCache()
+        lru_cache.put("k", "older")
+        writer = threading.Thread(target=lambda: (lru_cache.put("k", "newer"),
+                                                  lru_cache.delete("k")))
+
+        class SwapHook:
+            # lets another thread write between the swap and the store call
+            def __init__(self, lock):
+                self.lock = lock
+                self.armed = True
+
+            def __enter__(self):
+                self.lock.acquire()
+
+            def __exit__(self, *exception):
+                self.lock.release()
+                if self.armed:
+                    self.armed = False
+                    writer.start()
+                    writer.join(0.5)
+
+        lru_cache.dirty_lock = SwapHook(lru_cache.dirty_lock)
+        lru_cache.flush()
+        writer.join()
+
+        self.assertEqual([{"k": "older"}, {"k": "newer"}], self.store.batches)
+
+    def test_failed_batches_are_retried_without_losing_newer_values(self):
+        lru_cache = self.makeCache(store=RecordingStore(failures=1))
+        lru_cache.put(1, "value1")
+        lru_cache.put(2, "value2")
+
+        self.assertEqual(0, lru_cache.flush())
+        self.assertEqual(1, lru_cache.flush_errors)
+        self.assertIsInstance(lru_cache.last_flush_error, IOError)
+        lru_cache.put(2, "new value2")
+        self.assertEqual(2, lru_cache.flush())
+        self.assertEqual({1: "value1", 2: "new value2"}, self.store.contents())
+
+    def test_heavy_values_are_written_through(self):
+        lru_cache = self.makeCache(max_weight=10, weigher=lambda key, value: len(value))
+        lru_cache.put(1, "x" * 20)
+
+        self.assertEqual([{1: "x" * 20}], self.store.batches)
+        self.assertEqual(0, len(lru_cache))
+
+    def test_threshold_wakes_the_flush_thread(self):
+        lru_cache = self.makeCache(max_size=100, flush_threshold=5)
+        lru_cache.put_many((key, key) for key in range(5))
+
+        self.assertTrue(self.store.written.wait(5))
+        self.assertEqual({key: key for key in range(5)}, self.store.contents())
+
+    def test_interval_flushes_in_the_background(self):
+        lru_cache = self.makeCache(flush_interval=0.01)
+        lru_cache.put(1, "value1")
+
+        self.assertTrue(self.store.written.wait(5))
+        self.assertEqual([{1: "value1"}], self.store.batches)
+
+    def test_close_flushes_and_stops_the_thread(self):
+        lru_cache = self.makeCache()
+        thread = lru_cache.flush_thread
+        lru_cache.put(1, "value1")
+        lru_cache.close()
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([{1: "value1"}], self.store.batches)
+
+    def test_concurrent_cache_write_back(self):
+        store = RecordingStore()
+        lru_cache = cache.ConcurrentLRUCache(100, shards=4, store=store,
+                                             flush_interval=60)
+        lru_cache.put_many((key, key) for key in range(20))
+        lru_cache.close()
+
+        self.assertEqual({key: key for key in range(20)}, store.contents())
+
+class RefreshAheadTest(unittest.TestCase):
+
+    def makeCache(self, loader, **options):
+        self.clock = FakeClock()
+        lru_cache = cache.LRUCache(10, ttl=10, clock=self.clock, loader=loader,
+                                   stats=True, **options)
+        self.addCleanup(lru_cache.close)
+        return lru_cache
+
+    def waitForReloads(self, lru_cache, count=1):
+        for _ in range(500):
+            if len(lru_cache.refreshed) >= count:
+                return
+            threading.Event().wait(0.01)
+        self.fail("reload did not finish")
+
+    def test_get_past_refresh_ahead_reloads_in_the_background(self):
+        calls = []
+        lru_cache = self.makeCache(lambda key: calls.append(key) or "fresh")
+        lru_cache.put(1, "stale")
+
+        self.clock.now = 7
+        self.assertEqual("stale", lru_cache.get(1))
+        self.assertEqual([], calls)
+        self.clock.now = 8
+        self.assertEqual("stale", lru_cache.get(1))
+        self.waitForReloads(lru_cache)
+        self.assertEqual([1], calls)
+
+        self.assertEqual("fresh", lru_cache.get(1))
+        self.assertEqual(18, lru_cache.timer_wheel.deadlines[1])
+        self.assertEqual((16, 10), lru_cache.refresh_at[1])
+        self.assertEqual(1, lru_cache.stats.refreshes)
+
+    def test_stale_value_is_served_past_expiry_while_reloading(self):
+        release = threading.Event()
+        lru_cache = self.makeCache(lambda key: release.wait(5) and "fresh")
+        lru_cache.put(1, "stale")
+        self.clock.now = 9
+        lru_cache.get(1)
+
+        self.clock.now = 11
+        self.assertEqual("stale", lru_cache.get(1))
+        release.set()
+        self.waitForReloads(lru_cache)
+        self.assertEqual("fresh", lru_cache.get(1))
+
+    def test_expiry_keeps_items_being_reloaded(self):
+        release = threading.Event()
+        lru_cache = self.makeCache(lambda key: release.wait(5) and "fresh")
+        lru_cache.put(1, "stale")
+        lru_cache.put(2, "other")
+        self.clock.now = 9
+        lru_cache.get(1)
+        self.clock.now = 11
+
+        self.assertEqual("stale", lru_cache.get(1))
+        self.assertEqual(1, lru_cache.expire())
+        self.assertEqual({1: "stale"}, lru_cache.get_many([1, 2]))
+        self.assertEqual(0, lru_cache.expire())
+        release.set()
+        self.waitForReloads(lru_cache)
+        self.assertEqual("fresh", lru_cache.get(1))
+        self.clock.now = 30
+        self.assertEqual(1, lru_cache.expire())
+
+    def test_concurrent_reloads_are_capped(self):
+        release = threading.Event()
+        lru_cache = self.makeCache(lambda key: release.wait(5) and key,
+                                   max_concurrent_refreshes=2)
+        lru_cache.put_many([(1, 1), (2, 2), (3, 3)])
+        self.clock.now = 9
+        for key in (1, 2, 3):
+            lru_cache.get(key)
+
+        self.assertEqual({1, 2}, set(lru_cache.refreshing))
+        self.assertIn(3, lru_cache.refresh_at)
+        release.set()
+        self.waitForReloads(lru_cache, 2)
+        lru_cache.get(3)
+        self.assertEqual({3}, set(lru_cache.refreshing))
+
+    def test_reload_older_than_a_put_or_delete_is_dropped(self):
+        release = threading.Event()
+        lru_cache = self.makeCache(lambda key: release.wait(5) and "reloaded")
+        lru_cache.put_many([(1, "value1"), (2, "value2")])
+        self.clock.now = 9
+        lru_cache.get(1)
+        lru_cache.get(2)
+        lru_cache.put(1, "newer")
+        lru_cache.delete(2)
+        release.set()
+        self.waitForReloads(lru_cache, 2)
+
+        self.assertEqual("newer", lru_cache.get(1))
+        self.assertIsNone(lru_cache.get(2))
+        self.assertEqual(0, lru_cache.stats.refreshes)
+
+    def test_reload_of_the_only_deleted_key_is_dropped(self):
+        release = threading.Event()
+        lru_cache = self.makeCache(lambda key: release.wait(5) and "reloaded")
+        lru_cache.put("k", "value")
+        self.clock.now = 9
+        lru_cache.get("k")
+        lru_cache.delete("k")
+
+        self.assertEqual({}, lru_cache.refresh_at)
+        self.assertEqual({}, lru_cache.refreshing)
+        release.set()
+        self.waitForReloads(lru_cache)
+        self.assertIsNone(lru_cache.get("k"))
+        self.assertIsNone(lru_cache.peek("k"))
+        self.assertEqual(0, lru_cache.stats.refreshes)
+
+    def test_failed_reload_keeps_the_value_and_retries(self):
+        attempts = []
+
+        def loader(key):
+            attempts.append(key)
+            if len(attempts) == 1:
+                raise IOError("backend down")
+            return "fresh"
+
+        lru_cache = self.makeCache(loader)
+        lru_cache.put(1, "stale")
+        self.clock.now = 9
+        lru_cache.get(1)
+        self.waitForReloads(lru_cache)
+
+        self.assertEqual("stale", lru_cache.get(1))
+        self.assertEqual(1, lru_cache.refresh_errors)
+        self.assertIsInstance(lru_cache.last_refresh_error, IOError)
+        self.waitForReloads(lru_cache)
+        self.assertEqual("fresh", lru_cache.get(1))
+
+    def test_items_without_ttl_are_not_reloaded(self):
+        lru_cache = cache.LRUCache(10, loader=lambda key: "fresh")
+        self.addCleanup(lru_cache.close)
+        lru_cache.put(1, "value1")
+
+        self.assertEqual("value1", lru_cache.get(1))
+        self.assertEqual({}, lru_cache.refresh_at)
+        self.assertIsNone(lru_cache.refresh_pool)
+
+class PromotionThrottlingTest(RecencyOrderMixin, unittest.TestCase):
+
+    def test_peek_leaves_recency_and_stats_alone(self):
+        lru_cache = cache.LRUCache(3, stats=True)
+        lru_cache.put_many([(1, "value1"), (2, "value2")])
+
+        self.assertEqual("value1", lru_cache.peek(1))
+        self.assertEqual(0, lru_cache.peek(3, 0))
+        self.assertEqual([2, 1], self.keysInOrder(lru_cache))
+        self.assertEqual(0, lru_cache.stats.hits + lru_cache.stats.misses)
+
+    def test_peek_skips_expired_items(self):
+        clock = FakeClock()
+        lru_cache = cache.LRUCache(3, ttl=5, clock=clock)
+        lru_cache.put(1, "value1")
+        clock.now = 6
+
+        self.assertIsNone(lru_cache.peek(1))
+        self.assertEqual(1, len(lru_cache))
+
+    def test_peek_on_other_caches(self):
+        compact_cache = cache.CompactLRUCache(3)
+        concurrent_cache = cache.ConcurrentLRUCache(3, shards=1)
+        for lru_cache in (compact_cache, concurrent_cache):
+            lru_cache.put(1, "value1")
+            lru_cache.put(2, "value2")
+            self.assertEqual("value1", lru_cache.peek(1))
+            self.assertIsNone(lru_cache.peek(3))
+        self.assertEqual([2, 1], self.keysInOrder(concurrent_cache.shards[0]))
+
+    def test_promotion_interval_skips_recently_promoted_items(self):
+        lru_cache = cache.LRUCache(3, promotion_interval=3)
+        lru_cache.put_many([(1, "value1"), (2, "value2"), (3, "value3")])
+
+        lru_cache.get(1)
+        self.assertEqual([1, 3, 2], self.keysInOrder(lru_cache))
+        lru_cache.get(2)
+        lru_cache.get(1)
+        self.assertEqual([2, 1, 3], self.keysInOrder(lru_cache))
+        lru_cache.get(3)
+        lru_cache.get(1)
+        self.assertEqual([1, 3, 2], self.keysInOrder(lru_cache))
+
+    def test_promotion_delay_skips_recently_promoted_items(self):
+        clock = FakeClock(now=100)
+        lru_cache = cache.LRUCache(3, clock=clock, promotion_delay=0.5)
+        lru_cache.put_many([(1, "value1"), (2, "value2")])
+
+        lru_cache.get(1)
+        lru_cache.get(2)
+        lru_cache.get(1)
+        self.assertEqual([2, 1], self.keysInOrder(lru_cache))
+        clock.now = 100.5
+        lru_cache.get(1)
+        self.assertEqual([1, 2], self.keysInOrder(lru_cache))
+
+    def test_access_buffer_replays_hits_in_bulk(self):
+        lru_cache = cache.LRUCache(4, access_buffer=3)
+        lru_cache.put_many([(1, "value1"), (2, "value2"), (3, "value3"), (4, "value4")])
+
+        lru_cache.get_many([1, 2])
+        self.assertEqual([4, 3, 2, 1], self.keysInOrder(lru_cache))
+        lru_cache.get(3)
+        self.assertEqual([3, 2, 1, 4], self.keysInOrder(lru_cache))
+        self.assertEqual([], lru_cache.access_buffer)
+
+    def test_access_buffer_is_drained_before_evicting(self):
+        lru_cache = cache.LRUCache(3, access_buffer=100)
+        lru_cache.put_many([(1, "value1"), (2, "value2"), (3, "value3")])
+        lru_cache.get(1)
+        lru_cache.get(2)
+        lru_cache.delete(2)
+        lru_cache.put(2, "new value2")
+        lru_cache.put(4, "value4")
+
+        self.assertEqual([4, 1, 2], self.keysInOrder(lru_cache))
+        self.assertEqual([(2, "new value2"), (1, "value1"), (4, "value4")],
+                         lru_cache.items())
+
+    def test_access_buffer_with_weighted_update(self):
+        for policy in ("lru", "sieve", "clock", "arc", "w-tinylfu"):
+            lru_cache = cache.LRUCache(10, max_weight=10, weigher=lambda key, value: value,
+                                       access_buffer=100, policy=policy)
+            for key in "abcd":
+                lru_cache.put(key, 2)
+            for key in "bca":
+                lru_cache.get(key)
+            lru_cache.put("a", 7)
+
+            pairs = lru_cache.items()
+            self.assertEqual(sorted(lru_cache.dictionary), sorted(key for key, _ in pairs))
+            self.assertEqual(len(lru_cache), len(list(lru_cache.policy)))
+            self.assertEqual(7, lru_cache.get("a"))
+            self.assertTrue(lru_cache.weight <= 10)
+
+    def test_throttling_modes_are_exclusive(self):
+        with self.assertRaises(AssertionError):
+            cache.LRUCache(3, promotion_interval=2, access_buffer=8)
+
+class BatchTest(unittest.TestCase):
+
+    def test_runs_commands_and_writes_get_results(self):
+        lru_cache = cache.LRUCache(2)
+        output = io.StringIO()
+        errors = io.StringIO()
+        lines = ["put a 1\n", "put b hello world\r\n", "\n", "get a\n", "get b\n",
+                 "put c 3\n", "get b\n", "delete b\n", "get b\n", "reset\n", "get a\n"]
+
+        count = cache.run_batch(lru_cache, lines, output, errors)
+
+        self.assertEqual(10, count)
+        self.assertEqual("1\nhello world\nhello world\nNone\nNone\n", output.getvalue())
+        self.assertEqual("", errors.getvalue())
+        self.assertEqual(0, len(lru_cache))
+
+    def test_reports_bad_lines_and_carries_on(self):
+        lru_cache = cache.LRUCache(2)
+        output = io.StringIO()
+        errors = io.StringIO()
+
+        count = cache.run_batch(lru_cache, ["bogus\n", "get\n", "put a 1\n", "get a\n"],
+                                output, errors)
+
+        self.assertEqual(2, count)
+        self.assertEqual("1\n", output.getvalue())
+        self.assertEqual("line 1: cannot run 'bogus'\nline 2: cannot run 'get'\n",
+                         errors.getvalue())
+
+class AdmissionTest(unittest.TestCase):
+
+    def test_bloom_filter(self):
+        bloom_filter = cache.BloomFilter(1000, error_rate=0.01)
+
+        self.assertFalse(bloom_filter.add("a"))
+        self.assertTrue(bloom_filter.add("a"))
+        self.assertIn("a", bloom_filter)
+        for key in range(1000):
+            bloom_filter.add(key)
+        false_positives = sum(1 for key in range(1000, 11000) if key in bloom_filter)
+        self.assertTrue(false_positives < 300)
+        self.assertTrue(0.001 < bloom_filter.false_positive_rate() < 0.03)
+
+        bloom_filter.clear()
+        self.assertNotIn("a", bloom_filter)
+        self.assertEqual(0, bloom_filter.false_positive_rate())
+
+    def test_victim_is_what_evict_removes(self):
+        for policy in cache.POLICIES:
+            lru_cache = cache.LRUCache(50, policy=policy)
+            randomizer = random.Random(7)
+            for _ in range(500):
+                key = randomizer.randrange(100)
+                if lru_cache.get(key) is None:
+                    victim = lru_cache.policy.victim() if len(lru_cache) == 50 else None
+                    lru_cache.put(key, key)
+                    if victim is not None and policy != "w-tinylfu":
+                        self.assertNotIn(victim.key, lru_cache.dictionary, policy)
+
+    def test_new_keys_need_a_second_access_or_a_higher_frequency(self):
+        lru_cache = cache.LRUCache(2, admission=True, stats=True)
+        lru_cache.put_many([(1, "value1"), (2, "value2")])
+        lru_cache.get(1)
+        lru_cache.get(2)
+
+        lru_cache.put(3, "value3")
+        self.assertNotIn(3, lru_cache.dictionary)
+        self.assertEqual(1, lru_cache.stats.rejections)
+        lru_cache.put(3, "value3")
+        self.assertEqual("value3", lru_cache.peek(3))
+        self.assertEqual(1, lru_cache.admission.rejected)
+
+    def test_cache_aside_one_hit_wonders_stay_out(self):
+        def hotHits(lru_cache):
+            for _ in range(3):
+                for key in range(100):
+                    if lru_cache.get(key) is None:
+                        lru_cache.put(key, key)
+            hits = 0
+            # every read of a hot key is followed by a key never seen again
+            for key in range(1000, 3000):
+                if lru_cache.get(key % 100) is None:
+                    lru_cache.put(key % 100, key % 100)
+                else:
+                    hits += 1
+                if lru_cache.get(key) is None:
+                    lru_cache.put(key, key)
+            return hits
+
+        self.assertTrue(hotHits(cache.LRUCache(100)) < 10)
+        self.assertTrue(hotHits(cache.LRUCache(100, admission=True)) > 1000)
+
+    def test_rejected_puts_do_not_rescan_sieve_and_clock(self):
+        for policy in ("sieve", "clock"):
+            lru_cache = cache.LRUCache(20000, admission=True, policy=policy)
+            lru_cache.put_many((key, key) for key in range(20000))
+            for _ in range(2):
+                lru_cache.get_many(range(20000))
+
+            lru_cache.put(-1, -1)
+            victim = lru_cache.policy.victim()
+            hand = lru_cache.policy.hand
+            self.assertIs(victim, lru_cache.policy.victim())
+            self.assertIs(hand, lru_cache.policy.hand)
+
+            start = time.perf_counter()
+            for key in range(100000, 102000):
+                lru_cache.put(key, key)
+            self.assertTrue(time.perf_counter() - start < 1, policy)
+            self.assertEqual(2001, lru_cache.admission.rejected, policy)
+            self.assertEqual(20000, len(lru_cache))
+
+    def test_aging_clears_the_doorkeeper(self):
+        admission = cache.AdmissionFilter(10, sample_size=4)
+        admission.record("a")
+        admission.record("a")
+        admission.record("a")
+
+        self.assertEqual(3, admission.frequency("a"))
+        admission.record("b")
+        self.assertNotIn("a", admission.doorkeeper)
+        self.assertEqual(1, admission.frequency("a"))
+
+    def test_report(self):
+        lru_cache = cache.LRUCache(100, admission=True)
+        lru_cache.put_many((key, key) for key in range(200))
+
+        report = lru_cache.admission.report()
+        self.assertEqual(report["doorkeeper_bytes"] + report["sketch_bytes"],
+                         report["memory_bytes"])
+        self.assertEqual(100, report["admitted"] + report["rejected"])
+        self.assertTrue(0 <= report["false_positive_rate"] < 0.01)
+
+    def test_rejected_write_back_put_is_written_through(self):
+        written = []
+        lru_cache = cache.LRUCache(1, admission=True, store=written.append)
+        self.addCleanup(lru_cache.close)
+        lru_cache.put(1, "value1")
+        lru_cache.get(1)
+        lru_cache.put(2, "value2")
+
+        self.assertEqual([{2: "value2"}], written)
+
+class CompressionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.text = '{"name": "value", "items": [1, 2, 3]}' * 100
+        self.data = os.urandom(4096)
+
+    def test_large_values_are_held_compressed(self):
+        lru_cache = cache.LRUCache(10, compression=True)
+        lru_cache.put("text", self.text)
+        lru_cache.put("bytes", self.text.encode())
+        lru_cache.put("small", "x" * 100)
+        lru_cache.put("number", 10 ** 1000)
+
+        self.assertIsInstance(lru_cache.dictionary["text"].value, cache.Compressed)
+        self.assertIsInstance(lru_cache.dictionary["bytes"].value, cache.Compressed)
+        self.assertEqual("x" * 100, lru_cache.dictionary["small"].value)
+        self.assertEqual(self.text, lru_cache.get("text"))
+        self.assertEqual(self.text.encode(), lru_cache.get("bytes"))
+        self.assertEqual(self.text, lru_cache.peek("text"))
+        self.assertEqual({"text": self.text, "small": "x" * 100},
+                         lru_cache.get_many(iter(["text", "small", "missing"])))
+        self.assertEqual([self.text, None],
+                         lru_cache.get_many(iter(["text", "missing"]), as_list=True))
+        self.assertEqual(self.text, dict(lru_cache.items())["text"])
+
+    def test_poorly_compressing_values_are_kept_as_they_are(self):
+        lru_cache = cache.LRUCache(10, compression=True)
+        lru_cache.put("random", self.data)
+
+        self.assertIs(self.data, lru_cache.dictionary["random"].value)
+        self.assertEqual(1, lru_cache.compression.skipped)
+        self.assertEqual(0, lru_cache.compression.compressed)
+
+    def test_report(self):
+        lru_cache = cache.LRUCache(10, compression=True)
+        lru_cache.put("text", self.text)
+        lru_cache.get("text")
+
+        report = lru_cache.compression.report()
+        self.assertEqual(len(self.text), report["bytes_in"])
+        self.assertEqual(report["bytes_in"] - report["bytes_out"], report["bytes_saved"])
+        self.assertTrue(report["ratio"] < 0.1)
+        self.assertTrue(report["compress_seconds"] > 0)
+        self.assertEqual(1, report["decompressions"])
+
+    def test_max_weight_counts_compressed_size(self):
+        lru_cache = cache.LRUCache(max_weight=2000, compression=True)
+        for key in range(10):
+            lru_cache.put(key, self.text)
+
+        self.assertEqual(10, len(lru_cache))
+        self.assertTrue(lru_cache.weight < 2000)
+
+    def test_hottest_decompressed_values_are_kept(self):
+        compressor = cache.Compressor(decompressed_size=1)
+        lru_cache = cache.LRUCache(10, compression=compressor)
+        lru_cache.put("a", self.text)
+        lru_cache.put("b", self.text)
+        lru_cache.get("a")
+        lru_cache.get("a")
+        lru_cache.get("b")
+        lru_cache.get("b")
+
+        self.assertEqual(2, compressor.decompressions)
+        self.assertEqual(2, compressor.decompressed_hits)
+        lru_cache.put("b", self.text[::-1])
+        self.assertEqual(self.text[::-1], lru_cache.get("b"))
+        lru_cache.delete("b")
+        self.assertEqual(0, len(compressor.decompressed))
+
+    def test_concurrent_cache_gives_each_shard_its_own_compressor(self):
+        import lzma
+        compressor = cache.Compressor(codec=lzma, threshold=10, decompressed_size=8)
+        lru_cache = cache.ConcurrentLRUCache(100, shards=4, compression=compressor)
+        lru_cache.put("text", self.text)
+
+        compressors = [shard.compression for shard in lru_cache.shards]
+        self.assertEqual(4, len(set(map(id, compressors))))
+        self.assertNotIn(compressor, compressors)
+        for shard_compressor in compressors:
+            self.assertIs(lzma, shard_compressor.codec)
+            self.assertEqual(10, shard_compressor.threshold)
+            self.assertEqual(2, shard_compressor.decompressed_size)
+        self.assertEqual(self.text, lru_cache.get("text"))
+
+    def test_pluggable_codec(self):
+        import lzma
+        lru_cache = cache.LRUCache(10, compression=cache.Compressor(codec=lzma, threshold=10))
+        lru_cache.put("text", self.text)
+
+        self.assertEqual(lzma.decompress(lru_cache.dictionary["text"].value.data),
+                         self.text.encode())
+        self.assertEqual(self.text, lru_cache.get("text"))
+
+    def test_evicted_and_written_values_are_decompressed(self):
+        evicted = []
+        written = []
+        lru_cache = cache.LRUCache(1, compression=True, store=written.append,
+                                   on_evict=lambda key, value: evicted.append(value))
+        self.addCleanup(lru_cache.close)
+        lru_cache.put("a", self.text)
+        lru_cache.put("b", "small")
+
+        self.assertEqual([self.text], evicted)
+        self.assertEqual([{"a": self.text}], written)
+
+    def test_spilled_values_stay_compressed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            tier = spill.SpillTier(directory)
+            lru_cache = cache.LRUCache(1, compression=True, spill=tier)
+            lru_cache.put("a", self.text)
+            lru_cache.put("b", "small")
+
+            self.assertIsInstance(tier.get("a")[0], cache.Compressed)
+            self.assertEqual(self.text, lru_cache.get("a"))
+            tier.close()
+
+class InvalidationTest(unittest.TestCase):
+
+    def test_invalidate_tag(self):
+        lru_cache = cache.LRUCache(10, stats=True)
+        lru_cache.put("user:1:name", "a", tags=["user:1"])
+        lru_cache.put("user:1:email", "b", tags=["user:1", "emails"])
+        lru_cache.put("user:2:email", "c", tags="emails")
+        lru_cache.put("other", "d")
+
+        self.assertEqual(2, lru_cache.invalidate_tag("user:1"))
+        self.assertEqual(["other", "user:2:email"], sorted(lru_cache.dictionary))
+        self.assertEqual({"emails": {"user:2:email"}}, lru_cache.tags)
+        self.assertEqual(2, lru_cache.stats.deletes)
+        self.assertEqual(0, lru_cache.invalidate_tag("user:1"))
+
+    def test_put_replaces_tags_only_when_given(self):
+        lru_cache = cache.LRUCache(10)
+        lru_cache.put("a", 1, tags=["x"])
+        lru_cache.put("a", 2)
+        self.assertEqual({"x": {"a"}}, lru_cache.tags)
+
+        lru_cache.put("a", 3, tags=["y"])
+        self.assertEqual({"y": {"a"}}, lru_cache.tags)
+        self.assertEqual(0, lru_cache.invalidate_tag("x"))
+        self.assertEqual(1, lru_cache.invalidate_tag("y"))
+
+    def test_indexes_follow_evictions_deletes_and_reset(self):
+        lru_cache = cache.LRUCache(2, key_index=True)
+        lru_cache.put("a", 1, tags=["t"])
+        lru_cache.put("b", 2, tags=["t"])
+        lru_cache.put("c", 3, tags=["t"])
+
+        self.assertEqual({"t": {"b", "c"}}, lru_cache.tags)
+        self.assertEqual(["b", "c"], list(lru_cache.sorted_keys))
+        lru_cache.delete("b")
+        self.assertEqual({"t": {"c"}}, lru_cache.tags)
+        self.assertEqual(["c"], list(lru_cache.sorted_keys))
+        lru_cache.reset()
+        self.assertEqual({}, lru_cache.tags)
+        self.assertEqual({}, lru_cache.key_tags)
+        self.assertEqual([], list(lru_cache.sorted_keys))
+
+    def test_indexes_follow_expiry(self):
+        clock = FakeClock()
+        lru_cache = cache.LRUCache(10, clock=clock, key_index=True)
+        lru_cache.put("a", 1, ttl=1, tags=["t"])
+        clock.now = 5
+        lru_cache.expire()
+
+        self.assertEqual({}, lru_cache.tags)
+        self.assertEqual([], list(lru_cache.sorted_keys))
+
+    def test_invalidate_prefix(self):
+        for key_index in (True, False):
+            lru_cache = cache.LRUCache(100, key_index=key_index)
+            lru_cache.put_many(("user:%d:%s" % (user, field), field)
+                               for user in range(12) for field in ("name", "email"))
+            if not key_index:
+                # scanning skips keys of other types, sorting needs one type
+                lru_cache.put(7, "not a string")
+
+            self.assertEqual(["user:1:email", "user:1:name"],
+                             lru_cache.keys_with_prefix("user:1:"))
+            self.assertEqual(2, lru_cache.invalidate_prefix("user:1:"))
+            self.assertEqual(4, lru_cache.invalidate_prefix("user:1"))
+            self.assertEqual(["user:0:email", "user:0:name"],
+                             lru_cache.keys_with_prefix("user:0"))
+            self.assertEqual(18 if key_index else 19, len(lru_cache))
+
+    def test_sorted_keys_split_and_merge_chunks(self):
+        sorted_keys = cache.SortedKeys(chunk_size=4)
+        keys = list(range(100))
+        random.Random(1).shuffle(keys)
+        for key in keys:
+            sorted_keys.add(key)
+
+        self.assertEqual(list(range(100)), list(sorted_keys))
+        self.assertTrue(all(len(chunk) < 4 for chunk in sorted_keys.chunks))
+        self.assertEqual([chunk[-1] for chunk in sorted_keys.chunks], sorted_keys.maxes)
+        self.assertEqual([10, 11, 12], list(sorted_keys.irange(10, 13)))
+        self.assertEqual([98, 99], list(sorted_keys.irange(98)))
+        self.assertEqual([], list(sorted_keys.irange(100)))
+
+        for key in keys[:90]:
+            sorted_keys.discard(key)
+        sorted_keys.discard(1000)
+        sorted_keys.discard(keys[0])
+
+        self.assertEqual(sorted(keys[90:]), list(sorted_keys))
+        self.assertEqual(10, len(sorted_keys))
+        self.assertEqual([chunk[-1] for chunk in sorted_keys.chunks], sorted_keys.maxes)
+
+    def test_keys_in_range(self):
+        lru_cache = cache.LRUCache(100, key_index=True)
+        for key in "edcba":
+            lru_cache.put(key, key)
+
+        self.assertEqual(["b", "c"], lru_cache.keys_in_range("b", "d"))
+        with self.assertRaises(AssertionError):
+            cache.LRUCache(10).keys_in_range("a", "b")
+
+    def test_tagged_items_are_not_spilled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            tier = spill.SpillTier(directory)
+            lru_cache = cache.LRUCache(1, spill=tier)
+            lru_cache.put("a", 1, tags=["t"])
+            lru_cache.put("b", 2)
+            lru_cache.put("c", 3)
+
+            self.assertEqual(["b"], tier.keys())
+            lru_cache.invalidate_prefix("b")
+            self.assertEqual([], tier.keys())
+            tier.close()
+
+    def test_concurrent_cache(self):
+        lru_cache = cache.ConcurrentLRUCache(100, shards=4, key_index=True)
+        for key in range(20):
+            lru_cache.put("k%02d" % key, key, tags=["even" if key % 2 == 0 else "odd"])
+
+        self.assertEqual(10, lru_cache.invalidate_tag("even"))
+        self.assertEqual(5, lru_cache.invalidate_prefix("k1"))
+        self.assertEqual(5, len(lru_cache))
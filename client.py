@@ -0,0 +1,167 @@
+"""An asyncio client for the cache server in server.py.
+
+    client = CacheClient("127.0.0.1", 11211, pool_size=4)
+    await client.set("key", b"value")
+    await client.get("key")
+    await client.close()
+"""
+import asyncio
+
+
+class CacheError(Exception):
+    """The server answered with an error"""
+
+
+class Connection:
+    """One connection to the server, sending a batch of requests at a time"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def request(self, payload, replies):
+        """Send pipelined requests and read their replies.
+
+        Parameters:
+        payload (bytes): one or more requests
+        replies (int): the number of replies to read
+
+        Returns:
+            results (list): the parsed replies, in request order
+        """
+        self.writer.write(payload)
+        await self.writer.drain()
+        return [await self.read_reply() for _ in range(replies)]
+
+    async def read_reply(self):
+        """Read one reply, a dictionary of values for a get"""
+        line = await self.reader.readuntil(b"\r\n")
+        if not line.startswith(b"VALUE ") and not line.startswith(b"STAT ") \
+                and line != b"END\r\n":
+            if line.startswith((b"ERROR", b"CLIENT_ERROR", b"SERVER_ERROR")):
+                raise CacheError(line.decode().strip())
+            return line[:-2].decode()
+        values = {}
+        while line != b"END\r\n":
+            words = line.split()
+            if words[0] == b"VALUE":
+                data = await self.reader.readexactly(int(words[3]) + 2)
+                values[words[1].decode()] = data[:-2]
+            else:
+                values[words[1].decode()] = words[2].decode()
+            line = await self.reader.readuntil(b"\r\n")
+        return values
+
+    def close(self):
+        self.writer.close()
+
+
+class CacheClient:
+    """A pool of connections to one cache server.
+
+    Each request takes a connection from the pool for its round trip, so
+    up to pool_size requests are in flight at once. A request waiting for
+    a turn reuses an idle connection, or opens one if a failed connection
+    was dropped. Keys are strings and
+    values are bytes, strings are encoded as UTF-8.
+
+    Attributes
+    ----------
+    host : string
+        the server host
+    port: int
+        the server port
+    pool_size: int
+        the most connections opened to the server
+    """
+
+    def __init__(self, host="127.0.0.1", port=11211, pool_size=4):
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        # one turn per connection, so no waiter is left behind when one fails
+        self.turns = asyncio.Semaphore(pool_size)
+        self.idle = []
+        self.opened = 0
+        self.connections = []
+
+    async def _open(self):
+        self.opened += 1
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        except BaseException:
+            self.opened -= 1
+            raise
+        connection = Connection(reader, writer)
+        self.connections.append(connection)
+        return connection
+
+    async def _request(self, payload, replies=1):
+        async with self.turns:
+            # the most recently used connection first, like a LIFO queue
+            connection = self.idle.pop() if self.idle else await self._open()
+            try:
+                results = await connection.request(payload, replies)
+            except BaseException:
+                # the connection is left mid reply, never reuse it
+                connection.close()
+                self.connections.remove(connection)
+                self.opened -= 1
+                raise
+            self.idle.append(connection)
+            return results
+
+    @staticmethod
+    def _set_request(key, value, ttl=0, noreply=False):
+        if isinstance(value, str):
+            value = value.encode()
+        return b"set %s 0 %d %d%s\r\n%s\r\n" % (
+            key.encode(), ttl, len(value), b" noreply" if noreply else b"", value)
+
+    async def set(self, key, value, ttl=0):
+        """Store a value, expiring after ttl seconds unless ttl is zero"""
+        reply, = await self._request(self._set_request(key, value, ttl))
+        return reply == "STORED"
+
+    async def set_many(self, pairs, ttl=0):
+        """Store many key value pairs in one pipelined round trip"""
+        payload = b"".join(self._set_request(key, value, ttl) for key, value in pairs)
+        replies = await self._request(payload, len(pairs))
+        return all(reply == "STORED" for reply in replies)
+
+    async def get(self, key, default=None):
+        """Return the value of a key, or default when it is not cached"""
+        values, = await self._request(b"get %s\r\n" % key.encode())
+        return values.get(key, default)
+
+    async def get_many(self, keys):
+        """Return a dictionary of the values of the cached keys"""
+        if not keys:
+            return {}
+        values, = await self._request(
+            b"get %s\r\n" % b" ".join(key.encode() for key in keys))
+        return values
+
+    async def delete(self, key):
+        """Delete a key, returning whether it was cached"""
+        reply, = await self._request(b"delete %s\r\n" % key.encode())
+        return reply == "DELETED"
+
+    async def flush_all(self):
+        """Empty the cache"""
+        await self._request(b"flush_all\r\n")
+
+    async def stats(self):
+        """Return the server statistics as a dictionary of strings"""
+        values, = await self._request(b"stats\r\n")
+        return values
+
+    async def close(self):
+        """Close every connection of the pool"""
+        for connection in self.connections:
+            connection.close()
+        for connection in self.connections:
+            await connection.writer.wait_closed()
+        self.connections = []
+        self.opened = 0
+        self.idle = []
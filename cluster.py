@@ -0,0 +1,205 @@
+"""Spread one logical cache over several cache nodes.
+
+    cluster = CacheCluster({"a": CacheClient(port=11211), "b": CacheClient(port=11212)})
+    await cluster.set("key", b"value")
+    await cluster.get_many(["key", "other"])
+
+Each key lives on one node, found on a consistent hash ring where every
+node owns many small arcs, its virtual nodes. When a node joins it takes
+over about 1/N of the keys, a share of the arcs of every other node, and
+when one leaves only its own keys move, spread evenly over the rest. Moved
+keys are not copied across, they miss once and are filled again from the
+backing store like any other miss.
+
+A node is anything with the async methods of CacheClient, so besides cache
+servers reached over a socket a LocalNode wraps an LRUCache in this
+process, which is handy for tests and for a single machine.
+"""
+import asyncio
+import bisect
+import hashlib
+
+VIRTUAL_NODES = 160
+
+
+def key_hash(key):
+    """Return a 64 bit hash of a key, the same in every process"""
+    if not isinstance(key, bytes):
+        key = str(key).encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """A consistent hash ring mapping keys to node names.
+
+    Attributes
+    ----------
+    virtual_nodes : int
+        the number of points each node has on the ring
+    points: list
+        the sorted hashes of every virtual node
+    owners: list
+        the node name of each point
+    """
+
+    def __init__(self, names=(), virtual_nodes=VIRTUAL_NODES):
+        assert (virtual_nodes > 0), "Virtual nodes must be greater than zero"
+        self.virtual_nodes = virtual_nodes
+        self.points = []
+        self.owners = []
+        self.names = set()
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        """Place the virtual nodes of a node on the ring"""
+        assert (name not in self.names), "Node is already on the ring"
+        self.names.add(name)
+        for replica in range(self.virtual_nodes):
+            point = key_hash("%s#%d" % (name, replica))
+            index = bisect.bisect(self.points, point)
+            self.points.insert(index, point)
+            self.owners.insert(index, name)
+
+    def remove(self, name):
+        """Take the virtual nodes of a node off the ring"""
+        assert (name in self.names), "Node is not on the ring"
+        self.names.remove(name)
+        kept = [(point, owner) for point, owner in zip(self.points, self.owners)
+                if owner != name]
+        self.points = [point for point, owner in kept]
+        self.owners = [owner for point, owner in kept]
+
+    def node_for(self, key):
+        """Return the name of the node owning a key, the first point
+        clockwise of its hash"""
+        assert (self.points), "The ring has no nodes"
+        index = bisect.bisect(self.points, key_hash(key))
+        if index == len(self.points):
+            index = 0
+        return self.owners[index]
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+
+class LocalNode:
+    """An LRUCache in this process behind the interface of CacheClient"""
+
+    def __init__(self, lru_cache):
+        self.lru_cache = lru_cache
+
+    async def set(self, key, value, ttl=0):
+        self.lru_cache.put(key, value, ttl=ttl if ttl > 0 else None)
+        return True
+
+    async def set_many(self, pairs, ttl=0):
+        self.lru_cache.put_many(pairs, ttl=ttl if ttl > 0 else None)
+        return True
+
+    async def get(self, key, default=None):
+        return self.lru_cache.get(key, default)
+
+    async def get_many(self, keys):
+        return self.lru_cache.get_many(keys)
+
+    async def delete(self, key):
+        found = key in self.lru_cache.dictionary
+        self.lru_cache.delete(key)
+        return found
+
+    async def flush_all(self):
+        self.lru_cache.reset()
+
+    async def close(self):
+        pass
+
+
+class CacheCluster:
+    """One cache spread over several nodes by consistent hashing.
+
+    Single key requests go to the node owning the key. Multi key requests
+    are split by node and the parts sent to all nodes at once, so they take
+    the time of the slowest node rather than the sum of them.
+
+    Attributes
+    ----------
+    nodes : dictionary
+        the node of each name, a CacheClient or LocalNode
+    ring: HashRing
+        the ring mapping keys to node names
+    """
+
+    def __init__(self, nodes=None, virtual_nodes=VIRTUAL_NODES):
+        self.nodes = {}
+        self.ring = HashRing(virtual_nodes=virtual_nodes)
+        for name, node in (nodes or {}).items():
+            self.add_node(name, node)
+
+    def add_node(self, name, node):
+        """Add a node, which takes over about 1/N of the keys"""
+        self.ring.add(name)
+        self.nodes[name] = node
+
+    def remove_node(self, name):
+        """Remove a node and return it, its keys going to the others"""
+        self.ring.remove(name)
+        return self.nodes.pop(name)
+
+    def node_for(self, key):
+        """Return the node owning a key"""
+        return self.nodes[self.ring.node_for(key)]
+
+    def _split(self, items, key=lambda item: item):
+        """Group items by the name of the node owning their key"""
+        groups = {}
+        node_for = self.ring.node_for
+        for item in items:
+            groups.setdefault(node_for(key(item)), []).append(item)
+        return groups
+
+    async def set(self, key, value, ttl=0):
+        """Store a value, expiring after ttl seconds unless ttl is zero"""
+        return await self.node_for(key).set(key, value, ttl)
+
+    async def set_many(self, pairs, ttl=0):
+        """Store many key value pairs, each node's share in parallel"""
+        if hasattr(pairs, "items"):
+            pairs = pairs.items()
+        groups = self._split(pairs, key=lambda pair: pair[0])
+        results = await asyncio.gather(*(self.nodes[name].set_many(group, ttl)
+                                         for name, group in groups.items()))
+        return all(results)
+
+    async def get(self, key, default=None):
+        """Return the value of a key, or default when it is not cached"""
+        return await self.node_for(key).get(key, default)
+
+    async def get_many(self, keys):
+        """Return a dictionary of the values of the cached keys, asking
+        every node in parallel"""
+        groups = self._split(keys)
+        results = await asyncio.gather(*(self.nodes[name].get_many(group)
+                                         for name, group in groups.items()))
+        values = {}
+        for result in results:
+            values.update(result)
+        return values
+
+    async def delete(self, key):
+        """Delete a key, returning whether it was cached"""
+        return await self.node_for(key).delete(key)
+
+    async def flush_all(self):
+        """Empty every node"""
+        await asyncio.gather(*(node.flush_all() for node in self.nodes.values()))
+
+    async def close(self):
+        """Close every node"""
+        await asyncio.gather(*(node.close() for node in self.nodes.values()))
+
+    def __len__(self):
+        return len(self.nodes)
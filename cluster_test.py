@@ -0,0 +1,130 @@
+import asyncio
+import unittest
+import cache
+import cluster
+import server
+from client import CacheClient
+
+def localCluster(names, max_size=1000):
+    return cluster.CacheCluster({name: cluster.LocalNode(cache.LRUCache(max_size))
+                                 for name in names})
+
+class SlowNode(cluster.LocalNode):
+
+    in_flight = 0
+    most_in_flight = 0
+
+    async def get_many(self, keys):
+        SlowNode.in_flight += 1
+        SlowNode.most_in_flight = max(SlowNode.most_in_flight, SlowNode.in_flight)
+        await asyncio.sleep(0.01)
+        SlowNode.in_flight -= 1
+        return await super().get_many(keys)
+
+class HashRingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.keys = ["key%d" % key for key in range(10000)]
+
+    def test_keys_are_spread_evenly(self):
+        ring = cluster.HashRing(["a", "b", "c", "d"])
+        counts = {}
+        for key in self.keys:
+            name = ring.node_for(key)
+            counts[name] = counts.get(name, 0) + 1
+
+        self.assertEqual(["a", "b", "c", "d"], sorted(counts))
+        for count in counts.values():
+            self.assertAlmostEqual(2500, count, delta=500)
+
+    def test_joining_node_moves_about_one_nth_of_keys(self):
+        ring = cluster.HashRing(["a", "b", "c", "d"])
+        before = {key: ring.node_for(key) for key in self.keys}
+        ring.add("e")
+        moved = [key for key in self.keys if ring.node_for(key) != before[key]]
+
+        self.assertAlmostEqual(len(self.keys) / 5, len(moved), delta=len(self.keys) * 0.05)
+        self.assertTrue(all(ring.node_for(key) == "e" for key in moved))
+
+    def test_leaving_node_moves_only_its_keys(self):
+        ring = cluster.HashRing(["a", "b", "c", "d", "e"])
+        before = {key: ring.node_for(key) for key in self.keys}
+        ring.remove("c")
+        moved = [key for key in self.keys if ring.node_for(key) != before[key]]
+
+        self.assertAlmostEqual(len(self.keys) / 5, len(moved), delta=len(self.keys) * 0.05)
+        self.assertTrue(all(before[key] == "c" for key in moved))
+        self.assertEqual(4 * ring.virtual_nodes, len(ring.points))
+
+    def test_empty_ring(self):
+        ring = cluster.HashRing()
+        self.assertEqual(0, len(ring))
+        with self.assertRaises(AssertionError):
+            ring.node_for("a")
+
+class CacheClusterTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_routes_each_key_to_one_node(self):
+        cache_cluster = localCluster(["a", "b", "c"])
+        for key in range(300):
+            self.assertTrue(await cache_cluster.set(str(key), key))
+
+        self.assertEqual(300, sum(len(node.lru_cache) for node in cache_cluster.nodes.values()))
+        for key in range(300):
+            node = cache_cluster.node_for(str(key))
+            self.assertEqual(key, node.lru_cache.peek(str(key)))
+        self.assertEqual(7, await cache_cluster.get("7"))
+        self.assertIsNone(await cache_cluster.get("missing"))
+        self.assertTrue(await cache_cluster.delete("7"))
+        self.assertFalse(await cache_cluster.delete("7"))
+
+    async def test_set_many_and_get_many(self):
+        cache_cluster = localCluster(["a", "b", "c"])
+        self.assertTrue(await cache_cluster.set_many({str(key): key for key in range(100)}))
+
+        values = await cache_cluster.get_many([str(key) for key in range(95, 105)])
+
+        self.assertEqual({str(key): key for key in range(95, 100)}, values)
+        await cache_cluster.flush_all()
+        self.assertEqual({}, await cache_cluster.get_many(["1", "2"]))
+
+    async def test_multi_key_requests_go_to_nodes_in_parallel(self):
+        SlowNode.most_in_flight = 0
+        cache_cluster = cluster.CacheCluster({name: SlowNode(cache.LRUCache(100))
+                                              for name in "abcd"})
+
+        await cache_cluster.get_many([str(key) for key in range(100)])
+
+        self.assertEqual(4, SlowNode.most_in_flight)
+
+    async def test_removed_node_keys_miss_then_refill(self):
+        cache_cluster = localCluster(["a", "b", "c"])
+        await cache_cluster.set_many({str(key): key for key in range(300)})
+        node = cache_cluster.remove_node("b")
+
+        found = await cache_cluster.get_many([str(key) for key in range(300)])
+
+        self.assertEqual(300 - len(node.lru_cache), len(found))
+        cache_cluster.add_node("b", node)
+        self.assertEqual(300, len(await cache_cluster.get_many([str(key) for key in range(300)])))
+
+    async def test_cluster_of_servers(self):
+        cache_servers = [server.CacheServer(cache.LRUCache(100)) for _ in range(2)]
+        for cache_server in cache_servers:
+            await cache_server.start("127.0.0.1", 0)
+        cache_cluster = cluster.CacheCluster(
+            {"server%d" % index: CacheClient("127.0.0.1", cache_server.port)
+             for index, cache_server in enumerate(cache_servers)})
+        try:
+            await cache_cluster.set_many([("k%d" % key, b"%d" % key) for key in range(20)])
+
+            self.assertEqual(b"3", await cache_cluster.get("k3"))
+            self.assertEqual(20, len(await cache_cluster.get_many(["k%d" % key for key in range(20)])))
+            self.assertTrue(all(len(cache_server.lru_cache) > 0 for cache_server in cache_servers))
+        finally:
+            await cache_cluster.close()
+            for cache_server in cache_servers:
+                await cache_server.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""Generate load against the cache server and report throughput and latency.
+
+    python3 cache.py serve --port 11211
+    python3 loadgen.py --port 11211 --clients 32 --requests 100000
+
+Each client replays its share of a Zipf distributed trace through one
+CacheClient, filling the cache on get misses like benchmark.replay does.
+With --pipeline above 1 each round trip carries that many requests.
+"""
+import argparse
+import asyncio
+import time
+
+import benchmark
+from client import CacheClient
+
+
+async def run_client(cache_client, trace, pipeline, value, latencies):
+    """Replay a trace, returning the number of gets and hits"""
+    gets = hits = 0
+    clock = time.perf_counter_ns
+    for start in range(0, len(trace), pipeline):
+        batch = trace[start:start + pipeline]
+        began = clock()
+        keys = [str(key) for operation, key in batch if operation == "get"]
+        found = await cache_client.get_many(keys) if keys else {}
+        writes = [(str(key), value) for operation, key in batch
+                  if operation == "put" or str(key) not in found]
+        if writes:
+            await cache_client.set_many(writes)
+        latencies.append(clock() - began)
+        gets += len(keys)
+        hits += len(found)
+    return gets, hits
+
+
+async def load(host, port, clients, requests, key_space, write_ratio=0.0,
+               pipeline=1, value_size=100, pool_size=None):
+    """Run the load and return its throughput and latency percentiles.
+
+    Parameters:
+    host (string): the server host
+    port (int): the server port
+    clients (int): the number of concurrent clients
+    requests (int): the total number of trace operations
+    key_space (int): the number of distinct keys
+    write_ratio (float): the fraction of operations that are puts
+    pipeline (int): the number of operations per round trip
+    value_size (int): the size in bytes of the values written
+    pool_size (int): the connections shared by the clients, one each by default
+
+    Returns:
+        result (dictionary): requests, seconds, requests_per_sec, p50_us,
+        p99_us and hit_ratio
+    """
+    trace = list(benchmark.zipf_trace(requests, key_space, write_ratio=write_ratio))
+    cache_client = CacheClient(host, port, pool_size=pool_size or clients)
+    value = b"x" * value_size
+    latencies = []
+    try:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            run_client(cache_client, trace[offset::clients], pipeline, value, latencies)
+            for offset in range(clients)))
+        seconds = time.perf_counter() - start
+    finally:
+        await cache_client.close()
+    latencies.sort()
+    gets = sum(result[0] for result in results)
+    hits = sum(result[1] for result in results)
+    return {
+        "requests": requests,
+        "seconds": seconds,
+        "requests_per_sec": requests / seconds if seconds else 0.0,
+        "p50_us": benchmark.percentile(latencies, 0.5) / 1000,
+        "p99_us": benchmark.percentile(latencies, 0.99) / 1000,
+        "hit_ratio": hits / gets if gets else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate load against the cache server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11211)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--key-space", type=int, default=100000)
+    parser.add_argument("--write-ratio", type=float, default=0.0)
+    parser.add_argument("--pipeline", type=int, default=1,
+                        help="operations sent per round trip")
+    parser.add_argument("--value-size", type=int, default=100)
+    arguments = parser.parse_args(argv)
+
+    result = asyncio.run(load(
+        arguments.host, arguments.port, arguments.clients, arguments.requests,
+        arguments.key_space, arguments.write_ratio, arguments.pipeline,
+        arguments.value_size))
+    print("%d requests in %.2f s: %.0f requests/sec, p50 %.1f us, p99 %.1f us, hit %.2f%%" % (
+        result["requests"], result["seconds"], result["requests_per_sec"],
+        result["p50_us"], result["p99_us"], 100 * result["hit_ratio"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Hit and miss ratio of an LRU cache of every size, from one pass over a trace.
+
+    python3 mrc.py trace.txt --points 20
+    python3 mrc.py huge-trace.txt --sample-rate 0.01 --sizes 1000,10000,100000
+
+The trace file holds one key per line and is streamed, so it can be larger
+than memory. A get of a key hits in an LRU cache of size c exactly when its
+stack distance, the number of distinct keys accessed since its previous
+access plus one, is at most c. So one histogram of stack distances gives the
+hit ratio of every cache size, instead of replaying the trace once per size.
+
+Stack distances are counted with a Fenwick tree over access times marking
+the latest access of each key, taking O(log n) per access for n distinct
+keys. With --sample-rate only the keys whose hash falls under the rate are
+tracked and their distances scaled up, as in SHARDS (Waldspurger et al.,
+FAST 2015), trading a little accuracy for memory and time in proportion.
+"""
+import argparse
+import zlib
+
+
+class FenwickTree:
+    """Prefix sums over a list of counts, each update and query O(log n)"""
+
+    def __init__(self, size, ones=0):
+        """Make a tree of size counts, the first ones of them set to one"""
+        self.size = size
+        self.tree = [0] * (size + 1)
+        for index in range(1, size + 1):
+            if index <= ones:
+                self.tree[index] += 1
+            parent = index + (index & -index)
+            if parent <= size:
+                self.tree[parent] += self.tree[index]
+
+    def add(self, position, delta):
+        index = position + 1
+        tree = self.tree
+        size = self.size
+        while index <= size:
+            tree[index] += delta
+            index += index & -index
+
+    def prefix_sum(self, position):
+        """Return the sum of the counts before position"""
+        total = 0
+        index = position
+        tree = self.tree
+        while index > 0:
+            total += tree[index]
+            index -= index & -index
+        return total
+
+
+class StackDistances:
+    """Computes LRU stack distances one access at a time.
+
+    Each key's latest access time is marked in a Fenwick tree, so the
+    distinct keys accessed since a key's previous access are the marks
+    after its time. Times are renumbered densely whenever they run out, so
+    the tree stays within twice the number of distinct keys however long
+    the trace.
+
+    Attributes
+    ----------
+    last_access : dictionary
+        the time of the latest access of each key
+    time: int
+        the time of the next access
+    """
+
+    MINIMUM_CAPACITY = 1024
+
+    def __init__(self):
+        self.last_access = {}
+        self.time = 0
+        self.tree = FenwickTree(self.MINIMUM_CAPACITY)
+
+    def access(self, key):
+        """Record an access, returning its stack distance or None the first
+        time a key is seen"""
+        if self.time == self.tree.size:
+            self._renumber()
+        time = self.time
+        previous = self.last_access.get(key)
+        distance = None
+        tree = self.tree
+        if previous is not None:
+            # marks after previous are the distinct keys accessed since
+            distance = len(self.last_access) - tree.prefix_sum(previous + 1) + 1
+            tree.add(previous, -1)
+        tree.add(time, 1)
+        self.last_access[key] = time
+        self.time = time + 1
+        return distance
+
+    def _renumber(self):
+        """Give the latest accesses the times 0 to n - 1, in order"""
+        keys = sorted(self.last_access, key=self.last_access.__getitem__)
+        self.last_access = {key: time for time, key in enumerate(keys)}
+        self.time = len(keys)
+        self.tree = FenwickTree(max(self.MINIMUM_CAPACITY, 2 * len(keys)), len(keys))
+
+
+def read_trace(path):
+    """Yield the keys of a trace file, one per line, skipping blank lines"""
+    with open(path) as trace:
+        for line in trace:
+            key = line.strip()
+            if key:
+                yield key
+
+
+def sampled(key, threshold, modulus):
+    """Return whether a key's hash falls under the sampling threshold"""
+    if not isinstance(key, bytes):
+        key = str(key).encode()
+    return zlib.crc32(key) % modulus < threshold
+
+
+def distance_histogram(keys, sample_rate=1.0):
+    """Count the stack distances of a stream of keys.
+
+    Parameters:
+    keys (iterable): the keys accessed, in order
+    sample_rate (float): the fraction of keys to track, distances of the
+        sampled keys being scaled by its inverse
+
+    Returns:
+        histogram (dictionary): the number of accesses at each distance
+        accesses (int): the number of accesses counted, cold misses included
+    """
+    assert (0 < sample_rate <= 1), "Sample rate must be in (0, 1]"
+    histogram = {}
+    accesses = 0
+    stack = StackDistances()
+    access = stack.access
+    if sample_rate < 1:
+        modulus = 1 << 24
+        threshold = int(sample_rate * modulus)
+        keys = (key for key in keys if sampled(key, threshold, modulus))
+    for key in keys:
+        accesses += 1
+        distance = access(key)
+        if distance is not None:
+            if sample_rate < 1:
+                distance = max(1, round(distance / sample_rate))
+            histogram[distance] = histogram.get(distance, 0) + 1
+    return histogram, accesses
+
+
+def hit_ratio_curve(histogram, accesses, sizes):
+    """Return the hit ratio of each cache size from a distance histogram"""
+    distances = sorted(histogram)
+    curve = []
+    hits = 0
+    index = 0
+    for size in sorted(sizes):
+        while index < len(distances) and distances[index] <= size:
+            hits += histogram[distances[index]]
+            index += 1
+        curve.append((size, hits / accesses if accesses else 0.0))
+    return curve
+
+
+def default_sizes(histogram, points):
+    """Return evenly spaced cache sizes up to the largest distance seen"""
+    largest = max(histogram, default=1)
+    return sorted({max(1, round(largest * point / points)) for point in range(1, points + 1)})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compute the LRU hit ratio of every cache size from a trace")
+    parser.add_argument("trace", help="file with one key per line")
+    parser.add_argument("--sizes", help="comma separated cache sizes to report")
+    parser.add_argument("--points", type=int, default=20,
+                        help="evenly spaced sizes to report when --sizes is not given")
+    parser.add_argument("--sample-rate", type=float, default=1.0,
+                        help="fraction of keys to sample, SHARDS style")
+    arguments = parser.parse_args(argv)
+
+    histogram, accesses = distance_histogram(read_trace(arguments.trace),
+                                             arguments.sample_rate)
+    if arguments.sizes:
+        sizes = [int(size) for size in arguments.sizes.split(",")]
+    else:
+        sizes = default_sizes(histogram, arguments.points)
+    print("%12s %9s %9s" % ("max_size", "hit %", "miss %"))
+    for size, hit_ratio in hit_ratio_curve(histogram, accesses, sizes):
+        print("%12d %9.2f %9.2f" % (size, 100 * hit_ratio, 100 * (1 - hit_ratio)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import os
+import random
+import tempfile
+import unittest
+import benchmark
+import cache
+import mrc
+
+def simulatedHitRatio(keys, max_size):
+    lru_cache = cache.LRUCache(max_size)
+    hits = 0
+    for key in keys:
+        if lru_cache.get(key) is None:
+            lru_cache.put(key, True)
+        else:
+            hits += 1
+    return hits / len(keys)
+
+class MissRatioCurveTest(unittest.TestCase):
+
+    def test_fenwick_tree_prefix_sums(self):
+        tree = mrc.FenwickTree(10, ones=4)
+        tree.add(7, 5)
+        tree.add(1, -1)
+
+        self.assertEqual([0, 1, 1, 2, 3, 3, 3, 3, 8, 8, 8],
+                         [tree.prefix_sum(position) for position in range(11)])
+
+    def test_stack_distances(self):
+        stack = mrc.StackDistances()
+
+        self.assertEqual([None, None, 1, 2, None, 3, 3],
+                         [stack.access(key) for key in "abbacba"])
+
+    def test_matches_simulated_lru_caches(self):
+        randomizer = random.Random(1)
+        keys = [randomizer.randrange(200) for _ in range(5000)]
+
+        histogram, accesses = mrc.distance_histogram(keys)
+        curve = dict(mrc.hit_ratio_curve(histogram, accesses, [1, 10, 50, 100, 200]))
+
+        for size in (1, 10, 50, 100, 200):
+            self.assertAlmostEqual(simulatedHitRatio(keys, size), curve[size])
+
+    def test_renumbering_keeps_distances_exact(self):
+        stack = mrc.StackDistances()
+        stack.MINIMUM_CAPACITY = 4
+        stack.tree = mrc.FenwickTree(4)
+        keys = [key % 3 for key in range(30)]
+
+        distances = [stack.access(key) for key in keys]
+
+        self.assertEqual([None] * 3 + [3] * 27, distances)
+        self.assertTrue(stack.tree.size <= 6)
+
+    def test_sampled_curve_is_close_for_large_sizes(self):
+        keys = [key for operation, key in benchmark.zipf_trace(100000, 20000, skew=0.6)]
+
+        histogram, accesses = mrc.distance_histogram(keys)
+        exact = dict(mrc.hit_ratio_curve(histogram, accesses, [1000, 5000]))
+        histogram, accesses = mrc.distance_histogram(keys, sample_rate=0.1)
+        approximate = dict(mrc.hit_ratio_curve(histogram, accesses, [1000, 5000]))
+
+        self.assertTrue(accesses < 20000)
+        for size in (1000, 5000):
+            self.assertAlmostEqual(exact[size], approximate[size], delta=0.03)
+
+    def test_reads_trace_file_lazily(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "trace.txt")
+            with open(path, "w") as trace:
+                trace.write("a\nb\n\na\n")
+
+            keys = mrc.read_trace(path)
+            self.assertEqual("a", next(keys))
+            self.assertEqual(["b", "a"], list(keys))
+
+    def test_default_sizes(self):
+        self.assertEqual([25, 50, 75, 100], mrc.default_sizes({3: 1, 100: 2}, 4))
+
+if __name__ == '__main__':
+    unittest.main()
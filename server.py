@@ -0,0 +1,228 @@
+"""Serve an LRUCache over TCP with a memcached style text protocol.
+
+    python3 cache.py serve --port 11211 --max-size 100000
+
+The supported commands are:
+
+    set <key> <flags> <exptime> <bytes> [noreply]\\r\\n<data>\\r\\n
+    get <key> [<key> ...]\\r\\n
+    delete <key> [noreply]\\r\\n
+    flush_all [noreply]\\r\\n
+    stats\\r\\n
+
+As in memcached, an exptime of zero never expires, up to 30 days counts
+seconds from now, anything larger is a Unix time, and a negative exptime
+or one in the past stores an item already expired.
+
+Clients may pipeline requests, sending many before reading any response.
+Every complete command in what a connection has sent is answered with one
+write, so a pipeline of requests costs one round trip and one system call
+each way instead of one per request.
+"""
+import asyncio
+import time
+
+import cache
+
+# the largest value a set may carry, as in memcached
+MAX_VALUE_SIZE = 1024 * 1024
+READ_SIZE = 64 * 1024
+# an exptime over 30 days is a Unix time rather than a number of seconds
+REALTIME_MAXDELTA = 60 * 60 * 24 * 30
+
+
+class ProtocolError(Exception):
+    """A malformed request, the connection is closed after answering it.
+
+    responses holds the replies to the commands before it, which have run
+    and are answered first so pipelined replies stay in order.
+    """
+
+    responses = ()
+
+
+class CacheServer:
+    """An asyncio server sharing one LRUCache between all its clients.
+
+    Every connection is served on the one event loop thread, so the cache
+    needs no locks.
+
+    Attributes
+    ----------
+    lru_cache : LRUCache
+        the cache the clients read and write
+    connections: int
+        the number of clients currently connected
+    """
+
+    def __init__(self, lru_cache):
+        self.lru_cache = lru_cache
+        self.connections = 0
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=11211):
+        """Start listening, returning the asyncio server"""
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    @property
+    def port(self):
+        """The port the server listens on, useful after binding port 0"""
+        return self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self, host="127.0.0.1", port=11211):
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        """Answer the requests of one client until it disconnects"""
+        self.connections += 1
+        buffer = bytearray()
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                buffer += data
+                try:
+                    responses = self.process(buffer)
+                except ProtocolError as error:
+                    writer.write(b"".join(error.responses)
+                                 + b"CLIENT_ERROR %s\r\n" % str(error).encode())
+                    break
+                if responses:
+                    writer.write(b"".join(responses))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def process(self, buffer):
+        """Run every complete command in the buffer, removing them from it.
+
+        Parameters:
+        buffer (bytearray): the bytes received and not processed yet
+
+        Returns:
+            responses (list): the bytes to send back, in request order
+        """
+        responses = []
+        position = 0
+        try:
+            while True:
+                end = buffer.find(b"\r\n", position)
+                if end == -1:
+                    if len(buffer) - position > READ_SIZE:
+                        raise ProtocolError("line too long")
+                    break
+                words = bytes(buffer[position:end]).split()
+                if words and words[0] == b"set":
+                    data_start, data_end = self._value_span(words, end)
+                    if len(buffer) < data_end + 2:
+                        # the value has not fully arrived yet
+                        break
+                    if buffer[data_end:data_end + 2] != b"\r\n":
+                        raise ProtocolError("bad data chunk")
+                    response = self.set(words, bytes(buffer[data_start:data_end]))
+                    position = data_end + 2
+                else:
+                    response = self.run(words)
+                    position = end + 2
+                if response:
+                    responses.append(response)
+        except ProtocolError as error:
+            # the commands before it have run, answer them first
+            error.responses = responses
+            raise
+        del buffer[:position]
+        return responses
+
+    @staticmethod
+    def _value_span(words, end):
+        """Return where the data of a set command starts and ends"""
+        if len(words) not in (5, 6):
+            raise ProtocolError("bad command line format")
+        try:
+            size = int(words[4])
+        except ValueError:
+            raise ProtocolError("bad command line format") from None
+        if not 0 <= size <= MAX_VALUE_SIZE:
+            raise ProtocolError("bad data size")
+        return end + 2, end + 2 + size
+
+    def set(self, words, data):
+        try:
+            flags = int(words[2])
+            exptime = int(words[3])
+        except ValueError:
+            raise ProtocolError("bad command line format") from None
+        ttl = self.ttl(exptime)
+        if ttl is None or ttl > 0:
+            self.lru_cache.put(words[1], (flags, data), ttl=ttl)
+        else:
+            # stored already expired, as memcached does, so drop any old value
+            self.lru_cache.delete(words[1])
+        return None if words[-1] == b"noreply" else b"STORED\r\n"
+
+    @staticmethod
+    def ttl(exptime):
+        """Return the seconds an item set with exptime lives for, None to
+        keep it until evicted, zero or less when it has already expired"""
+        if exptime == 0:
+            return None
+        if exptime > REALTIME_MAXDELTA:
+            return exptime - time.time()
+        return exptime
+
+    def run(self, words):
+        """Answer any command but set"""
+        if not words:
+            return b"ERROR\r\n"
+        command = words[0]
+        if command == b"get" or command == b"gets":
+            parts = []
+            get = self.lru_cache.get
+            for key in words[1:]:
+                entry = get(key)
+                if entry is not None:
+                    flags, data = entry
+                    parts.append(b"VALUE %s %d %d\r\n%s\r\n" % (key, flags, len(data), data))
+            parts.append(b"END\r\n")
+            return b"".join(parts)
+        noreply = words[-1] == b"noreply"
+        if command == b"delete" and len(words) in (2, 3):
+            found = words[1] in self.lru_cache.dictionary
+            self.lru_cache.delete(words[1])
+            if noreply:
+                return None
+            return b"DELETED\r\n" if found else b"NOT_FOUND\r\n"
+        if command == b"flush_all":
+            self.lru_cache.reset()
+            return None if noreply else b"OK\r\n"
+        if command == b"stats":
+            lines = [b"STAT curr_items %d\r\n" % len(self.lru_cache),
+                     b"STAT limit_maxitems %d\r\n" % self.lru_cache.max_size,
+                     b"STAT curr_connections %d\r\n" % self.connections]
+            if self.lru_cache.stats is not None:
+                for name, value in self.lru_cache.stats.snapshot().items():
+                    if isinstance(value, int):
+                        lines.append(b"STAT %s %d\r\n" % (name.encode(), value))
+            return b"".join(lines) + b"END\r\n"
+        return b"ERROR\r\n"
+
+
+def serve(host="127.0.0.1", port=11211, max_size=10000, **options):
+    """Serve a new LRUCache until interrupted"""
+    cache_server = CacheServer(cache.LRUCache(max_size, **options))
+    print("Serving an LRU Cache of max capacity %d on %s:%d" % (max_size, host, port))
+    try:
+        asyncio.run(cache_server.serve_forever(host, port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,160 @@
+import asyncio
+import time
+import unittest
+import cache
+import loadgen
+import server
+from client import CacheClient, CacheError
+
+class CacheServerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.lru_cache = cache.LRUCache(100)
+        self.cache_server = server.CacheServer(self.lru_cache)
+        await self.cache_server.start("127.0.0.1", 0)
+
+    async def asyncTearDown(self):
+        await self.cache_server.close()
+
+    async def request(self, payload, until=b"END\r\n"):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.cache_server.port)
+        writer.write(payload)
+        await writer.drain()
+        reply = b""
+        while not reply.endswith(until):
+            data = await reader.read(4096)
+            if not data:
+                break
+            reply += data
+        writer.close()
+        await writer.wait_closed()
+        return reply
+
+    async def test_set_get_delete(self):
+        reply = await self.request(b"set a 5 0 3\r\nabc\r\nget a b\r\ndelete a\r\n"
+                                   b"delete a\r\nget a\r\n")
+
+        self.assertEqual(b"STORED\r\nVALUE a 5 3\r\nabc\r\nEND\r\nDELETED\r\n"
+                         b"NOT_FOUND\r\nEND\r\n", reply)
+
+    async def test_pipelined_requests_are_answered_in_order(self):
+        payload = b"".join(b"set k%d 0 0 1 noreply\r\n%d\r\n" % (key, key % 10)
+                           for key in range(50))
+        payload += b"".join(b"get k%d\r\n" % key for key in range(50))
+
+        reply = await self.request(payload, until=b"k49 0 1\r\n9\r\nEND\r\n")
+
+        self.assertEqual(50, reply.count(b"END\r\n"))
+        self.assertTrue(reply.startswith(b"VALUE k0 0 1\r\n0\r\nEND\r\n"))
+        self.assertEqual(50, len(self.lru_cache))
+
+    def test_split_value_waits_for_the_rest(self):
+        buffer = bytearray(b"set a 0 0 5\r\nab")
+
+        self.assertEqual([], self.cache_server.process(buffer))
+        buffer += b"cde\r\nget a\r\n"
+        self.assertEqual([b"STORED\r\n", b"VALUE a 0 5\r\nabcde\r\nEND\r\n"],
+                         self.cache_server.process(buffer))
+        self.assertEqual(b"", bytes(buffer))
+
+    async def test_bad_requests(self):
+        self.assertEqual(b"ERROR\r\n", await self.request(b"bogus\r\n", until=b"\r\n"))
+        self.assertEqual(b"CLIENT_ERROR bad data chunk\r\n",
+                         await self.request(b"set a 0 0 1\r\nabc\r\n", until=b"\r\n"))
+
+    async def test_bad_request_is_answered_after_earlier_pipelined_ones(self):
+        reply = await self.request(b"set a 0 0 1\r\n1\r\nget a\r\nset b 0 0 1\r\nxyz\r\n",
+                                   until=b"CLIENT_ERROR bad data chunk\r\n")
+
+        self.assertEqual(b"STORED\r\nVALUE a 0 1\r\n1\r\nEND\r\n"
+                         b"CLIENT_ERROR bad data chunk\r\n", reply)
+
+    async def test_flush_all_and_stats(self):
+        self.lru_cache.put(b"a", (0, b"1"))
+
+        reply = await self.request(b"flush_all\r\nstats\r\n")
+
+        self.assertTrue(reply.startswith(b"OK\r\nSTAT curr_items 0\r\n"))
+        self.assertEqual(0, len(self.lru_cache))
+
+    async def test_set_with_expiry_time(self):
+        await self.request(b"set a 0 60 1\r\n1\r\n", until=b"\r\n")
+
+        self.assertIn(b"a", self.lru_cache.timer_wheel.deadlines)
+
+    def test_exptime_follows_memcached(self):
+        self.assertIsNone(self.cache_server.ttl(0))
+        self.assertEqual(60, self.cache_server.ttl(60))
+        self.assertTrue(-1 < self.cache_server.ttl(int(time.time()) + 3600) - 3600 < 1)
+        self.assertTrue(self.cache_server.ttl(server.REALTIME_MAXDELTA + 1) < 0)
+
+    def test_negative_or_past_exptime_stores_an_expired_item(self):
+        buffer = bytearray(b"set a 0 0 1\r\n1\r\nset a 0 -1 1\r\n2\r\nget a\r\n"
+                           b"set b 0 %d 1\r\n3\r\nget b\r\n" % (server.REALTIME_MAXDELTA + 1))
+
+        self.assertEqual([b"STORED\r\n", b"STORED\r\n", b"END\r\n",
+                          b"STORED\r\n", b"END\r\n"], self.cache_server.process(buffer))
+        self.assertEqual(0, len(self.lru_cache))
+
+    async def test_client(self):
+        cache_client = CacheClient("127.0.0.1", self.cache_server.port, pool_size=2)
+        try:
+            self.assertTrue(await cache_client.set("a", "1"))
+            self.assertTrue(await cache_client.set_many([("b", b"2"), ("c", b"3")]))
+            self.assertEqual(b"1", await cache_client.get("a"))
+            self.assertIsNone(await cache_client.get("missing"))
+            self.assertEqual({"a": b"1", "c": b"3"},
+                             await cache_client.get_many(["a", "c", "missing"]))
+            self.assertTrue(await cache_client.delete("a"))
+            self.assertFalse(await cache_client.delete("a"))
+            self.assertEqual("2", (await cache_client.stats())["curr_items"])
+
+            results = await asyncio.gather(*(cache_client.get("b") for _ in range(20)))
+            self.assertEqual([b"2"] * 20, results)
+            self.assertEqual(2, cache_client.opened)
+
+            await cache_client.flush_all()
+            self.assertEqual({}, await cache_client.get_many(["b", "c"]))
+        finally:
+            await cache_client.close()
+
+    async def test_client_raises_server_errors(self):
+        cache_client = CacheClient("127.0.0.1", self.cache_server.port)
+        try:
+            with self.assertRaises(CacheError):
+                await cache_client._request(b"bogus\r\n")
+            self.assertEqual(0, cache_client.opened)
+        finally:
+            await cache_client.close()
+
+    async def test_failed_request_does_not_strand_waiters(self):
+        cache_client = CacheClient("127.0.0.1", self.cache_server.port, pool_size=1)
+        try:
+            failed, value = await asyncio.wait_for(asyncio.gather(
+                cache_client._request(b"bogus\r\n"), cache_client.get("a", b"none"),
+                return_exceptions=True), 5)
+
+            self.assertIsInstance(failed, CacheError)
+            self.assertEqual(b"none", value)
+            self.assertEqual(1, cache_client.opened)
+        finally:
+            await cache_client.close()
+
+class LoadgenTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_load_reports_throughput(self):
+        cache_server = server.CacheServer(cache.LRUCache(1000))
+        await cache_server.start("127.0.0.1", 0)
+        try:
+            result = await loadgen.load("127.0.0.1", cache_server.port, clients=4,
+                                        requests=400, key_space=50, pipeline=4)
+        finally:
+            await cache_server.close()
+
+        self.assertEqual(400, result["requests"])
+        self.assertTrue(result["requests_per_sec"] > 0)
+        self.assertTrue(0 < result["hit_ratio"] < 1)
+        self.assertTrue(result["p50_us"] <= result["p99_us"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,276 @@
+"""A Least Recently Used Cache living in shared memory.
+
+Pre-forked workers that create the cache before forking, or processes that
+attach to it by name and are handed its locks, all see one cache instead of
+holding a copy each.
+"""
+import pickle
+import zlib
+from array import array
+from multiprocessing import Lock, shared_memory
+
+# the int64 fields at the start of each shard
+HEAD, TAIL, FREE, COUNT, HEADER_FIELDS = range(5)
+ITEM_SIZE = array("q").itemsize
+
+
+class SharedLRUCache:
+    """An LRU cache stored in a multiprocessing.shared_memory block.
+
+    The block is split into shards, each guarded by its own process shared
+    lock. A shard is a fixed size hash table chaining slot numbers, a
+    recency list linking slots through integer arrays, and the slots
+    themselves holding each pickled key and value. Keys are matched by
+    their pickled bytes, so 1 and 1.0 are different keys.
+
+    Attributes
+    ----------
+    max_size : int
+        the maximum capacity of the cache, divided evenly over the shards
+    slot_size: int
+        the most bytes a pickled key and value may take together, larger
+        pairs are not stored
+    name: string
+        the name of the shared memory block, for other processes to attach
+    locks: list
+        the lock guarding each shard
+    """
+
+    def __init__(self, max_size, slot_size=256, shards=8, name=None, create=True,
+                 locks=None):
+        max_size = int(max_size)
+        assert (max_size > 0), "Max capacity must be greater than zero"
+        shard_count = min(int(shards), max_size)
+        assert (shard_count > 0), "Shard count must be greater than zero"
+        self.max_size = max_size
+        self.slot_size = slot_size
+        self.capacity = -(-max_size // shard_count)
+        self.bucket_count = 1 << (self.capacity - 1).bit_length()
+        # header, buckets, then chain, previous, next, hash, key length and
+        # value length arrays of one int64 per slot
+        self.ints_per_shard = HEADER_FIELDS + self.bucket_count + 6 * self.capacity
+        self.shard_size = self.ints_per_shard * ITEM_SIZE + self.capacity * slot_size
+        if create:
+            self.memory = shared_memory.SharedMemory(
+                name=name, create=True, size=self.shard_size * shard_count)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+        self.locks = locks or [Lock() for _ in range(shard_count)]
+        assert (len(self.locks) == shard_count), "Need one lock per shard"
+        self.shards = [self._map(index) for index in range(shard_count)]
+        if create:
+            for index in range(shard_count):
+                self._reset(index)
+
+    def _map(self, index):
+        """Return the views of the arrays of a shard"""
+        start = index * self.shard_size
+        ints = self.memory.buf[start:start + self.ints_per_shard * ITEM_SIZE].cast("q")
+        views = {"header": ints[:HEADER_FIELDS]}
+        offset = HEADER_FIELDS
+        views["buckets"] = ints[offset:offset + self.bucket_count]
+        offset += self.bucket_count
+        for array_name in ("chain", "previous", "next", "hashes",
+                           "key_lengths", "value_lengths"):
+            views[array_name] = ints[offset:offset + self.capacity]
+            offset += self.capacity
+        data_start = start + self.ints_per_shard * ITEM_SIZE
+        views["data"] = self.memory.buf[data_start:data_start + self.capacity * self.slot_size]
+        views["ints"] = ints
+        return views
+
+    def _reset(self, index):
+        """Empty a shard, every slot on the free list"""
+        shard = self.shards[index]
+        shard["buckets"][:] = array("q", [-1]) * self.bucket_count
+        free_list = array("q", range(1, self.capacity + 1))
+        free_list[-1] = -1
+        shard["next"][:] = free_list
+        header = shard["header"]
+        header[HEAD] = header[TAIL] = -1
+        header[FREE] = 0
+        header[COUNT] = 0
+
+    def _locate(self, key):
+        """Return the pickled key, its hash and its shard index"""
+        key_bytes = pickle.dumps(key, pickle.HIGHEST_PROTOCOL)
+        key_hash = zlib.crc32(key_bytes)
+        return key_bytes, key_hash, key_hash % len(self.shards)
+
+    def _find(self, shard, key_bytes, key_hash):
+        """Return the slot of a key in a shard, or -1"""
+        slot = shard["buckets"][(key_hash // len(self.shards)) & (self.bucket_count - 1)]
+        hashes = shard["hashes"]
+        key_lengths = shard["key_lengths"]
+        data = shard["data"]
+        while slot != -1:
+            if hashes[slot] == key_hash and key_lengths[slot] == len(key_bytes):
+                start = slot * self.slot_size
+                if data[start:start + len(key_bytes)] == key_bytes:
+                    return slot
+            slot = shard["chain"][slot]
+        return -1
+
+    def _unlink(self, shard, slot):
+        """Detach a slot from the recency list"""
+        previous_slot = shard["previous"][slot]
+        next_slot = shard["next"][slot]
+        header = shard["header"]
+        if previous_slot == -1:
+            header[HEAD] = next_slot
+        else:
+            shard["next"][previous_slot] = next_slot
+        if next_slot == -1:
+            header[TAIL] = previous_slot
+        else:
+            shard["previous"][next_slot] = previous_slot
+
+    def _add(self, shard, slot):
+        """Link a slot in at the head of the recency list"""
+        header = shard["header"]
+        shard["previous"][slot] = -1
+        shard["next"][slot] = header[HEAD]
+        if header[HEAD] == -1:
+            header[TAIL] = slot
+        else:
+            shard["previous"][header[HEAD]] = slot
+        header[HEAD] = slot
+
+    def _remove(self, shard, slot):
+        """Take a slot out of its hash chain and the recency list and free it"""
+        bucket = (shard["hashes"][slot] // len(self.shards)) & (self.bucket_count - 1)
+        chain = shard["chain"]
+        if shard["buckets"][bucket] == slot:
+            shard["buckets"][bucket] = chain[slot]
+        else:
+            previous_slot = shard["buckets"][bucket]
+            while chain[previous_slot] != slot:
+                previous_slot = chain[previous_slot]
+            chain[previous_slot] = chain[slot]
+        self._unlink(shard, slot)
+        header = shard["header"]
+        shard["next"][slot] = header[FREE]
+        header[FREE] = slot
+        header[COUNT] -= 1
+
+    def put(self, key, value):
+        """Put a key value pair into the cache.
+
+        A pair too large for a slot is not stored, and any old value of the
+        key is deleted.
+
+        Parameters:
+        key (string): the cache item key
+        value (string): the cache item value
+        """
+        key_bytes, key_hash, index = self._locate(key)
+        value_bytes = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(key_bytes) + len(value_bytes) > self.slot_size:
+            self.delete(key)
+            return
+        shard = self.shards[index]
+        with self.locks[index]:
+            header = shard["header"]
+            slot = self._find(shard, key_bytes, key_hash)
+            if slot != -1:
+                # key already exists, update it
+                self._unlink(shard, slot)
+            else:
+                if header[FREE] == -1:
+                    # it will exceed max capacity, remove tail first
+                    self._remove(shard, header[TAIL])
+                slot = header[FREE]
+                header[FREE] = shard["next"][slot]
+                header[COUNT] += 1
+                bucket = (key_hash // len(self.shards)) & (self.bucket_count - 1)
+                shard["chain"][slot] = shard["buckets"][bucket]
+                shard["buckets"][bucket] = slot
+                shard["hashes"][slot] = key_hash
+                shard["key_lengths"][slot] = len(key_bytes)
+            start = slot * self.slot_size
+            data = shard["data"]
+            data[start:start + len(key_bytes)] = key_bytes
+            start += len(key_bytes)
+            data[start:start + len(value_bytes)] = value_bytes
+            shard["value_lengths"][slot] = len(value_bytes)
+            self._add(shard, slot)
+
+    def get(self, key, default=None):
+        """Get a value from the cache by its key.
+
+        Parameter:
+        key (string): the cache item key
+        default: the value to return when the key is not in the cache
+
+        Returns:
+            value (string): the corresponding cache item value
+        """
+        key_bytes, key_hash, index = self._locate(key)
+        shard = self.shards[index]
+        with self.locks[index]:
+            slot = self._find(shard, key_bytes, key_hash)
+            if slot == -1:
+                return default
+            if slot != shard["header"][HEAD]:
+                self._unlink(shard, slot)
+                self._add(shard, slot)
+            start = slot * self.slot_size + len(key_bytes)
+            value_bytes = bytes(shard["data"][start:start + shard["value_lengths"][slot]])
+        # unpickle outside the lock, other processes need not wait for it
+        return pickle.loads(value_bytes)
+
+    def delete(self, key):
+        """Delete a value from the cache by its key.
+
+        Parameter:
+        key (string): the key of the cache item to delete
+        """
+        key_bytes, key_hash, index = self._locate(key)
+        shard = self.shards[index]
+        with self.locks[index]:
+            slot = self._find(shard, key_bytes, key_hash)
+            if slot != -1:
+                self._remove(shard, slot)
+
+    def reset(self):
+        """Reset every shard of the cache to be empty."""
+        for index, lock in enumerate(self.locks):
+            with lock:
+                self._reset(index)
+
+    def keys(self):
+        """Return the keys of each shard in turn, most recently used first"""
+        keys = []
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                slot = shard["header"][HEAD]
+                while slot != -1:
+                    start = slot * self.slot_size
+                    keys.append(pickle.loads(
+                        bytes(shard["data"][start:start + shard["key_lengths"][slot]])))
+                    slot = shard["next"][slot]
+        return keys
+
+    def show(self):
+        """Print the contents of the cache."""
+        print("------------------")
+        print("Current shared LRU Cache:")
+        for key in self.keys():
+            print(key, self.get(key))
+        print("Max capacity = ", self.max_size)
+
+    def __len__(self):
+        return sum(shard["header"][COUNT] for shard in self.shards)
+
+    def close(self):
+        """Detach this process from the shared memory block"""
+        for shard in self.shards:
+            for view in shard.values():
+                view.release()
+        self.shards = []
+        self.memory.close()
+
+    def unlink(self):
+        """Destroy the shared memory block, once every process has closed it"""
+        self.memory.unlink()
@@ -0,0 +1,111 @@
+import multiprocessing
+import unittest
+import shared_cache
+
+def worker(shared, start, count):
+    for key in range(start, start + count):
+        shared.put(key, "value %d" % key)
+    shared.close()
+
+class SharedLRUCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.shared = shared_cache.SharedLRUCache(4, shards=1)
+
+    def tearDown(self):
+        self.shared.close()
+        self.shared.unlink()
+
+    def test_put_get_delete(self):
+        self.shared.put("a", 1)
+        self.shared.put(("b", 2), [1, 2])
+
+        self.assertEqual(1, self.shared.get("a"))
+        self.assertEqual([1, 2], self.shared.get(("b", 2)))
+        self.assertIsNone(self.shared.get("c"))
+        self.assertEqual(0, self.shared.get("c", 0))
+
+        self.shared.delete("a")
+        self.shared.delete("missing")
+
+        self.assertIsNone(self.shared.get("a"))
+        self.assertEqual(1, len(self.shared))
+
+    def test_evicts_least_recently_used(self):
+        for key in range(4):
+            self.shared.put(key, key)
+        self.shared.get(0)
+        self.shared.put(4, 4)
+
+        self.assertEqual([4, 0, 3, 2], self.shared.keys())
+        self.assertIsNone(self.shared.get(1))
+
+    def test_update_keeps_one_entry(self):
+        self.shared.put("a", "short")
+        self.shared.put("a", "a longer value")
+
+        self.assertEqual("a longer value", self.shared.get("a"))
+        self.assertEqual(1, len(self.shared))
+
+    def test_pair_too_large_for_a_slot_is_not_stored(self):
+        self.shared.put("a", 1)
+        self.shared.put("a", "x" * 1000)
+
+        self.assertIsNone(self.shared.get("a"))
+        self.assertEqual(0, len(self.shared))
+
+    def test_reset(self):
+        for key in range(4):
+            self.shared.put(key, key)
+        self.shared.reset()
+
+        self.assertEqual(0, len(self.shared))
+        self.assertEqual([], self.shared.keys())
+        self.shared.put("a", 1)
+        self.assertEqual(1, self.shared.get("a"))
+
+    def test_free_slots_are_reused_after_deletes(self):
+        for round in range(10):
+            for key in range(4):
+                self.shared.put(key, round)
+            for key in range(4):
+                self.shared.delete(key)
+
+        self.assertEqual(0, len(self.shared))
+        self.shared.put("a", 1)
+        self.assertEqual(1, self.shared.get("a"))
+
+    def test_attach_by_name(self):
+        self.shared.put("a", 1)
+        attached = shared_cache.SharedLRUCache(4, shards=1, name=self.shared.name,
+                                               create=False, locks=self.shared.locks)
+        try:
+            self.assertEqual(1, attached.get("a"))
+            attached.put("b", 2)
+        finally:
+            attached.close()
+
+        self.assertEqual(2, self.shared.get("b"))
+
+class SharedLRUCacheProcessTest(unittest.TestCase):
+
+    def test_processes_share_one_cache(self):
+        shared = shared_cache.SharedLRUCache(1000, shards=4)
+        try:
+            context = multiprocessing.get_context("fork")
+            processes = [context.Process(target=worker, args=(shared, start * 100, 100))
+                         for start in range(4)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+            self.assertEqual(400, len(shared))
+            self.assertEqual("value 123", shared.get(123))
+            self.assertEqual("value 399", shared.get(399))
+        finally:
+            shared.close()
+            shared.unlink()
+
+if __name__ == '__main__':
+    unittest.main()
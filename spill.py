@@ -0,0 +1,226 @@
+"""A disk tier for entries evicted from an LRUCache.
+
+    tier = SpillTier("/var/cache/app", max_bytes=10 * 1024 ** 3)
+    lru_cache = LRUCache(100000, spill=tier)
+
+Evicted entries are appended to segment files and found again through an
+index in memory, so reading one back costs a single positioned read. Space
+held by entries read back or replaced is reclaimed by rewriting the live
+entries of mostly dead segments, and past max_bytes the oldest segments,
+the entries evicted longest ago, are dropped whole.
+"""
+import os
+import pickle
+import struct
+import threading
+
+# key length and value length of each record
+RECORD = struct.Struct("<II")
+SEGMENT_NAME = "segment-%08d.log"
+
+
+class SpillTier:
+    """A log structured key value store on disk.
+
+    The index is kept in memory only, so segments left in the directory by
+    an earlier process are deleted on opening it. Every method takes a lock
+    so the tier can be shared by the shards of a ConcurrentLRUCache.
+
+    Attributes
+    ----------
+    directory : string
+        the directory holding the segment files
+    max_bytes: int
+        the most bytes the segment files take on disk together
+    segment_size: int
+        the size past which a new segment is started
+    index: dictionary
+        the segment, value offset, value length and record length of each key
+    segments: dictionary
+        the file descriptor, size and live bytes of each segment, oldest first
+    size: int
+        the bytes the segment files take on disk together
+    compactions: int
+        the number of segments rewritten to reclaim dead records
+    drops: int
+        the number of entries dropped to keep within max_bytes
+    """
+
+    def __init__(self, directory, max_bytes=1024 ** 3, segment_size=64 * 1024 ** 2,
+                 compact_ratio=0.5):
+        assert (max_bytes > 0), "Max bytes must be greater than zero"
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # keep several segments within the bound so the oldest can be dropped
+        self.segment_size = max(1, min(segment_size, max_bytes // 4))
+        self.compact_ratio = compact_ratio
+        self.index = {}
+        self.segments = {}
+        self.active = -1
+        self.size = 0
+        self.compactions = 0
+        self.drops = 0
+        self.lock = threading.RLock()
+        for name in os.listdir(directory):
+            if name.startswith("segment-") and name.endswith(".log"):
+                os.remove(os.path.join(directory, name))
+        self._roll()
+
+    def _path(self, number):
+        return os.path.join(self.directory, SEGMENT_NAME % number)
+
+    def _roll(self):
+        """Start a new active segment"""
+        self.active += 1
+        descriptor = os.open(self._path(self.active),
+                             os.O_RDWR | os.O_CREAT | os.O_APPEND | getattr(os, "O_BINARY", 0))
+        self.segments[self.active] = [descriptor, 0, 0]
+
+    def _append(self, key_bytes, value_bytes):
+        """Append a record to the active segment, returning its index entry"""
+        length = RECORD.size + len(key_bytes) + len(value_bytes)
+        segment = self.segments[self.active]
+        if segment[1] and segment[1] + length > self.segment_size:
+            self._roll()
+            segment = self.segments[self.active]
+        offset = segment[1]
+        os.write(segment[0], RECORD.pack(len(key_bytes), len(value_bytes))
+                 + key_bytes + value_bytes)
+        segment[1] += length
+        segment[2] += length
+        self.size += length
+        return (self.active, offset + RECORD.size + len(key_bytes),
+                len(value_bytes), length)
+
+    def _discard(self, key):
+        """Drop a key from the index, its record becoming dead space"""
+        entry = self.index.pop(key, None)
+        if entry is not None:
+            self.segments[entry[0]][2] -= entry[3]
+        return entry
+
+    def put(self, key, value):
+        """Write a key value pair to disk, replacing any older value
+
+        Parameters:
+        key (string): the item key
+        value (string): the item value
+        """
+        key_bytes = pickle.dumps(key, pickle.HIGHEST_PROTOCOL)
+        value_bytes = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self._discard(key)
+            self.index[key] = self._append(key_bytes, value_bytes)
+            if self.size > self.max_bytes:
+                self._bound()
+
+    def _read(self, entry):
+        segment, offset, length, _ = entry
+        return pickle.loads(os.pread(self.segments[segment][0], length, offset))
+
+    def get(self, key, default=None):
+        """Read the value of a key, or return default when it is not stored"""
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return default
+            return self._read(entry)
+
+    def pop(self, key, default=None):
+        """Read the value of a key and remove it, for promoting it to memory"""
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return default
+            value = self._read(entry)
+            self._discard(key)
+            return value
+
+    def delete(self, key):
+        """Remove a key, returning whether it was stored"""
+        with self.lock:
+            return self._discard(key) is not None
+
+    def _records(self, number):
+        """Yield the key, pickled key, value offset, segment data and record
+        length of each record of a segment"""
+        descriptor, size, _ = self.segments[number]
+        data = os.pread(descriptor, size, 0)
+        position = 0
+        while position < size:
+            key_length, value_length = RECORD.unpack_from(data, position)
+            key_start = position + RECORD.size
+            key_bytes = data[key_start:key_start + key_length]
+            length = RECORD.size + key_length + value_length
+            yield pickle.loads(key_bytes), key_bytes, key_start + key_length, data, length
+            position += length
+
+    def _bound(self):
+        """Reclaim dead records, then drop the oldest segments, until the
+        segments fit in max_bytes"""
+        sealed = [number for number in self.segments if number != self.active]
+        sealed.sort(key=lambda number: self.segments[number][2] / self.segments[number][1])
+        for number in sealed:
+            if self.size <= self.max_bytes:
+                return
+            descriptor, size, live = self.segments[number]
+            if live / size > self.compact_ratio:
+                break
+            self._compact(number)
+        while self.size > self.max_bytes:
+            if len(self.segments) == 1:
+                # only the active segment is left, seal it so it can go too
+                self._roll()
+            self._drop(next(iter(self.segments)))
+
+    def _compact(self, number):
+        """Copy the live records of a segment to the active one and delete it"""
+        for key, key_bytes, value_offset, data, length in self._records(number):
+            entry = self.index.get(key)
+            if entry is not None and entry[0] == number and entry[1] == value_offset:
+                self.index[key] = self._append(
+                    key_bytes, data[value_offset:value_offset + entry[2]])
+        self._delete_segment(number)
+        self.compactions += 1
+
+    def _drop(self, number):
+        """Forget every entry of a segment and delete it"""
+        for key, key_bytes, value_offset, data, length in self._records(number):
+            entry = self.index.get(key)
+            if entry is not None and entry[0] == number and entry[1] == value_offset:
+                del self.index[key]
+                self.drops += 1
+        self._delete_segment(number)
+
+    def _delete_segment(self, number):
+        descriptor, size, _ = self.segments.pop(number)
+        os.close(descriptor)
+        os.remove(self._path(number))
+        self.size -= size
+
+    def clear(self):
+        """Delete every entry and segment"""
+        with self.lock:
+            for number in list(self.segments):
+                self._delete_segment(number)
+            self.index = {}
+            self._roll()
+
+    def close(self):
+        """Close and delete the segment files"""
+        with self.lock:
+            for number in list(self.segments):
+                self._delete_segment(number)
+            self.index = {}
+
+    def keys(self):
+        """Return a list of the stored keys"""
+        with self.lock:
+            return list(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+import spill
+
+class SpillTierTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def segmentFiles(self):
+        return sorted(name for name in os.listdir(self.directory.name)
+                      if name.startswith("segment-"))
+
+    def test_put_get_pop_delete(self):
+        tier = spill.SpillTier(self.directory.name)
+        tier.put("a", [1, 2])
+        tier.put(("b", 2), "two")
+
+        self.assertEqual([1, 2], tier.get("a"))
+        self.assertEqual("two", tier.pop(("b", 2)))
+        self.assertIsNone(tier.get(("b", 2)))
+        self.assertEqual(0, tier.get("c", 0))
+        self.assertTrue(tier.delete("a"))
+        self.assertFalse(tier.delete("a"))
+        self.assertEqual(0, len(tier))
+        tier.close()
+
+    def test_put_replaces_older_value(self):
+        tier = spill.SpillTier(self.directory.name)
+        tier.put("a", 1)
+        tier.put("a", 2)
+
+        self.assertEqual(2, tier.get("a"))
+        self.assertEqual(1, len(tier))
+        self.assertEqual(tier.index["a"][3], tier.segments[tier.active][2])
+        tier.close()
+
+    def test_segments_roll_over(self):
+        tier = spill.SpillTier(self.directory.name, max_bytes=10 ** 6, segment_size=1000)
+        for key in range(100):
+            tier.put(key, "x" * 50)
+
+        self.assertTrue(len(self.segmentFiles()) > 5)
+        self.assertEqual(["x" * 50] * 100, [tier.get(key) for key in range(100)])
+        tier.close()
+        self.assertEqual([], self.segmentFiles())
+
+    def test_compaction_reclaims_dead_records(self):
+        tier = spill.SpillTier(self.directory.name, max_bytes=8000, segment_size=1000)
+        for round in range(20):
+            for key in range(10):
+                tier.put(key, "x" * 50)
+
+        self.assertTrue(tier.size <= tier.max_bytes)
+        self.assertTrue(tier.compactions > 0)
+        self.assertEqual(0, tier.drops)
+        self.assertEqual(["x" * 50] * 10, [tier.get(key) for key in range(10)])
+        self.assertEqual(sum(segment[1] for segment in tier.segments.values()), tier.size)
+        tier.close()
+
+    def test_size_bound_drops_oldest_entries(self):
+        tier = spill.SpillTier(self.directory.name, max_bytes=4000, segment_size=1000)
+        for key in range(200):
+            tier.put(key, "x" * 50)
+
+        self.assertTrue(tier.size <= tier.max_bytes)
+        self.assertTrue(tier.drops > 0)
+        self.assertIsNone(tier.get(0))
+        self.assertEqual("x" * 50, tier.get(199))
+        self.assertEqual(200, len(tier) + tier.drops)
+        tier.close()
+
+    def test_opening_deletes_old_segments(self):
+        tier = spill.SpillTier(self.directory.name)
+        tier.put("a", 1)
+
+        reopened = spill.SpillTier(self.directory.name)
+
+        self.assertEqual(0, len(reopened))
+        self.assertEqual(["segment-00000000.log"], self.segmentFiles())
+        reopened.close()
+
+    def test_clear(self):
+        tier = spill.SpillTier(self.directory.name, segment_size=100)
+        for key in range(10):
+            tier.put(key, key)
+        tier.clear()
+
+        self.assertEqual(0, len(tier))
+        self.assertEqual(0, tier.size)
+        self.assertEqual(1, len(self.segmentFiles()))
+        tier.put("a", 1)
+        self.assertEqual(1, tier.get("a"))
+        tier.close()
+
+if __name__ == '__main__':
+    unittest.main()